@@ -1,16 +1,20 @@
+import perfil_inicio
+perfil_inicio.iniciar()  # EON_PERFIL_INICIO=1: mede os imports abaixo e o tempo até a 1ª renderização
+
 import streamlit as st
-import google.generativeai as genai
-import tempfile
-import os
-import json
-import re
-import io
+import importlib.util
+
+import cache_respostas
+import metricas
 
-# Tenta importar pypdf
+# Confere o pypdf sem importá-lo (o processador_pdf só o carrega na primeira leitura)
 try:
-    import pypdf
+    if importlib.util.find_spec("pypdf") is None: raise ImportError("pypdf")
+    from processador_pdf import verificar_e_desbloquear_pdf
+    import auditor_ia
+    from auditor_ia import selecionar_modelo_elite, selecionar_modelo_rapido, leitura_local, obter_datas, obter_relatorio
 except ImportError:
-    st.error("⚠️ Biblioteca 'pypdf' não encontrada. Verifique o requirements.txt")
+    st.error("⚠️ Biblioteca 'pypdf' (ou o módulo 'processador_pdf.py') não encontrada. Verifique o requirements.txt")
     st.stop()
 
 # --- 1. Configuração Visual ---
@@ -20,6 +24,8 @@ st.set_page_config(
     layout="wide",
     initial_sidebar_state="collapsed"
 )
+perfil_inicio.marcar("modulos_carregados")
+metricas.iniciar_exportacao()
 
 st.markdown("""
     <style>
@@ -51,8 +57,7 @@ st.markdown("""
 # --- 2. Autenticação ---
 try:
     if "GOOGLE_API_KEY" in st.secrets:
-        api_key = st.secrets["GOOGLE_API_KEY"]
-        genai.configure(api_key=api_key)
+        auditor_ia.configurar(st.secrets["GOOGLE_API_KEY"])
     else:
         st.error("⚠️ Configure a chave API nos 'Secrets'.")
         st.stop()
@@ -60,105 +65,67 @@ except Exception as e:
     st.error(f"Erro de conexão: {e}")
     st.stop()
 
-# --- 3. Funções Inteligentes (USANDO O MODELO DESCOBERTO NO DIAGNÓSTICO) ---
-
-def selecionar_modelo_elite():
-    # Confirmado pelo diagnóstico: sua conta tem acesso ao 2.5 Pro
-    return "models/gemini-2.5-pro"
-
-def limpar_json(texto):
-    try:
-        match = re.search(r'\{.*\}', texto, re.DOTALL)
-        if match: return json.loads(match.group(0))
-        return json.loads(texto)
-    except:
-        return {} 
-
-def verificar_e_desbloquear_pdf(arquivo_bytes, senha=None):
-    try:
-        buffer = io.BytesIO(arquivo_bytes)
-        leitor = pypdf.PdfReader(buffer)
-        
-        if leitor.is_encrypted:
-            if not senha: return None, 'bloqueado'
-            try:
-                if leitor.decrypt(senha):
-                    writer = pypdf.PdfWriter()
-                    for page in leitor.pages: writer.add_page(page)
-                    novo_buffer = io.BytesIO()
-                    writer.write(novo_buffer)
-                    novo_buffer.seek(0)
-                    return novo_buffer.getvalue(), 'ok'
-                else: return None, 'senha_errada'
-            except: return None, 'senha_errada'
-        return arquivo_bytes, 'ok'
-    except Exception as e:
-        return None, f"erro_leitura: {e}"
-
-def extrair_datas(pdf_path, modelo):
-    # Sem pausas - O modelo pago aguenta
-    model = genai.GenerativeModel(modelo)
-    file_ref = genai.upload_file(pdf_path)
-    prompt = 'Extraia as datas da conta (Leitura Anterior e Atual). JSON: { "inicio": "DD/MM", "fim": "DD/MM", "dias": "XX" }'
-    try:
-        # Temperature 0.0 para precisão máxima
-        res = model.generate_content([file_ref, prompt], generation_config={"temperature": 0.0})
-        return limpar_json(res.text)
-    except:
-        return {"inicio": "?", "fim": "?", "dias": "?"}
-
-def analisar_performance_completa(pdf_path, modelo, geracao_usuario):
-    model = genai.GenerativeModel(modelo)
-    file_ref = genai.upload_file(pdf_path)
-    
-    # --- CÉREBRO ORIGINAL MANTIDO ---
-    prompt = f"""
-    ATUE COMO: Auditor Técnico Sênior de Energia Solar.
-    
-    INPUTS:
-    1. Fatura de Energia (PDF).
-    2. Geração Real do Inversor: {geracao_usuario} kWh.
-
-    DIRETRIZES TÉCNICAS RÍGIDAS (Seja Literal):
-    - Autoconsumo = {geracao_usuario} - Energia Injetada (Busque "Energia Injetada" ou "Compensada" na conta).
-    - Consumo Real = Consumo Rede + Autoconsumo.
-    - Fio B: Identifique o valor pago explicitamente.
-    - Mínimo: Verifique se o consumo da rede superou o mínimo (30/50/100).
-
-    SAÍDA OBRIGATÓRIA (JSON puro):
-    {{
-        "metricas": {{
-            "conta_atual": "R$ Valor",
-            "sem_solar": "R$ Valor Estimado",
-            "economia": "R$ Valor",
-            "pct": "XX%"
-        }},
-        "relatorio": "Relatório Markdown detalhado com tabelas e explicação técnica.",
-        "whatsapp": "Mensagem formatada em TÓPICOS (Lista com emojis). DEVE CONTER OBRIGATORIAMENTE: 1. Comparativo (Atual vs Sem Solar) e Economia. 2. Dados Técnicos (Geração, Injeção e Autoconsumo calculado). 3. Custo do Fio B (se houver). 4. Status do Mínimo."
-    }}
-    """
-    
-    try:
-        res = model.generate_content(
-            [file_ref, prompt], 
-            generation_config={"response_mime_type": "application/json", "temperature": 0.0}
-        )
-        return json.loads(res.text)
-    except:
-        # Fallback caso o JSON mode falhe
-        res = model.generate_content([file_ref, prompt], generation_config={"temperature": 0.0})
-        return limpar_json(res.text)
+# --- 3. Funções Inteligentes (em auditor_ia.py: datas, relatório e cache; aqui só a tela) ---
+
+def painel_relatorio():
+    """Áreas do resultado. Retorna mostrar(dados), que (re)preenche o que mudou — usado durante o stream e no final."""
+    st.markdown("---")
+    st.subheader("🎯 Resultado Financeiro")
+    areas = {"metricas": st.empty(), "relatorio": st.empty(), "whatsapp": st.empty()}
+    areas["metricas"].caption("⏳ Auditor 2.5 Pro calculando...")
+    mostrados = {}
+
+    def mostrar(dados):
+        met = dados.get("metricas")
+        if met and mostrados.get("metricas") != met:
+            with areas["metricas"].container():
+                k1, k2, k3, k4 = st.columns(4)
+                k1.metric("Atual", met.get("conta_atual", "-"))
+                k2.metric("Sem Solar", met.get("sem_solar", "-"), delta="Evitado", delta_color="inverse")
+                k3.metric("Economia", met.get("economia", "-"))
+                k4.metric("ROI", met.get("pct", "-"))
+            mostrados["metricas"] = met
+        if dados.get("relatorio") and mostrados.get("relatorio") != dados["relatorio"]:
+            with areas["relatorio"].container():
+                with st.expander("📄 Relatório Técnico", expanded=True):
+                    st.markdown(dados["relatorio"])
+            mostrados["relatorio"] = dados["relatorio"]
+        if dados.get("whatsapp") and mostrados.get("whatsapp") != dados["whatsapp"]:
+            with areas["whatsapp"].container():
+                st.success("📲 WhatsApp:")
+                st.code(dados["whatsapp"], language="text")
+            mostrados["whatsapp"] = dados["whatsapp"]
+
+    return mostrar
+
+def mostrar_desempenho():
+    etapas = st.session_state.get('etapas_ia') or []
+    if not etapas: return
+    with st.expander("⏱️ Desempenho por etapa"):
+        st.dataframe(etapas, use_container_width=True, hide_index=True)
+        st.caption(f"Total: {sum(e['segundos'] for e in etapas):.2f} s | "
+                   f"{sum(e['tokens_entrada'] for e in etapas)} tokens de entrada | "
+                   f"{sum(e['tokens_saida'] for e in etapas)} tokens de saída")
 
 # --- 4. Interface ---
 
-# USANDO O MODELO 2.5 PRO (Confirmado pelo seu diagnóstico)
+# USANDO O MODELO 2.5 PRO (Confirmado pelo seu diagnóstico) no relatório; Flash nas datas
 modelo_ativo = selecionar_modelo_elite()
+modelo_rapido = selecionar_modelo_rapido()
 
 col_logo, col_titulo = st.columns([1, 5])
 with col_logo: st.markdown("# ⚡")
 with col_titulo:
     st.title("Portal Auditor Eon")
-    st.caption(f"Motor IA: {modelo_ativo} | Série Elite (2.5)")
+    st.caption(f"Motor IA: {modelo_ativo} (relatório) + {modelo_rapido} (datas) | Leitura local primeiro")
+
+with st.expander("🗄️ Cache de respostas da IA"):
+    ignorar_cache = st.checkbox("Ignorar cache (forçar nova análise pelo modelo)", disabled=not cache_respostas.ATIVO)
+    est = cache_respostas.estatisticas()
+    c_a, c_b, c_c = st.columns(3)
+    c_a.metric("Acertos / Faltas", f"{est['acertos']} / {est['faltas']}")
+    c_b.metric("Taxa de acerto", f"{est['taxa_acerto']:.0%}" if est['taxa_acerto'] is not None else "-")
+    c_c.metric("Respostas em disco", f"{est['entradas']} ({est['mb']} MB)")
 
 st.markdown("---")
 
@@ -197,15 +164,17 @@ with container:
                 st.stop()
 
         if st.session_state['pdf_processado']:
-            with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp_file:
-                tmp_file.write(st.session_state['pdf_processado'])
-                tmp_path = tmp_file.name
-
             if st.session_state['etapa'] == 1:
                 if st.button("▶️ Ler Fatura", type="primary"):
                     with st.status("IA Elite Analisando...", expanded=True) as status:
                         try:
-                            datas = extrair_datas(tmp_path, modelo_ativo)
+                            # 1º o leitor local; o modelo só recebe o texto compacto (ou o PDF, se a leitura local falhar).
+                            # Se a resposta já estiver em cache, nem o upload acontece.
+                            pdf = st.session_state['pdf_processado']
+                            st.session_state['etapas_ia'] = []
+                            local = leitura_local(pdf, st.session_state['etapas_ia'])
+                            st.session_state['leitura_local'] = local
+                            datas = obter_datas(pdf, local, modelo_rapido, ignorar_cache, st.session_state['etapas_ia'])
                             st.session_state['dados_fatura'] = datas
                             st.session_state['etapa'] = 2
                             status.update(label="✅ Leitura concluída!", state="complete", expanded=False)
@@ -219,39 +188,50 @@ with container:
                 st.markdown("---")
                 st.subheader("☀️ 2. Usina")
                 st.info(f"Período: **{datas.get('inicio', '?')}** a **{datas.get('fim', '?')}**")
+                local = st.session_state.get('leitura_local') or {}
+                if local.get("consumo_kwh"):
+                    st.caption(f"Leitura local: consumo {local['consumo_kwh']:.0f} kWh | injetado {local['injetado_kwh']:.0f} kWh | "
+                               f"tarifa R$ {local['tarifa_consumo_calc']:.4f}/kWh | CIP R$ {local['cip_cosip']:.2f}")
                 
                 c1, c2 = st.columns([2, 1])
                 geracao_input = c1.number_input("Geração (kWh):", min_value=0, step=10)
                 
                 if c2.button("🚀 Gerar Relatório", type="primary"):
                     if geracao_input > 0:
-                        with st.spinner("Auditor 2.5 Pro calculando..."):
-                            try:
-                                dados = analisar_performance_completa(tmp_path, modelo_ativo, geracao_input)
-                                
-                                st.markdown("---")
-                                st.subheader("🎯 Resultado Financeiro")
-                                
-                                met = dados.get("metricas", {})
-                                k1, k2, k3, k4 = st.columns(4)
-                                k1.metric("Atual", met.get("conta_atual", "-"))
-                                k2.metric("Sem Solar", met.get("sem_solar", "-"), delta="Evitado", delta_color="inverse")
-                                k3.metric("Economia", met.get("economia", "-"))
-                                k4.metric("ROI", met.get("pct", "-"))
-
-                                with st.expander("📄 Relatório Técnico", expanded=True):
-                                    st.markdown(dados.get("relatorio", ""))
-
-                                st.success("📲 WhatsApp:")
-                                st.code(dados.get("whatsapp", ""), language="text")
-                                
-                                if st.button("Nova Análise"):
-                                    st.session_state['etapa'] = 1
-                                    st.session_state['pdf_processado'] = None
-                                    st.rerun()
-                            except Exception as e:
-                                st.error(f"Erro: {e}")
+                        try:
+                            pdf = st.session_state['pdf_processado']
+                            etapas = st.session_state.setdefault('etapas_ia', [])
+                            local = st.session_state.get('leitura_local') or leitura_local(pdf, etapas)
+                            mostrar = painel_relatorio()
+                            dados, do_cache = obter_relatorio(pdf, local, geracao_input, modelo_ativo, ignorar_cache, mostrar, etapas)
+                            if do_cache: st.caption("⚡ Relatório servido do cache (mesma fatura, geração e modelo).")
+                            mostrar(dados)
+                            mostrar_desempenho()
+                            
+                            if st.button("Nova Análise"):
+                                st.session_state['etapa'] = 1
+                                st.session_state['pdf_processado'] = None
+                                st.session_state['leitura_local'] = None
+                                st.rerun()
+                        except Exception as e:
+                            st.error(f"Erro: {e}")
                     else:
                         st.warning("Digite a geração.")
     else:
-        st.session_state['pdf_processado'] = None
\ No newline at end of file
+        st.session_state['pdf_processado'] = None
+        st.session_state['leitura_local'] = None
+
+# --- DESEMPENHO POR ETAPA (p50/p95 do processo; EON_METRICAS_PROM / EON_METRICAS_PORTA exportam) ---
+desempenho = metricas.resumo()
+if desempenho["etapas"]:
+    with st.sidebar.expander("📈 Latência por etapa"):
+        st.dataframe(desempenho["etapas"], use_container_width=True, hide_index=True)
+        if desempenho["contadores"]: st.dataframe(desempenho["contadores"], use_container_width=True, hide_index=True)
+
+# --- PERFIL DE SUBIDA (EON_PERFIL_INICIO=1) ---
+if perfil_inicio.marcar("primeira_renderizacao"): perfil_inicio.imprimir()
+if perfil_inicio.ATIVO:
+    with st.sidebar.expander("⏱️ Perfil de subida"):
+        perfil = perfil_inicio.relatorio()
+        st.caption(" | ".join(f"{k}: {v:.2f} s" for k, v in perfil["eventos"].items()) + f" | imports: {perfil['imports_ms']:.0f} ms")
+        st.dataframe(perfil["imports"], use_container_width=True, hide_index=True)
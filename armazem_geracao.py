@@ -0,0 +1,132 @@
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import date, timedelta
+
+# Armazém local de geração (SQLite). Guarda o kWh diário/mensal por (marca, estação, data)
+# e registra quais consultas à API já foram feitas:
+# - período fechado (terminou há mais de DIAS_CONSOLIDACAO dias) e com dados: imutável, nunca é rebuscado;
+# - período aberto (ou fechado sem dados): rebuscado depois de TTL_ABERTO segundos.
+CAMINHO = os.environ.get("EON_ARMAZEM_GERACAO", os.path.join(os.path.dirname(os.path.abspath(__file__)), "dados", "geracao.sqlite3"))
+DIAS_CONSOLIDACAO = 3
+TTL_ABERTO = 15 * 60
+
+_LOCK = threading.Lock()
+_INICIALIZADO = set()
+
+def _conectar():
+    with _LOCK:
+        if CAMINHO not in _INICIALIZADO:
+            os.makedirs(os.path.dirname(CAMINHO) or ".", exist_ok=True)
+            con = sqlite3.connect(CAMINHO)
+            con.execute("PRAGMA journal_mode=WAL")
+            con.executescript("""
+                CREATE TABLE IF NOT EXISTS geracao (
+                    marca TEXT, estacao TEXT, granularidade TEXT, data TEXT, kwh REAL,
+                    PRIMARY KEY (marca, estacao, granularidade, data)
+                );
+                CREATE TABLE IF NOT EXISTS consultas (
+                    marca TEXT, estacao TEXT, granularidade TEXT, periodo TEXT,
+                    fechado INTEGER, consultado_em REAL,
+                    PRIMARY KEY (marca, estacao, granularidade, periodo)
+                );
+            """)
+            con.close()
+            _INICIALIZADO.add(CAMINHO)
+    return sqlite3.connect(CAMINHO, timeout=30)
+
+@contextmanager
+def _conexao():
+    con = _conectar()
+    try:
+        with con: yield con  # commit ao sair
+    finally:
+        con.close()
+
+def _fim_do_periodo(periodo):
+    """'2024-05' -> 31/05/2024 ; '2024' -> 31/12/2024"""
+    if len(periodo) == 4: return date(int(periodo), 12, 31)
+    ano, mes = int(periodo[:4]), int(periodo[5:7])
+    return (date(ano + mes // 12, mes % 12 + 1, 1) - timedelta(days=1))
+
+def periodo_fechado(periodo, hoje=None):
+    hoje = hoje or date.today()
+    return _fim_do_periodo(periodo) < hoje - timedelta(days=DIAS_CONSOLIDACAO)
+
+def pendentes(marca, estacao, granularidade, periodos):
+    """Filtra os períodos ('YYYY-MM' para dias, 'YYYY' para meses) que ainda precisam ir à API."""
+    periodos = list(periodos)
+    if not periodos: return []
+    with _conexao() as con:
+        linhas = con.execute(
+            f"SELECT periodo, fechado, consultado_em FROM consultas WHERE marca=? AND estacao=? AND granularidade=? AND periodo IN ({','.join('?' * len(periodos))})",
+            [marca, str(estacao), granularidade, *periodos],
+        ).fetchall()
+    agora = time.time()
+    validos = {p for p, fechado, quando in linhas if fechado or agora - quando < TTL_ABERTO}
+    return [p for p in periodos if p not in validos]
+
+def gravar(marca, estacao, granularidade, periodo, valores):
+    """Grava o resultado de uma consulta. valores: {date: kWh} com datas diárias ou 1º dia do mês."""
+    fechado = int(periodo_fechado(periodo) and bool(valores))
+    with _conexao() as con:
+        con.executemany(
+            "INSERT OR REPLACE INTO geracao VALUES (?, ?, ?, ?, ?)",
+            [(marca, str(estacao), granularidade, d.isoformat(), float(kwh)) for d, kwh in valores.items()],
+        )
+        con.execute(
+            "INSERT OR REPLACE INTO consultas VALUES (?, ?, ?, ?, ?, ?)",
+            (marca, str(estacao), granularidade, periodo, fechado, time.time()),
+        )
+
+def ler(marca, estacao, granularidade, data_inicio, data_fim):
+    """Retorna {date: kWh} armazenado no intervalo (inclusive)."""
+    with _conexao() as con:
+        linhas = con.execute(
+            "SELECT data, kwh FROM geracao WHERE marca=? AND estacao=? AND granularidade=? AND data BETWEEN ? AND ? ORDER BY data",
+            (marca, str(estacao), granularidade, str(data_inicio)[:10], str(data_fim)[:10]),
+        ).fetchall()
+    return {date.fromisoformat(d): kwh for d, kwh in linhas}
+
+def estacoes_pendentes(marca, estacoes, granularidade, periodo, lote=900):
+    """Das estações dadas, as que ainda precisam consultar `periodo` na API (em lotes de `lote` estações, como ler_frota)."""
+    estacoes = [str(e) for e in estacoes]
+    if not estacoes: return []
+    linhas = []
+    with _conexao() as con:
+        for i in range(0, len(estacoes), lote):
+            parte = estacoes[i:i + lote]
+            linhas += con.execute(
+                f"SELECT estacao, fechado, consultado_em FROM consultas WHERE marca=? AND granularidade=? AND periodo=? AND estacao IN ({','.join('?' * len(parte))})",
+                [marca, granularidade, periodo, *parte],
+            ).fetchall()
+    agora = time.time()
+    validas = {e for e, fechado, quando in linhas if fechado or agora - quando < TTL_ABERTO}
+    return [e for e in estacoes if e not in validas]
+
+def gravar_lote(marca, granularidade, periodo, valores_por_estacao):
+    """gravar() de várias estações numa única transação. valores_por_estacao: {estacao: {date: kWh}}."""
+    agora = time.time()
+    with _conexao() as con:
+        for estacao, valores in valores_por_estacao.items():
+            fechado = int(periodo_fechado(periodo) and bool(valores))
+            con.executemany(
+                "INSERT OR REPLACE INTO geracao VALUES (?, ?, ?, ?, ?)",
+                [(marca, str(estacao), granularidade, d.isoformat(), float(kwh)) for d, kwh in valores.items()],
+            )
+            con.execute("INSERT OR REPLACE INTO consultas VALUES (?, ?, ?, ?, ?, ?)", (marca, str(estacao), granularidade, periodo, fechado, agora))
+
+def ler_frota(marca, estacoes, granularidade, data_inicio, data_fim, lote=900):
+    """ler() de várias estações com poucas queries: [(estacao, 'YYYY-MM-DD', kWh)] (em lotes de `lote` estações)."""
+    estacoes = [str(e) for e in estacoes]
+    linhas = []
+    with _conexao() as con:
+        for i in range(0, len(estacoes), lote):
+            parte = estacoes[i:i + lote]
+            linhas += con.execute(
+                f"SELECT estacao, data, kwh FROM geracao WHERE marca=? AND granularidade=? AND data BETWEEN ? AND ? AND estacao IN ({','.join('?' * len(parte))})",
+                [marca, granularidade, str(data_inicio)[:10], str(data_fim)[:10], *parte],
+            ).fetchall()
+    return linhas
@@ -0,0 +1,145 @@
+import hashlib
+import io
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import timezone
+
+import metricas
+
+PREFIXO = "eon-fatura-"   # display_name dos uploads: permite reencontrá-los depois de reiniciar o app
+
+# --- CLIENTE ---
+# O google.generativeai leva ~1 s para importar: só é carregado (e configurado) no primeiro uso.
+_CLIENTE = {"api_key": None, "configurado": False}
+_LOCK_CLIENTE = threading.Lock()
+
+def configurar(api_key):
+    _CLIENTE.update(api_key=api_key, configurado=False)
+
+def genai():
+    """Módulo google.generativeai, configurado com a chave de configurar()."""
+    import google.generativeai
+    with _LOCK_CLIENTE:
+        if not _CLIENTE["configurado"] and _CLIENTE["api_key"]:
+            google.generativeai.configure(api_key=_CLIENTE["api_key"])
+            _CLIENTE["configurado"] = True
+    return google.generativeai
+
+def hash_pdf(conteudo):
+    return hashlib.sha256(conteudo).hexdigest()
+
+def _expira_em(arquivo):
+    """Expiração do arquivo no servidor (epoch); a Files API mantém os uploads por 48 h."""
+    exp = getattr(arquivo, "expiration_time", None)
+    if not exp: return time.time() + 47 * 3600
+    if exp.tzinfo is None: exp = exp.replace(tzinfo=timezone.utc)
+    return exp.timestamp()
+
+class CacheArquivos:
+    """
+    Referências de upload da Files API do Gemini, por SHA-256 do PDF, compartilhadas pelo processo.
+    - O mesmo PDF é enviado uma vez só: serve às duas etapas, aos reruns e a outros operadores.
+    - Entradas perto da expiração no servidor são descartadas e reenviadas.
+    - Acima de `max_arquivos`, o menos usado é removido do cache e apagado no servidor.
+    - Na primeira falta, lista os uploads já existentes (de execuções anteriores) antes de reenviar.
+    - Referência recusada pelo servidor (apagada/expirada antes da hora): descartar() e obter() de novo.
+    """
+
+    def __init__(self, max_arquivos=100, margem=600):
+        self.max_arquivos = max_arquivos
+        self.margem = margem                 # segundos antes da expiração em que a referência deixa de valer
+        self._arquivos = OrderedDict()       # sha256 -> File
+        self._locks = {}                     # sha256 -> [Lock, usuários] (um upload por PDF, mesmo com sessões simultâneas)
+        self._lock = threading.Lock()
+        self._lock_listagem = threading.Lock()
+        self._listado = False
+
+    def _valido(self, arquivo):
+        return _expira_em(arquivo) - self.margem > time.time()
+
+    def _recuperar_uploads(self):
+        """Uma vez por processo. A listagem (rede) roda fora do _lock: quem acha o PDF no cache não espera por ela."""
+        with self._lock_listagem:
+            if self._listado: return
+            existentes = {}
+            try:
+                for arquivo in genai().list_files():
+                    nome = arquivo.display_name or ""
+                    if nome.startswith(PREFIXO) and self._valido(arquivo):
+                        existentes.setdefault(nome[len(PREFIXO):], arquivo)
+            except Exception as e:
+                metricas.erro("gemini:list_files", e)  # sem a lista, só reenvia o que faltar
+            with self._lock:
+                for chave, arquivo in existentes.items(): self._arquivos.setdefault(chave, arquivo)
+            self._listado = True
+
+    @contextmanager
+    def _exclusivo(self, chave):
+        """Lock do PDF enquanto houver quem o use; o último a sair remove a entrada (o dict não cresce sem fim)."""
+        with self._lock:
+            entrada = self._locks.setdefault(chave, [threading.Lock(), 0])
+            entrada[1] += 1
+        try:
+            with entrada[0]: yield
+        finally:
+            with self._lock:
+                entrada[1] -= 1
+                if not entrada[1]: del self._locks[chave]
+
+    def obter(self, conteudo, caminho=None):
+        """
+        File do Gemini para o PDF (bytes). Só envia se não houver upload válido: do `caminho`
+        (str ou função que o devolve, chamada só nessa hora) ou, sem ele, dos próprios bytes.
+        """
+        chave = hash_pdf(conteudo)
+        with self._exclusivo(chave):
+            if not self._listado: self._recuperar_uploads()
+            with self._lock:
+                arquivo = self._arquivos.get(chave)
+                if arquivo and self._valido(arquivo):
+                    self._arquivos.move_to_end(chave)
+                    metricas.contar("cache", tipo="upload_gemini", resultado="hit")
+                    return arquivo
+                self._arquivos.pop(chave, None)
+            metricas.contar("cache", tipo="upload_gemini", resultado="miss")
+
+            origem = (caminho() if callable(caminho) else caminho) or io.BytesIO(conteudo)
+            with metricas.medir("gemini:upload"):
+                arquivo = genai().upload_file(origem, mime_type="application/pdf", display_name=PREFIXO + chave)
+                arquivo = self._aguardar_ativo(arquivo)
+
+            with self._lock:
+                self._arquivos[chave] = arquivo
+                excedentes = []
+                while len(self._arquivos) > self.max_arquivos:
+                    excedentes.append(self._arquivos.popitem(last=False)[1])
+            for antigo in excedentes: self._apagar(antigo)
+            return arquivo
+
+    def _aguardar_ativo(self, arquivo, prazo=60):
+        limite = time.monotonic() + prazo
+        while getattr(arquivo.state, "name", "ACTIVE") == "PROCESSING" and time.monotonic() < limite:
+            time.sleep(1)
+            arquivo = genai().get_file(arquivo.name)
+        return arquivo
+
+    def _apagar(self, arquivo):
+        try:
+            genai().delete_file(arquivo.name)
+        except Exception as e:
+            metricas.erro("gemini:delete_file", e)  # expira sozinho no servidor
+
+    def descartar(self, conteudo, apagar=True):
+        """Remove o PDF do cache e, com `apagar`, o upload no servidor (apagar=False se ele já não existe lá)."""
+        with self._lock:
+            arquivo = self._arquivos.pop(hash_pdf(conteudo), None)
+        if arquivo and apagar: self._apagar(arquivo)
+
+def referencia_recusada(erro):
+    """O modelo recusou o File (não existe mais ou não é acessível): 404/403 da API do Gemini."""
+    return getattr(erro, "code", None) in (403, 404) or type(erro).__name__ in ("NotFound", "PermissionDenied")
+
+# Instância única do processo
+CACHE = CacheArquivos()
@@ -0,0 +1,238 @@
+import json
+import os
+import re
+import time
+
+import arquivos_gemini
+import cache_respostas
+import json_parcial
+import metricas
+import spool_pdf
+from processador_pdf import extrair_dados_fatura, campos_obrigatorios_encontrados, extrair_datas_leitura, texto_compacto, VERSAO_LEITURA
+
+# Auditoria da fatura com o Gemini (datas de leitura + relatório), sem Streamlit:
+# usada pelo app.py e pela CLI (eon_cli.py audit --ia).
+# As funções recebem `etapas` (lista) para registrar tempo e tokens de cada etapa; None = não registra.
+
+def configurar(api_key=None):
+    """Configura a chave da API (padrão: GOOGLE_API_KEY do ambiente). Retorna False se não houver chave."""
+    api_key = api_key or os.environ.get("GOOGLE_API_KEY")
+    if not api_key: return False
+    arquivos_gemini.configurar(api_key)  # o SDK só é importado na primeira chamada ao modelo
+    return True
+
+def selecionar_modelo_elite():
+    # Confirmado pelo diagnóstico: sua conta tem acesso ao 2.5 Pro
+    return "models/gemini-2.5-pro"
+
+def selecionar_modelo_rapido():
+    # Tarefas simples (ex: datas de leitura): o Flash é bem mais rápido e barato que o Pro
+    return "models/gemini-2.5-flash"
+
+# Versão dos prompts: mude ao editar o texto de um prompt, para o cache de respostas não servir a versão antiga
+PROMPT_DATAS_VERSAO = 2
+PROMPT_RELATORIO_VERSAO = 2
+
+# Campos da leitura local enviados ao modelo no lugar do PDF
+CAMPOS_LOCAIS = ["mes_referencia", "concessionaria", "consumo_kwh", "valor_consumo_total", "tarifa_consumo_calc",
+                 "injetado_kwh", "valor_credito_total", "tarifa_credito_calc", "cip_cosip"]
+
+def limpar_json(texto):
+    try:
+        match = re.search(r'\{.*\}', texto, re.DOTALL)
+        if match: return json.loads(match.group(0))
+        return json.loads(texto)
+    except:
+        return {}
+
+def registrar_etapa(etapas, etapa, modelo, inicio, fonte, res=None, primeiro_conteudo=None):
+    """Acrescenta tempo e tokens da etapa em `etapas` (relatório de desempenho)."""
+    if etapas is None: return
+    uso = getattr(res, "usage_metadata", None)
+    etapas.append({
+        "etapa": etapa,
+        "modelo": modelo or "-",
+        "fonte": fonte,
+        "segundos": round(time.perf_counter() - inicio, 2),
+        "primeiro_conteudo_s": primeiro_conteudo,
+        "tokens_entrada": getattr(uso, "prompt_token_count", 0) or 0,
+        "tokens_saida": getattr(uso, "candidates_token_count", 0) or 0,
+    })
+
+def leitura_local(pdf_bytes, etapas=None):
+    """Campos, datas de leitura e texto compacto da fatura pelo processador_pdf (sem IA, milissegundos)."""
+    inicio = time.perf_counter()
+    dados = extrair_dados_fatura(pdf_bytes, manter_texto=True, parar_cedo=False)
+    texto = dados.pop("texto_completo", "")
+    dados["texto"] = texto_compacto(texto)
+    dados["datas"] = extrair_datas_leitura(texto)
+    registrar_etapa(etapas, "leitura_local", None, inicio, "processador_pdf")
+    return dados
+
+def modo_entrada(local):
+    """"texto" quando a leitura local é confiável (campos obrigatórios achados); senão "pdf"."""
+    return "texto" if local["texto"] and campos_obrigatorios_encontrados(local) else "pdf"
+
+def fonte_para_modelo(modo, local, pdf_bytes):
+    if modo == "texto": return "TEXTO EXTRAÍDO DA FATURA:\n" + local["texto"]
+    # Upload único por PDF (hash): reaproveitado no relatório, nos reruns e por outros operadores.
+    # O arquivo do upload vem do spool (um por hash), gravado só quando o upload é mesmo necessário.
+    chave = arquivos_gemini.hash_pdf(pdf_bytes)
+    return arquivos_gemini.CACHE.obter(pdf_bytes, lambda: spool_pdf.gravar(pdf_bytes, chave))
+
+def _com_fonte(modo, local, pdf_bytes, chamar):
+    """
+    chamar(fonte) com a fonte do modelo. Se o Gemini recusar o upload em cache (apagado ou expirado
+    no servidor antes do previsto), descarta a referência e reenvia o PDF uma vez.
+    """
+    try:
+        return chamar(fonte_para_modelo(modo, local, pdf_bytes))
+    except Exception as e:
+        if modo != "pdf" or not arquivos_gemini.referencia_recusada(e): raise
+        metricas.erro("gemini:upload_recusado", e)
+        metricas.contar("retentativas", fornecedor="gemini", motivo="upload_recusado")
+        arquivos_gemini.CACHE.descartar(pdf_bytes, apagar=False)
+        return chamar(fonte_para_modelo(modo, local, pdf_bytes))
+
+def _upload_recusado(fonte, erro):
+    return not isinstance(fonte, str) and arquivos_gemini.referencia_recusada(erro)
+
+def extrair_datas(fonte, modelo, etapas=None):
+    # Sem pausas - O modelo pago aguenta
+    model = arquivos_gemini.genai().GenerativeModel(modelo)
+    prompt = 'Extraia as datas da conta (Leitura Anterior e Atual). JSON: { "inicio": "DD/MM", "fim": "DD/MM", "dias": "XX" }'
+    try:
+        # Temperature 0.0 para precisão máxima
+        inicio = time.perf_counter()
+        with metricas.medir("gemini:datas", modelo=modelo):
+            res = model.generate_content([fonte, prompt], generation_config={"temperature": 0.0})
+        registrar_etapa(etapas, "datas", modelo, inicio, "ia", res)
+        return limpar_json(res.text)
+    except Exception as e:
+        if _upload_recusado(fonte, e): raise  # _com_fonte reenvia o PDF
+        return {"inicio": "?", "fim": "?", "dias": "?"}  # falha registrada pelo medir
+
+def analisar_performance_completa(fonte, modelo, geracao_usuario, campos=None, ao_receber=None, etapas=None):
+    model = arquivos_gemini.genai().GenerativeModel(modelo)
+    if campos:
+        entrada = ("Texto extraído da fatura + campos já lidos dela (use estes valores, não recalcule): "
+                   + json.dumps({c: campos.get(c) for c in CAMPOS_LOCAIS}, ensure_ascii=False, default=str))
+    else:
+        entrada = "Fatura de Energia (PDF)."
+
+    # --- CÉREBRO ORIGINAL MANTIDO ---
+    prompt = f"""
+    ATUE COMO: Auditor Técnico Sênior de Energia Solar.
+
+    INPUTS:
+    1. {entrada}
+    2. Geração Real do Inversor: {geracao_usuario} kWh.
+
+    DIRETRIZES TÉCNICAS RÍGIDAS (Seja Literal):
+    - Autoconsumo = {geracao_usuario} - Energia Injetada (Busque "Energia Injetada" ou "Compensada" na conta).
+    - Consumo Real = Consumo Rede + Autoconsumo.
+    - Fio B: Identifique o valor pago explicitamente.
+    - Mínimo: Verifique se o consumo da rede superou o mínimo (30/50/100).
+
+    SAÍDA OBRIGATÓRIA (JSON puro):
+    {{
+        "metricas": {{
+            "conta_atual": "R$ Valor",
+            "sem_solar": "R$ Valor Estimado",
+            "economia": "R$ Valor",
+            "pct": "XX%"
+        }},
+        "relatorio": "Relatório Markdown detalhado com tabelas e explicação técnica.",
+        "whatsapp": "Mensagem formatada em TÓPICOS (Lista com emojis). DEVE CONTER OBRIGATORIAMENTE: 1. Comparativo (Atual vs Sem Solar) e Economia. 2. Dados Técnicos (Geração, Injeção e Autoconsumo calculado). 3. Custo do Fio B (se houver). 4. Status do Mínimo."
+    }}
+    """
+
+    # Streaming: o relatório aparece enquanto é escrito (ao_receber recebe o que já dá para mostrar)
+    inicio = time.perf_counter()
+    partes = []   # fora do try: se o stream cair no meio, o que chegou é aproveitado
+    try:
+        with metricas.medir("gemini:relatorio", modelo=modelo):
+            res = model.generate_content(
+                [fonte, prompt],
+                generation_config={"response_mime_type": "application/json", "temperature": 0.0},
+                stream=True
+            )
+            primeiro = _consumir_stream(res, partes, ao_receber, inicio)
+        registrar_etapa(etapas, "relatorio", modelo, inicio, "ia", res, primeiro)
+        return json.loads("".join(partes))
+    except json.JSONDecodeError as e:
+        metricas.erro("gemini:relatorio_json", e, recebido=len("".join(partes)))
+    except Exception as e:
+        if _upload_recusado(fonte, e) and not partes: raise  # _com_fonte reenvia o PDF
+        # falha da chamada (já registrada pelo medir): segue para o fallback
+
+    # Fallback: aproveita a saída parcial em vez de recomeçar do zero
+    texto = "".join(partes)
+    dados, completo = json_parcial.reparar(texto)
+    if completo: return dados
+    inicio_cont = time.perf_counter()
+    etapa = "relatorio_continuacao" if texto else "relatorio"
+    if texto:
+        # Pede ao modelo para continuar exatamente de onde parou
+        conversa = [
+            {"role": "user", "parts": [fonte, prompt]},
+            {"role": "model", "parts": [texto]},
+            {"role": "user", "parts": ["Continue exatamente de onde a resposta parou, sem repetir nada."]},
+        ]
+    else:
+        conversa = [fonte, prompt]
+    metricas.contar("retentativas", fornecedor="gemini", motivo=etapa)
+    with metricas.medir(f"gemini:{etapa}", modelo=modelo):
+        res = model.generate_content(conversa, generation_config={"temperature": 0.0}, stream=True)
+        primeiro = _consumir_stream(res, partes, ao_receber, inicio_cont)
+    registrar_etapa(etapas, etapa, modelo, inicio_cont, "ia", res, primeiro)
+    texto = "".join(partes)
+    dados, _ = json_parcial.reparar(texto)
+    return dados or limpar_json(texto)
+
+def _consumir_stream(res, partes, ao_receber, inicio):
+    """Acumula os pedaços do stream em `partes`, avisando ao_receber a cada um. Retorna os segundos até o 1º pedaço."""
+    primeiro = None
+    for pedaco in res:
+        try:
+            parte = pedaco.text
+        except ValueError:
+            continue  # pedaço sem texto (só metadados)
+        if primeiro is None: primeiro = round(time.perf_counter() - inicio, 2)
+        partes.append(parte)
+        if ao_receber: ao_receber(json_parcial.ler("".join(partes))[0])
+    return primeiro
+
+# --- ETAPAS COM CACHE ---
+def _entrada_cache(modo, local):
+    """No modo "texto" o modelo vê o que a leitura local produziu: versão dela e extrator entram na chave."""
+    if modo != "texto": return modo
+    return [modo, VERSAO_LEITURA, local.get("extrator")]
+
+def obter_datas(pdf, local, modelo=None, ignorar_cache=False, etapas=None):
+    """Datas de leitura: da leitura local se ela achou; senão do modelo rápido (via cache de respostas)."""
+    if local["datas"]: return local["datas"]
+    modelo = modelo or selecionar_modelo_rapido()
+    modo = modo_entrada(local)
+    inicio = time.perf_counter()
+    datas, do_cache = cache_respostas.obter_ou_gerar(
+        "datas", arquivos_gemini.hash_pdf(pdf), PROMPT_DATAS_VERSAO, _entrada_cache(modo, local), modelo,
+        lambda: _com_fonte(modo, local, pdf, lambda fonte: extrair_datas(fonte, modelo, etapas)),
+        ignorar=ignorar_cache, cachear=lambda r: bool(r) and r.get("inicio") not in (None, "?"),
+    )
+    if do_cache: registrar_etapa(etapas, "datas", modelo, inicio, "cache")
+    return datas
+
+def obter_relatorio(pdf, local, geracao, modelo=None, ignorar_cache=False, ao_receber=None, etapas=None):
+    """Relatório do modelo elite (via cache de respostas). Retorna (dados, veio_do_cache)."""
+    modelo = modelo or selecionar_modelo_elite()
+    modo = modo_entrada(local)
+    inicio = time.perf_counter()
+    dados, do_cache = cache_respostas.obter_ou_gerar(
+        "relatorio", arquivos_gemini.hash_pdf(pdf), PROMPT_RELATORIO_VERSAO, [geracao, _entrada_cache(modo, local)], modelo,
+        lambda: _com_fonte(modo, local, pdf, lambda fonte: analisar_performance_completa(
+            fonte, modelo, geracao, campos=local if modo == "texto" else None, ao_receber=ao_receber, etapas=etapas)),
+        ignorar=ignorar_cache, cachear=lambda r: bool(r.get("metricas")),
+    )
+    if do_cache: registrar_etapa(etapas, "relatorio", modelo, inicio, "cache")
+    return dados, do_cache
@@ -0,0 +1,308 @@
+import io
+import os
+import re
+import time
+import zipfile
+import calendar
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+
+import metricas
+import processador_pdf
+from indice_clientes import normalizar_nome
+
+# Limite de diferença (kWh) considerado "conta batida" — mesmo critério da auditoria individual
+TOLERANCIA_KWH = 5
+
+COLUNAS = [
+    "arquivo", "cliente", "marca", "id_usina", "usina", "inicio", "fim",
+    "kwh_gerado", "kwh_creditado", "diferenca_kwh", "tarifa", "valor_diferenca",
+    "alerta", "status", "erro", "desbloqueio", "tempo_desbloqueio_s",
+]
+
+# Senha que abriu a fatura de cada cliente (NOME normalizado -> senha). Compartilhada pelo processo:
+# o próximo lote tenta primeiro a senha que já funcionou.
+SENHAS_CLIENTES = {}
+MAX_TENTATIVAS_SENHA = 2000   # ~1,5 ms cada; limita a busca em todos os clientes por fatura
+
+# --- ENTRADA: ZIP OU PASTA ---
+def listar_pdfs(origem):
+    """
+    Gera (nome, conteudo) para cada PDF de um ZIP (bytes ou caminho .zip) ou de uma pasta.
+    O conteúdo é o caminho do arquivo (pasta) ou os bytes (ZIP), lidos sob demanda.
+    """
+    if isinstance(origem, (bytes, bytearray)) or str(origem).lower().endswith(".zip"):
+        fonte = io.BytesIO(origem) if isinstance(origem, (bytes, bytearray)) else origem
+        with zipfile.ZipFile(fonte) as zf:
+            for info in zf.infolist():
+                if info.is_dir() or not info.filename.lower().endswith(".pdf"): continue
+                if os.path.basename(info.filename).startswith("."): continue  # lixo do macOS (__MACOSX/._arquivo.pdf)
+                yield os.path.basename(info.filename), zf.read(info)
+    else:
+        for raiz, _, arquivos in os.walk(origem):
+            for nome in sorted(arquivos):
+                if nome.lower().endswith(".pdf"):
+                    yield nome, os.path.join(raiz, nome)
+
+# --- LEITURA (roda no pool de processos) ---
+_NOMES_CLIENTES = []
+_DOCUMENTOS = {}
+_SENHAS = {}
+
+def _iniciar_worker(nomes_clientes, documentos=None, senhas=None):
+    global _NOMES_CLIENTES, _DOCUMENTOS, _SENHAS
+    # Nomes mais longos primeiro para "JOAO DA SILVA FILHO" não casar como "JOAO DA SILVA"
+    _NOMES_CLIENTES = sorted(nomes_clientes, key=len, reverse=True)
+    _DOCUMENTOS = documentos or {}
+    _SENHAS = senhas or {}
+    metricas.iniciar_worker()
+
+def _citados(texto_norm, nomes_clientes):
+    """
+    Clientes citados no texto como palavras inteiras ("ANA" não casa com "MARIANA"). O nome mais longo
+    ganha: "JOAO DA SILVA" dentro de "JOAO DA SILVA FILHO" não conta como outro cliente citado.
+    """
+    ocupados, citados = [], []
+    for nome in sorted((n for n in nomes_clientes if n and n in texto_norm), key=len, reverse=True):  # `in` filtra antes da regex
+        trechos = [m.span() for m in re.finditer(r"(?<!\w)%s(?!\w)" % re.escape(nome), texto_norm)]
+        if any(not any(a <= i and f <= b for a, b in ocupados) for i, f in trechos): citados.append(nome)
+        ocupados += trechos
+    return citados
+
+def identificar_cliente(nome_arquivo, texto, nomes_clientes):
+    """
+    Casa a fatura com um cliente da planilha: primeiro pelo nome do arquivo, depois pelo texto.
+    Retorna (cliente, citados); cliente fica None se o texto citar mais de um cliente (ambígua).
+    """
+    base = normalizar_nome(os.path.splitext(nome_arquivo)[0].replace("_", " ").replace("-", " "))
+    for nome in nomes_clientes:
+        if base == nome: return nome, [nome]
+    citados = _citados(normalizar_nome(texto), nomes_clientes) if texto else []
+    return (citados[0] if len(citados) == 1 else None), citados
+
+def tentativas_de_senha(cliente_arquivo, documentos, senhas):
+    """
+    Ordem das senhas candidatas: (1) senha já conhecida do cliente do nome do arquivo e o CPF/CNPJ dele;
+    (2) senhas que já abriram faturas de outros clientes; (3) CPF/CNPJ de todos os clientes.
+    Gera (cliente, senha, origem).
+    """
+    if cliente_arquivo:
+        if cliente_arquivo in senhas: yield cliente_arquivo, senhas[cliente_arquivo], "senha_cache"
+        for senha in processador_pdf.candidatos_senha(documentos.get(cliente_arquivo)):
+            yield cliente_arquivo, senha, "documento_cliente"
+    for cliente, senha in senhas.items():
+        yield cliente, senha, "senha_cache"
+    for cliente, documento in documentos.items():
+        for senha in processador_pdf.candidatos_senha(documento):
+            yield cliente, senha, "busca"
+
+def _info_vazia():
+    return {"desbloqueio": None, "tempo_desbloqueio_s": None, "cliente_senha": None, "senha": None, "citados": []}
+
+def _desbloquear(nome_arquivo, conteudo):
+    """Abre a fatura protegida com as senhas candidatas. Retorna (arquivo para o extrator, info do desbloqueio)."""
+    inicio = time.perf_counter()
+    cliente_arquivo, _ = identificar_cliente(nome_arquivo, "", _NOMES_CLIENTES)
+    tentativas = (((cliente, origem), senha) for cliente, senha, origem in tentativas_de_senha(cliente_arquivo, _DOCUMENTOS, _SENHAS))
+    pdf, rotulo, status, _ = processador_pdf.desbloquear_com_candidatos(conteudo, tentativas, MAX_TENTATIVAS_SENHA)
+    info = {**_info_vazia(), "desbloqueio": status if status != "ok" else rotulo[1]}
+    if status == "nao_protegido" or status.startswith("erro_leitura"): return conteudo, info  # o extrator relata o erro
+    info["tempo_desbloqueio_s"] = round(time.perf_counter() - inicio, 4)
+    if pdf:
+        info.update(cliente_senha=rotulo[0], senha=pdf.senha)
+        return pdf, info
+    return None, info
+
+def _ler_fatura(nome_arquivo, conteudo):
+    """Desbloqueia (se preciso) e extrai os dados de uma fatura. Nunca levanta exceção: erros voltam no resultado."""
+    info = _info_vazia()
+    try:
+        if not isinstance(conteudo, (bytes, bytearray)):
+            with open(conteudo, "rb") as f: conteudo = f.read()
+        arquivo, info = _desbloquear(nome_arquivo, bytes(conteudo))
+        if arquivo is None:
+            return nome_arquivo, None, None, "PDF protegido: nenhuma senha candidata (CPF/CNPJ dos clientes) serviu", info
+        dados = processador_pdf.extrair_dados_fatura(arquivo, manter_texto=True)
+        texto = dados.pop("texto_completo", "")
+        if not texto:
+            return nome_arquivo, dados, None, "PDF ilegível (sem texto)", info
+        cliente, info["citados"] = identificar_cliente(nome_arquivo, texto, _NOMES_CLIENTES)
+        if not cliente and info["cliente_senha"] and (not info["citados"] or info["cliente_senha"] in info["citados"]):
+            cliente = info["cliente_senha"]  # o CPF/CNPJ que abriu o PDF desempata
+        return nome_arquivo, dados, cliente, None, info
+    except Exception as e:
+        return nome_arquivo, None, None, str(e), info
+
+def _ler_fatura_no_worker(nome_arquivo, conteudo):
+    resultado = _ler_fatura(nome_arquivo, conteudo)
+    resultado[4]["metricas"] = metricas.drenar()
+    return resultado
+
+# --- CONCILIAÇÃO ---
+def periodo_da_fatura(dados):
+    """Período de geração: mês de referência inteiro (mesma regra da auditoria individual)."""
+    inicio = dados.get("mes_referencia")
+    if not inicio: return None, None
+    ultimo_dia = calendar.monthrange(inicio.year, inicio.month)[1]
+    return inicio, inicio.replace(day=ultimo_dia)
+
+def tarifa_da_fatura(dados):
+    """Prioriza a tarifa de crédito; cai para a de consumo e, por fim, R$ 1,00."""
+    if dados.get("tarifa_credito_calc", 0) > 0: return dados["tarifa_credito_calc"]
+    if dados.get("tarifa_consumo_calc", 0) > 0: return dados["tarifa_consumo_calc"]
+    return 1.00
+
+def classificar_divergencia(diff_kwh):
+    if diff_kwh < -TOLERANCIA_KWH: return "prejuizo"
+    if diff_kwh > TOLERANCIA_KWH: return "credito_a_mais"
+    return "ok"
+
+def conciliar(kwh_gerado, kwh_creditado, tarifa):
+    diff_kwh = kwh_creditado - kwh_gerado
+    return {
+        "kwh_gerado": round(kwh_gerado, 2),
+        "kwh_creditado": round(kwh_creditado, 2),
+        "diferenca_kwh": round(diff_kwh, 2),
+        "tarifa": tarifa,
+        "valor_diferenca": round(diff_kwh * tarifa, 2),
+        "alerta": classificar_divergencia(diff_kwh),
+    }
+
+def _conciliar_fatura(linha, dados, usina, buscar_geracao):
+    inicio, fim = periodo_da_fatura(dados)
+    if not inicio:
+        linha.update(status="erro", erro="Mês de referência não encontrado na fatura")
+        return linha
+    linha.update(inicio=inicio, fim=fim)
+    try:
+        kwh_gerado, _ = buscar_geracao(usina, inicio, fim)
+    except Exception as e:
+        linha.update(status="erro", erro=f"Falha ao buscar geração: {e}")
+        return linha
+    linha.update(conciliar(float(kwh_gerado), dados.get("injetado_kwh", 0.0), tarifa_da_fatura(dados)))
+    linha["status"] = "ok" if kwh_gerado > 0 else "sem_geracao"
+    return linha
+
+# --- ORQUESTRAÇÃO ---
+def _ler_no_pool(arquivos, max_processos, initargs):
+    """
+    Lê os arquivos num pool novo, gerando os resultados na ordem em que terminam.
+    Retorna os que ficaram sem leitura porque um worker morreu (segfault, falta de memória) e quebrou o pool.
+    """
+    sem_leitura = []
+    with ProcessPoolExecutor(max_workers=max_processos, initializer=_iniciar_worker, initargs=initargs) as pool_pdf:
+        leituras = {pool_pdf.submit(_ler_fatura_no_worker, nome, conteudo): (nome, conteudo) for nome, conteudo in arquivos}
+        for fut in as_completed(leituras):
+            try:
+                resultado = fut.result()
+            except BrokenProcessPool:
+                sem_leitura.append(leituras[fut])
+                continue
+            except Exception as e:
+                metricas.erro("pdf:worker", e)
+                resultado = (leituras[fut][0], None, None, f"Falha na leitura: {e}", _info_vazia())
+            metricas.incorporar(resultado[4].pop("metricas", None))  # tempos medidos no worker
+            yield resultado
+    return sem_leitura
+
+def ler_faturas(arquivos, db, max_processos=None):
+    """
+    Lê (nome, conteudo) em pool de processos, na ordem em que terminam.
+    Gera (nome_arquivo, dados, cliente, erro, info) — cliente = NOME normalizado (ver _ler_fatura).
+    Se um PDF derrubar o worker, o pool é recriado e o que ficou sem leitura é relido em metades
+    até isolar o arquivo culpado, que sai com erro; os demais são lidos normalmente.
+    """
+    nomes_norm = {normalizar_nome(nome): nome for nome in db}
+    documentos = {nome: db[original].get("documento") for nome, original in nomes_norm.items() if db[original].get("documento")}
+    initargs = (list(nomes_norm), documentos, dict(SENHAS_CLIENTES))
+    pendentes = [list(arquivos)]
+    while pendentes:
+        grupo = pendentes.pop()
+        sem_leitura = yield from _ler_no_pool(grupo, max_processos, initargs)
+        if not sem_leitura: continue
+        metricas.erro("pdf:pool_quebrado", arquivos=len(sem_leitura))
+        if len(grupo) == 1:
+            yield grupo[0][0], None, None, "Falha na leitura: o processo de leitura caiu com este PDF", _info_vazia()
+            continue
+        meio = (len(sem_leitura) + 1) // 2
+        pendentes += [sem_leitura[meio:], sem_leitura[:meio]] if len(sem_leitura) > 1 else [sem_leitura]
+
+def processar_lote(origem, db, buscar_geracao, ao_progredir=None, max_processos=None, max_threads=8, pre_carregar=None):
+    """
+    Audita um lote de faturas (ZIP ou pasta).
+    - db: dicionário de clientes {NOME: {"id", "marca", "nome", "documento"}} (saída de carregar_clientes)
+    - buscar_geracao(usina, inicio, fim) -> (kwh, df)
+    - ao_progredir(concluidas, total, faturas_por_segundo)
+    - pre_carregar([(usina, inicio, fim), ...]): opcional; busca a geração do lote inteiro de uma vez
+      (ex: várias usinas por chamada) antes das conciliações, que então leem do armazém local.
+    Leitura dos PDFs em pool de processos; busca de geração em pool de threads.
+    Uma fatura com erro vira uma linha com status "erro" e não interrompe o lote.
+    Faturas protegidas são abertas no próprio worker com as senhas candidatas (CPF/CNPJ dos clientes);
+    a senha que funcionou fica em SENHAS_CLIENTES para os próximos lotes.
+    """
+    import pandas as pd
+    arquivos = list(listar_pdfs(origem))
+    total = len(arquivos)
+    nomes_norm = {normalizar_nome(nome): nome for nome in db}
+    linhas = []
+    inicio_lote = time.perf_counter()
+
+    def registrar(linha):
+        linhas.append(linha)
+        if ao_progredir:
+            decorrido = time.perf_counter() - inicio_lote
+            ao_progredir(len(linhas), total, len(linhas) / decorrido if decorrido > 0 else 0.0)
+
+    with ThreadPoolExecutor(max_workers=max_threads) as pool_rede:
+        buscas, conciliacoes = [], []
+        for nome_arquivo, dados, cliente, erro, info in ler_faturas(arquivos, db, max_processos):
+            linha = dict.fromkeys(COLUNAS)
+            linha.update(arquivo=nome_arquivo, desbloqueio=info["desbloqueio"], tempo_desbloqueio_s=info["tempo_desbloqueio_s"])
+            if info["senha"]: SENHAS_CLIENTES[info["cliente_senha"]] = info["senha"]
+            if erro:
+                linha.update(status="erro", erro=erro)
+                registrar(linha)
+                continue
+            if not cliente:
+                linha.update(status="cliente_nao_encontrado", kwh_creditado=dados.get("injetado_kwh", 0.0))
+                if len(info["citados"]) > 1:
+                    linha.update(status="cliente_ambiguo", erro="Fatura cita mais de um cliente: " + ", ".join(nomes_norm[c] for c in info["citados"]))
+                registrar(linha)
+                continue
+            usina = db[nomes_norm[cliente]]
+            linha.update(cliente=nomes_norm[cliente], marca=usina["marca"], id_usina=usina["id"], usina=usina["nome"])
+            if pre_carregar: conciliacoes.append((linha, dados, usina))  # espera o lote todo para buscar junto
+            else: buscas.append(pool_rede.submit(_conciliar_fatura, linha, dados, usina, buscar_geracao))
+
+        if conciliacoes:
+            pedidos = [(usina, *periodo_da_fatura(dados)) for _, dados, usina in conciliacoes if dados.get("mes_referencia")]
+            try: pre_carregar(pedidos)
+            except Exception as e: metricas.erro("pre_carregar", e, pedidos=len(pedidos))  # cada conciliação ainda busca a sua geração
+            buscas += [pool_rede.submit(_conciliar_fatura, linha, dados, usina, buscar_geracao) for linha, dados, usina in conciliacoes]
+        for fut in as_completed(buscas):
+            registrar(fut.result())
+
+    df = pd.DataFrame(linhas, columns=COLUNAS)
+    numericas = ["kwh_gerado", "kwh_creditado", "diferenca_kwh", "tarifa", "valor_diferenca", "tempo_desbloqueio_s"]
+    df[numericas] = df[numericas].apply(pd.to_numeric, errors="coerce")
+    return df.sort_values("arquivo").reset_index(drop=True)
+
+def resumo_desbloqueio(df):
+    """Faturas protegidas, taxa de acerto das senhas, origem da senha e vazão do desbloqueio."""
+    protegidas = df[df["desbloqueio"].notna() & (df["desbloqueio"] != "nao_protegido")]
+    abertas = protegidas[~protegidas["desbloqueio"].isin(["falhou"]) & ~protegidas["desbloqueio"].astype(str).str.startswith("erro")]
+    tempo = float(protegidas["tempo_desbloqueio_s"].sum())
+    return {
+        "protegidas": len(protegidas),
+        "desbloqueadas": len(abertas),
+        "taxa_acerto": len(abertas) / len(protegidas) if len(protegidas) else None,
+        "por_origem": abertas["desbloqueio"].value_counts().to_dict(),
+        "faturas_por_s": len(protegidas) / tempo if tempo else None,
+    }
+
+def exportar_resultado(df, caminho):
+    """Grava o resultado em CSV ou Parquet conforme a extensão."""
+    if str(caminho).lower().endswith(".parquet"):
+        df.to_parquet(caminho, index=False)
+    else:
+        df.to_csv(caminho, index=False, sep=";", decimal=",", encoding="utf-8-sig")
@@ -0,0 +1,278 @@
+"""
+Benchmark do caminho de PDF (desbloqueio + leitura da fatura) sobre um corpus sintético com gabarito.
+
+Uso:
+    python benchmark.py                          # 120 faturas, semente 42
+    python benchmark.py --faturas 500 --comparar benchmark_resultados/<anterior>.json
+    python benchmark.py --pasta PASTA_COM_PDFS   # faturas reais (sem gabarito): extratores x pdfplumber
+    python benchmark.py --etapas classificacao   # só as regras de linha: linhas/s x classificador anterior
+
+Mede faturas/s, páginas/s, pico de memória (RSS) e acerto por campo de cada etapa, e grava
+o resultado em benchmark_resultados/<data>_<commit>.json para comparar entre commits.
+Cada etapa roda num processo novo, para o pico de RSS ser só dela.
+Com --pasta não há gabarito: a referência de cada campo é a leitura do pdfplumber.
+"""
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import corpus_sintetico
+import processador_pdf
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+PASTA_RESULTADOS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark_resultados")
+CAMPOS = ["consumo_kwh", "valor_consumo_total", "injetado_kwh", "valor_credito_total", "cip_cosip", "mes_referencia"]
+
+def _pico_rss_mb():
+    if not resource: return None
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)  # Linux: KB
+
+def _confere(valor, esperado):
+    """Campo lido x esperado (gabarito em JSON: datas como texto ISO) ou x outra leitura."""
+    if esperado is None: return valor is None
+    if isinstance(esperado, str): return valor is not None and valor.isoformat() == esperado
+    if isinstance(esperado, float): return valor is not None and abs(valor - esperado) < 0.01
+    return valor == esperado
+
+def _ler(arquivos, extrator):
+    """Lê todas as faturas com o extrator. Retorna (lista de dados, segundos)."""
+    inicio = time.perf_counter()
+    resultados = [processador_pdf.extrair_dados_fatura(arquivo, extrator=extrator) for arquivo in arquivos]
+    return resultados, time.perf_counter() - inicio
+
+# --- ETAPAS (cada uma roda em processo separado) ---
+def etapa_desbloqueio(pasta, gabarito):
+    inicio = time.perf_counter()
+    ok = 0
+    protegidas = [(nome, g["senha"]) for nome, g in gabarito.items() if g["senha"]]
+    for nome, senha in protegidas:
+        with open(os.path.join(pasta, nome), "rb") as f:
+            _, status = processador_pdf.verificar_e_desbloquear_pdf(f.read(), senha)
+        ok += status == "ok"
+    tempo = time.perf_counter() - inicio
+    return {
+        "faturas": len(protegidas),
+        "segundos": round(tempo, 3),
+        "faturas_por_s": round(len(protegidas) / tempo, 2) if tempo else None,
+        "taxa_sucesso": round(ok / len(protegidas), 3) if protegidas else None,
+        "pico_rss_mb": _pico_rss_mb(),
+    }
+
+def etapa_leitura(pasta, gabarito, extrator):
+    # Faturas protegidas são desbloqueadas antes (fora da medição), como no fluxo real
+    arquivos = []
+    for nome, g in gabarito.items():
+        with open(os.path.join(pasta, nome), "rb") as f:
+            conteudo = f.read()
+        if g["senha"]: conteudo, _ = processador_pdf.verificar_e_desbloquear_pdf(conteudo, g["senha"])
+        arquivos.append((nome, conteudo))
+
+    acertos = {campo: 0 for campo in CAMPOS}
+    paginas_lidas = paginas_total = 0
+    lidos, tempo = _ler([conteudo for _, conteudo in arquivos], extrator)
+
+    for (nome, _), dados in zip(arquivos, lidos):
+        paginas_lidas += dados["paginas_lidas"]
+        paginas_total += gabarito[nome]["paginas"]
+        for campo in CAMPOS:
+            acertos[campo] += _confere(dados[campo], gabarito[nome][campo])
+    return {
+        "faturas": len(arquivos),
+        "paginas": paginas_total,
+        "paginas_lidas": paginas_lidas,
+        "segundos": round(tempo, 3),
+        "faturas_por_s": round(len(arquivos) / tempo, 2),
+        "paginas_por_s": round(paginas_total / tempo, 2),
+        "acerto": {campo: round(n / len(arquivos), 3) for campo, n in acertos.items()},
+        "pico_rss_mb": _pico_rss_mb(),
+    }
+
+def _classificar_anterior(dados, linha):
+    """Classificador de linhas anterior à tabela de regras (if encadeados), só como referência de velocidade."""
+    u = linha.upper()
+    if ("ENERGIA ELETR" in u or "CONSUMO" in u or "TUSD" in u or "TE " in u) and "KWH" in u and "INJETADA" not in u and "COMPENSADA" not in u:
+        numeros = re.findall(r'\d+[\.,]\d+', linha)
+        if len(numeros) >= 2 and processador_pdf.converter_valor_br(numeros[0]) > 10:
+            dados["consumo_kwh"] = max(dados["consumo_kwh"], processador_pdf.converter_valor_br(numeros[0]))
+            dados["valor_consumo_total"] += processador_pdf.converter_valor_br(numeros[-1])
+    if ("INJETADA" in u or "COMPENSADA" in u or "GD I" in u) and "KWH" in u:
+        numeros = re.findall(r'\d+[\.,]\d+', linha)
+        if len(numeros) >= 2:
+            dados["injetado_kwh"] += processador_pdf.converter_valor_br(numeros[0])
+            dados["valor_credito_total"] += processador_pdf.converter_valor_br(numeros[-1])
+    if ("ILUM" in u or "CIP" in u or "COSIP" in u) and ("CONTRIB" in u or "MUNIC" in u):
+        numeros = re.findall(r'\d+[\.,]\d+', linha)
+        if numeros: dados["cip_cosip"] = processador_pdf.converter_valor_br(numeros[-1])
+    if not dados["mes_referencia"]:
+        m = re.search(r'\b(JAN|FEV|MAR|ABR|MAI|JUN|JUL|AGO|SET|OUT|NOV|DEZ)[/ ]?20\d{2}\b', u)
+        if m: dados["mes_referencia"] = processador_pdf.converter_mes_ano(m.group(0))
+
+def etapa_classificacao(pasta, gabarito, repeticoes=5):
+    """
+    Só a classificação de linhas (texto extraído antes, fora da medição): tabela de regras x classificador
+    anterior. Melhor tempo de `repeticoes` passadas, para o ruído da máquina pesar menos.
+    """
+    faturas = []
+    for nome, g in gabarito.items():
+        with open(os.path.join(pasta, nome), "rb") as f:
+            conteudo = f.read()
+        if g["senha"]: conteudo, _ = processador_pdf.verificar_e_desbloquear_pdf(conteudo, g["senha"])
+        faturas.append(processador_pdf.extrair_dados_fatura(conteudo, manter_texto=True, extrator="pypdf")["texto_completo"].split("\n"))
+    linhas = sum(map(len, faturas))
+    regras = processador_pdf.regras_compiladas()
+
+    def tabela():
+        for texto in faturas: regras.aplicar_linhas(processador_pdf._novo_resultado(), texto)
+
+    def anterior():
+        for texto in faturas:
+            dados = processador_pdf._novo_resultado()
+            for linha in texto: _classificar_anterior(dados, linha)
+
+    tempos = {}
+    for _ in range(repeticoes):
+        for nome, passada in (("tabela", tabela), ("anterior", anterior)):
+            inicio = time.perf_counter()
+            passada()
+            tempos[nome] = min(tempos.get(nome, float("inf")), time.perf_counter() - inicio)
+    return {
+        "faturas": len(faturas),
+        "linhas": linhas,
+        "segundos": round(tempos["tabela"], 4),
+        "faturas_por_s": round(len(faturas) / tempos["tabela"], 2),
+        "linhas_por_s": round(linhas / tempos["tabela"]),
+        "linhas_por_s_anterior": round(linhas / tempos["anterior"]),
+        "ganho": round(tempos["anterior"] / tempos["tabela"], 2),
+        "pico_rss_mb": _pico_rss_mb(),
+    }
+
+ETAPAS = {
+    "desbloqueio": (etapa_desbloqueio, ()),
+    "leitura_auto": (etapa_leitura, ("auto",)),
+    "leitura_pypdf": (etapa_leitura, ("pypdf",)),
+    "leitura_pdfplumber": (etapa_leitura, ("pdfplumber",)),
+    "classificacao": (etapa_classificacao, ()),
+}
+
+def etapa_extratores(arquivos, extratores=("pdfplumber", "pypdf", "auto")):
+    """Faturas sem gabarito: velocidade de cada extrator e % de faturas em que cada campo bate com o pdfplumber."""
+    lidos = {extrator: _ler(arquivos, extrator) for extrator in extratores}
+    referencia = lidos.get("pdfplumber", (None,))[0]
+    relatorio = {}
+    for extrator, (dados, tempo) in lidos.items():
+        paginas = sum(d["paginas_lidas"] for d in dados)
+        m = {
+            "faturas": len(dados),
+            "segundos": round(tempo, 3),
+            "faturas_por_s": round(len(dados) / tempo, 2) if tempo else None,
+            "paginas_por_s": round(paginas / tempo, 2) if tempo else None,
+            "extrator_usado": {nome: sum(d["extrator"] == nome for d in dados) for nome in {d["extrator"] for d in dados}},
+            "pico_rss_mb": _pico_rss_mb(),
+        }
+        if referencia:
+            m["acerto"] = {campo: round(sum(_confere(d[campo], r[campo]) for d, r in zip(dados, referencia)) / max(len(dados), 1), 3)
+                           for campo in CAMPOS}
+        relatorio[extrator] = m
+    return relatorio
+
+def _commit_atual():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except Exception:
+        return None
+
+def executar(faturas=120, semente=42, etapas=None, pasta_corpus=None):
+    """Gera (ou reaproveita) o corpus e roda as etapas. Retorna o relatório (dict)."""
+    pasta = pasta_corpus or os.path.join(tempfile.gettempdir(), f"corpus_eon_v{corpus_sintetico.CORPUS_VERSAO}_{faturas}_{semente}")
+    caminho_gabarito = os.path.join(pasta, "gabarito.json")
+    if os.path.exists(caminho_gabarito):
+        with open(caminho_gabarito, encoding="utf-8") as f:
+            gabarito = json.load(f)
+    else:
+        gabarito = corpus_sintetico.gerar_corpus(pasta, faturas, semente)
+
+    relatorio = {
+        "commit": _commit_atual(),
+        "data": datetime.now().isoformat(timespec="seconds"),
+        "python": sys.version.split()[0],
+        "corpus": {"faturas": len(gabarito), "semente": semente, "paginas": sum(g["paginas"] for g in gabarito.values()),
+                   "protegidas": sum(bool(g["senha"]) for g in gabarito.values())},
+        "etapas": {},
+    }
+    for nome in etapas or ETAPAS:
+        funcao, extra = ETAPAS[nome]
+        with ProcessPoolExecutor(max_workers=1) as pool:
+            relatorio["etapas"][nome] = pool.submit(funcao, pasta, gabarito, *extra).result()
+    return relatorio
+
+def executar_pasta(pasta):
+    """Faturas reais de `pasta` (sem gabarito): compara os extratores. Retorna o relatório (dict)."""
+    arquivos = sorted(os.path.join(raiz, nome) for raiz, _, nomes in os.walk(pasta) for nome in nomes if nome.lower().endswith(".pdf"))
+    if not arquivos: sys.exit(f"Nenhum PDF em {pasta}")
+    with ProcessPoolExecutor(max_workers=1) as pool:
+        etapas = pool.submit(etapa_extratores, arquivos).result()
+    return {
+        "commit": _commit_atual(),
+        "data": datetime.now().isoformat(timespec="seconds"),
+        "python": sys.version.split()[0],
+        "corpus": {"pasta": os.path.abspath(pasta), "faturas": len(arquivos)},
+        "etapas": {f"extrator_{nome}": m for nome, m in etapas.items()},
+    }
+
+def comparar(atual, anterior):
+    """Imprime a variação de faturas/s e pico de RSS em relação a um resultado anterior."""
+    print(f"\nComparação com {anterior.get('commit')} ({anterior.get('data')}):")
+    for nome, m in atual["etapas"].items():
+        antes = anterior.get("etapas", {}).get(nome)
+        if not antes: continue
+        if m.get("faturas_por_s") and antes.get("faturas_por_s"):
+            var = (m["faturas_por_s"] / antes["faturas_por_s"] - 1) * 100
+            print(f"  {nome:>20}: {antes['faturas_por_s']} -> {m['faturas_por_s']} faturas/s ({var:+.1f}%)", end="")
+        if m.get("pico_rss_mb") and antes.get("pico_rss_mb"):
+            print(f" | RSS {antes['pico_rss_mb']} -> {m['pico_rss_mb']} MB", end="")
+        print()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--faturas", type=int, default=120)
+    parser.add_argument("--semente", type=int, default=42)
+    parser.add_argument("--etapas", nargs="+", choices=list(ETAPAS))
+    parser.add_argument("--corpus", help="pasta do corpus sintético (gerado se não existir)")
+    parser.add_argument("--pasta", help="faturas reais, sem gabarito: compara os extratores com o pdfplumber")
+    parser.add_argument("--comparar", help="JSON de um resultado anterior")
+    parser.add_argument("--saida", default=PASTA_RESULTADOS)
+    args = parser.parse_args(argv)
+
+    relatorio = executar_pasta(args.pasta) if args.pasta else executar(args.faturas, args.semente, args.etapas, args.corpus)
+    for nome, m in relatorio["etapas"].items():
+        print(f"{nome:>20}: {m['faturas_por_s']} faturas/s"
+              + (f" | {m['paginas_por_s']} páginas/s" if "paginas_por_s" in m else "")
+              + (f" | {m['linhas_por_s']} linhas/s (anterior {m['linhas_por_s_anterior']}, {m['ganho']}x)" if "linhas_por_s" in m else "")
+              + f" | pico RSS {m['pico_rss_mb']} MB"
+              + (f" | {m['extrator_usado']}" if "extrator_usado" in m else ""))
+        if "acerto" in m:
+            print(" " * 22 + " ".join(f"{campo}={pct:.0%}" for campo, pct in m["acerto"].items()))
+
+    os.makedirs(args.saida, exist_ok=True)
+    caminho = os.path.join(args.saida, f"{datetime.now():%Y%m%d-%H%M%S}_{relatorio['commit'] or 'sem-commit'}.json")
+    with open(caminho, "w", encoding="utf-8") as f:
+        json.dump(relatorio, f, indent=2, ensure_ascii=False)
+    print(f"\nResultado gravado em {caminho}")
+
+    if args.comparar:
+        with open(args.comparar, encoding="utf-8") as f:
+            comparar(relatorio, json.load(f))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+import metricas
+
+# Cache persistente das respostas do Gemini (SQLite). As chamadas usam temperature 0.0, então a mesma
+# (etapa, PDF, versão do prompt, entrada, modelo) pode ser servida do disco em vez de ir ao modelo de novo.
+# No modo "texto" a entrada inclui a versão da leitura local (processador_pdf.VERSAO_LEITURA) e o extrator.
+# O tamanho é limitado: acima de MAX_BYTES, as respostas usadas há mais tempo são removidas (LRU).
+CAMINHO = os.environ.get("EON_CACHE_IA", os.path.join(os.path.dirname(os.path.abspath(__file__)), "dados", "respostas_ia.sqlite3"))
+MAX_BYTES = int(float(os.environ.get("EON_CACHE_IA_MB", "50")) * 1024 * 1024)
+ATIVO = os.environ.get("EON_CACHE_IA_ATIVO", "1") != "0"
+
+_LOCK = threading.Lock()
+_INICIALIZADO = set()
+CONTADORES = Counter()   # acertos / faltas / ignorados desde que o processo subiu
+
+def _conectar():
+    with _LOCK:
+        if CAMINHO not in _INICIALIZADO:
+            os.makedirs(os.path.dirname(CAMINHO) or ".", exist_ok=True)
+            con = sqlite3.connect(CAMINHO)
+            con.execute("PRAGMA journal_mode=WAL")
+            con.executescript("""
+                CREATE TABLE IF NOT EXISTS respostas (
+                    chave TEXT PRIMARY KEY, etapa TEXT, modelo TEXT, resposta TEXT,
+                    tamanho INTEGER, criado_em REAL, usado_em REAL, acessos INTEGER DEFAULT 0
+                );
+                CREATE INDEX IF NOT EXISTS respostas_usado_em ON respostas (usado_em);
+            """)
+            con.close()
+            _INICIALIZADO.add(CAMINHO)
+    return sqlite3.connect(CAMINHO, timeout=30)
+
+@contextmanager
+def _conexao():
+    con = _conectar()
+    try:
+        with con: yield con  # commit ao sair
+    finally:
+        con.close()
+
+def chave(etapa, hash_pdf, versao_prompt, entrada, modelo):
+    bruto = json.dumps([etapa, hash_pdf, versao_prompt, entrada, modelo], sort_keys=True, default=str)
+    return hashlib.sha256(bruto.encode()).hexdigest()
+
+def ler(chave_resposta):
+    with _conexao() as con:
+        row = con.execute("SELECT resposta FROM respostas WHERE chave = ?", (chave_resposta,)).fetchone()
+        if not row: return None
+        con.execute("UPDATE respostas SET usado_em = ?, acessos = acessos + 1 WHERE chave = ?", (time.time(), chave_resposta))
+    return json.loads(row[0])
+
+def gravar(chave_resposta, etapa, modelo, resposta):
+    texto = json.dumps(resposta, ensure_ascii=False)
+    agora = time.time()
+    with _conexao() as con:
+        con.execute(
+            "INSERT OR REPLACE INTO respostas (chave, etapa, modelo, resposta, tamanho, criado_em, usado_em, acessos) VALUES (?, ?, ?, ?, ?, ?, ?, 0)",
+            (chave_resposta, etapa, modelo, texto, len(texto.encode()), agora, agora),
+        )
+        total = con.execute("SELECT COALESCE(SUM(tamanho), 0) FROM respostas").fetchone()[0]
+        if total > MAX_BYTES:
+            excesso = total - MAX_BYTES
+            removidas = []
+            for chave_antiga, tamanho in con.execute("SELECT chave, tamanho FROM respostas ORDER BY usado_em"):
+                if excesso <= 0: break
+                if chave_antiga == chave_resposta: continue
+                removidas.append((chave_antiga,))
+                excesso -= tamanho
+            con.executemany("DELETE FROM respostas WHERE chave = ?", removidas)
+
+def obter_ou_gerar(etapa, hash_pdf, versao_prompt, entrada, modelo, gerar, ignorar=False, cachear=bool):
+    """
+    Resposta do cache ou, na falta, de gerar() (que é gravada se cachear(resposta) for verdadeiro).
+    ignorar=True (ou o cache desligado) chama o modelo e sobrescreve a entrada.
+    Retorna (resposta, veio_do_cache).
+    """
+    k = chave(etapa, hash_pdf, versao_prompt, entrada, modelo)
+    if ATIVO and not ignorar:
+        try:
+            resposta = ler(k)
+        except sqlite3.Error as e:
+            metricas.erro("cache_respostas:ler", e)
+            resposta = None
+        if resposta is not None:
+            CONTADORES["acertos"] += 1
+            metricas.contar("cache", tipo="respostas_ia", resultado="hit")
+            return resposta, True
+        CONTADORES["faltas"] += 1
+        metricas.contar("cache", tipo="respostas_ia", resultado="miss")
+    else:
+        CONTADORES["ignorados"] += 1
+
+    resposta = gerar()
+    if ATIVO and cachear(resposta):
+        try:
+            gravar(k, etapa, modelo, resposta)
+        except sqlite3.Error as e:
+            metricas.erro("cache_respostas:gravar", e)
+    return resposta, False
+
+def estatisticas():
+    """Contadores do processo + tamanho atual do cache em disco."""
+    try:
+        with _conexao() as con:
+            entradas, tamanho = con.execute("SELECT COUNT(*), COALESCE(SUM(tamanho), 0) FROM respostas").fetchone()
+    except sqlite3.Error:
+        entradas, tamanho = 0, 0
+    consultas = CONTADORES["acertos"] + CONTADORES["faltas"]
+    return {
+        "acertos": CONTADORES["acertos"],
+        "faltas": CONTADORES["faltas"],
+        "ignorados": CONTADORES["ignorados"],
+        "taxa_acerto": CONTADORES["acertos"] / consultas if consultas else None,
+        "entradas": entradas,
+        "mb": round(tamanho / 1024 / 1024, 2),
+    }
+
+def limpar():
+    with _conexao() as con:
+        con.execute("DELETE FROM respostas")
@@ -0,0 +1,116 @@
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+import metricas
+
+# Catálogo local das usinas (SQLite): a listagem sai do disco na hora, inclusive logo após reiniciar o app.
+# A atualização (paginada, com páginas em paralelo) roda em segundo plano quando o catálogo fica velho
+# e só regrava as usinas novas ou alteradas; as que sumiram da API são marcadas como inativas.
+CAMINHO = os.environ.get("EON_CATALOGO_USINAS", os.path.join(os.path.dirname(os.path.abspath(__file__)), "dados", "catalogo.sqlite3"))
+TTL = 10 * 60   # idade máxima do catálogo antes de uma atualização em segundo plano
+
+_LOCK = threading.Lock()
+_INICIALIZADO = set()
+_ATUALIZANDO = {}   # marca -> Lock (uma atualização por marca de cada vez)
+
+def _conectar():
+    with _LOCK:
+        if CAMINHO not in _INICIALIZADO:
+            os.makedirs(os.path.dirname(CAMINHO) or ".", exist_ok=True)
+            con = sqlite3.connect(CAMINHO)
+            con.execute("PRAGMA journal_mode=WAL")
+            con.executescript("""
+                CREATE TABLE IF NOT EXISTS usinas (
+                    marca TEXT, id TEXT, nome TEXT, ativa INTEGER, atualizada_em REAL,
+                    PRIMARY KEY (marca, id)
+                );
+                CREATE TABLE IF NOT EXISTS atualizacoes (marca TEXT PRIMARY KEY, concluida_em REAL, total INTEGER);
+            """)
+            con.close()
+            _INICIALIZADO.add(CAMINHO)
+    return sqlite3.connect(CAMINHO, timeout=30)
+
+@contextmanager
+def _conexao():
+    con = _conectar()
+    try:
+        with con: yield con  # commit ao sair
+    finally:
+        con.close()
+
+def listar(marcas=None):
+    """Usinas ativas do catálogo: [{"id", "nome", "marca", "display"}]."""
+    with _conexao() as con:
+        linhas = con.execute("SELECT marca, id, nome FROM usinas WHERE ativa = 1 ORDER BY marca, nome").fetchall()
+    return [{"id": i, "nome": nome, "marca": marca, "display": f"{marca} | {nome}"}
+            for marca, i, nome in linhas if not marcas or marca in marcas]
+
+def idade(marca):
+    """Segundos desde a última atualização completa da marca (None se nunca foi atualizada)."""
+    with _conexao() as con:
+        row = con.execute("SELECT concluida_em FROM atualizacoes WHERE marca = ?", (marca,)).fetchone()
+    return time.time() - row[0] if row else None
+
+def sincronizar(marca, usinas):
+    """
+    Aplica uma listagem completa da API: grava só as novas/alteradas e desativa as que sumiram.
+    usinas: [{"id", "nome"}]. Retorna {"novas", "alteradas", "removidas", "total"}.
+    """
+    agora = time.time()
+    recebidas = {str(u["id"]): u.get("nome") for u in usinas if u.get("id")}
+    with _conexao() as con:
+        atuais = {i: (nome, ativa) for i, nome, ativa in con.execute("SELECT id, nome, ativa FROM usinas WHERE marca = ?", (marca,))}
+        novas = [i for i in recebidas if i not in atuais]
+        alteradas = [i for i in recebidas if i in atuais and atuais[i] != (recebidas[i], 1)]
+        removidas = [i for i, (_, ativa) in atuais.items() if ativa and i not in recebidas]
+        con.executemany("INSERT OR REPLACE INTO usinas VALUES (?, ?, ?, 1, ?)", [(marca, i, recebidas[i], agora) for i in novas + alteradas])
+        con.executemany("UPDATE usinas SET ativa = 0, atualizada_em = ? WHERE marca = ? AND id = ?", [(agora, marca, i) for i in removidas])
+        con.execute("INSERT OR REPLACE INTO atualizacoes VALUES (?, ?, ?)", (marca, agora, len(recebidas)))
+    return {"novas": len(novas), "alteradas": len(alteradas), "removidas": len(removidas), "total": len(recebidas)}
+
+def listar_paginado(buscar_pagina, max_concorrencia=4, tamanho_pagina=100):
+    """
+    Junta todas as páginas de uma listagem. buscar_pagina(n) -> (itens, total_paginas | None).
+    Com o total conhecido (vem na 1ª página), as demais são buscadas em paralelo;
+    sem ele, segue em sequência até uma página vir incompleta. Página que falhar levanta a exceção.
+    """
+    itens, total_paginas = buscar_pagina(1)
+    itens = list(itens)
+    if total_paginas is None:
+        pagina, n = itens, 1
+        while len(pagina) >= tamanho_pagina:
+            n += 1
+            pagina, _ = buscar_pagina(n)
+            itens.extend(pagina)
+        return itens
+    if total_paginas > 1:
+        with ThreadPoolExecutor(max_workers=max(1, min(max_concorrencia, total_paginas - 1))) as pool:
+            for pagina, _ in pool.map(buscar_pagina, range(2, total_paginas + 1)):
+                itens.extend(pagina)
+    return itens
+
+def atualizar(marca, listar_api, forcar=False):
+    """
+    Atualiza a marca se o catálogo estiver velho (ou forcar=True). listar_api() -> [{"id", "nome"}] completa.
+    Uma atualização por marca de cada vez; falha da API mantém o catálogo como estava.
+    Retorna o resumo de sincronizar() ou None se não atualizou.
+    """
+    with _LOCK:
+        trava = _ATUALIZANDO.setdefault(marca, threading.Lock())
+    if not trava.acquire(blocking=False): return None  # outra thread já está atualizando
+    try:
+        decorrido = idade(marca)
+        if not forcar and decorrido is not None and decorrido < TTL: return None
+        with metricas.medir(f"catalogo:{marca}"):
+            return sincronizar(marca, listar_api())
+    except Exception:
+        return None  # registrado pelo medir; o catálogo fica como estava
+    finally:
+        trava.release()
+
+def atualizar_em_segundo_plano(marca, listar_api, forcar=False):
+    threading.Thread(target=atualizar, args=(marca, listar_api, forcar), daemon=True, name=f"catalogo-{marca}").start()
@@ -0,0 +1,249 @@
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import date
+
+import armazem_geracao
+import metricas
+import auditoria_lote
+import planilha_clientes
+from indice_clientes import normalizar_nome
+
+# Conciliação da frota inteira em segundo plano (geração x crédito na fatura x tarifa, a mesma conta da
+# auditoria individual), materializada em SQLite para o dashboard ler na hora.
+# - Faturas entram pelas auditorias (individual e em lote) e por uma pasta de entrada opcional.
+# - Cada ciclo só reconcilia o que pode ter mudado: cliente com fatura nova ou período ainda aberto
+#   (pode ganhar dias de geração). Período fechado já conciliado com geração não é nem relido.
+CAMINHO = os.environ.get("EON_FROTA", os.path.join(os.path.dirname(os.path.abspath(__file__)), "dados", "frota.sqlite3"))
+PASTA_ENTRADA = os.environ.get("EON_PASTA_FATURAS", "")
+INTERVALO = int(os.environ.get("EON_FROTA_INTERVALO", "900"))   # segundos entre ciclos
+MAX_THREADS = 8
+
+COLUNAS = [
+    "cliente", "marca", "id_usina", "usina", "arquivo", "inicio", "fim",
+    "kwh_gerado", "kwh_creditado", "diferenca_kwh", "tarifa", "valor_diferenca",
+    "alerta", "status", "erro", "assinatura", "calculado_em", "dias_zerados",
+]
+
+_LOCK = threading.Lock()
+_INICIALIZADO = set()
+
+def _conectar():
+    with _LOCK:
+        if CAMINHO not in _INICIALIZADO:
+            os.makedirs(os.path.dirname(CAMINHO) or ".", exist_ok=True)
+            con = sqlite3.connect(CAMINHO)
+            con.execute("PRAGMA journal_mode=WAL")
+            con.executescript("""
+                CREATE TABLE IF NOT EXISTS faturas (
+                    cliente TEXT, inicio TEXT, fim TEXT, arquivo TEXT,
+                    kwh_creditado REAL, tarifa REAL, registrada_em REAL,
+                    PRIMARY KEY (cliente, inicio)
+                );
+                CREATE TABLE IF NOT EXISTS arquivos_lidos (caminho TEXT PRIMARY KEY, mtime REAL, tamanho INTEGER);
+                CREATE TABLE IF NOT EXISTS conciliacoes (
+                    cliente TEXT PRIMARY KEY, marca TEXT, id_usina TEXT, usina TEXT, arquivo TEXT, inicio TEXT, fim TEXT,
+                    kwh_gerado REAL, kwh_creditado REAL, diferenca_kwh REAL, tarifa REAL, valor_diferenca REAL,
+                    alerta TEXT, status TEXT, erro TEXT, assinatura TEXT, calculado_em REAL, dias_zerados INTEGER
+                );
+            """)
+            if "dias_zerados" not in [c[1] for c in con.execute("PRAGMA table_info(conciliacoes)")]:
+                con.execute("ALTER TABLE conciliacoes ADD COLUMN dias_zerados INTEGER")  # bases anteriores ao motor vetorizado
+            con.close()
+            _INICIALIZADO.add(CAMINHO)
+    return sqlite3.connect(CAMINHO, timeout=30)
+
+@contextmanager
+def _conexao():
+    con = _conectar()
+    try:
+        with con: yield con  # commit ao sair
+    finally:
+        con.close()
+
+# --- ENTRADA DE FATURAS ---
+def registrar_fatura(cliente, inicio, fim, kwh_creditado, tarifa, arquivo=None):
+    """Guarda (ou substitui) a fatura do cliente naquele período. Datas: date ou 'YYYY-MM-DD'."""
+    with _conexao() as con:
+        con.execute("INSERT OR REPLACE INTO faturas VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (str(cliente).upper().strip(), str(inicio)[:10], str(fim)[:10], arquivo, float(kwh_creditado or 0), float(tarifa or 0), time.time()))
+
+def registrar_lote(df):
+    """Faturas conciliáveis de um resultado do auditoria_lote.processar_lote (linhas com erro não têm crédito/tarifa)."""
+    validas = df[df["cliente"].notna() & df["inicio"].notna() & (df["status"] != "erro")
+                 & df["kwh_creditado"].notna() & df["tarifa"].notna()]
+    for linha in validas.itertuples():
+        registrar_fatura(linha.cliente, linha.inicio, linha.fim, linha.kwh_creditado, linha.tarifa, linha.arquivo)
+    return len(validas)
+
+def varrer_pasta(pasta, db, max_processos=None):
+    """Lê só os PDFs novos ou alterados (caminho, mtime, tamanho) da pasta de entrada. Retorna quantas faturas entraram."""
+    if not pasta or not os.path.isdir(pasta): return 0
+    with _conexao() as con:
+        vistos = {c: (m, t) for c, m, t in con.execute("SELECT caminho, mtime, tamanho FROM arquivos_lidos")}
+    novos, assinaturas = [], {}
+    for nome, caminho in auditoria_lote.listar_pdfs(pasta):
+        info = os.stat(caminho)
+        if vistos.get(caminho) == (info.st_mtime, info.st_size): continue
+        novos.append((nome, caminho))
+        assinaturas[nome] = (caminho, info.st_mtime, info.st_size)
+    if not novos: return 0
+    nomes_norm = {normalizar_nome(nome): nome for nome in db}
+    entradas = 0
+    for nome_arquivo, dados, cliente, erro, info in auditoria_lote.ler_faturas(novos, db, max_processos):
+        if info["senha"]: auditoria_lote.SENHAS_CLIENTES[info["cliente_senha"]] = info["senha"]
+        if not erro and cliente:
+            inicio, fim = auditoria_lote.periodo_da_fatura(dados)
+            if inicio:
+                registrar_fatura(nomes_norm[cliente], inicio, fim, dados.get("injetado_kwh", 0.0), auditoria_lote.tarifa_da_fatura(dados), nome_arquivo)
+                entradas += 1
+        with _conexao() as con:  # lido (mesmo com erro): só volta a ser lido se o arquivo mudar
+            con.execute("INSERT OR REPLACE INTO arquivos_lidos VALUES (?, ?, ?)", assinaturas[nome_arquivo])
+    return entradas
+
+# --- CICLO ---
+def _ultimas_faturas():
+    with _conexao() as con:
+        linhas = con.execute("""
+            SELECT cliente, inicio, fim, arquivo, kwh_creditado, tarifa FROM faturas f
+            WHERE inicio = (SELECT MAX(inicio) FROM faturas
+                            WHERE cliente = f.cliente AND kwh_creditado IS NOT NULL AND tarifa IS NOT NULL)
+        """).fetchall()  # crédito/tarifa NULL: linha de erro gravada por versões anteriores, fica de fora
+    return {l[0]: l for l in linhas}
+
+def _conciliacoes():
+    with _conexao() as con:
+        return {l[0]: dict(zip(COLUNAS, l)) for l in con.execute(f"SELECT {', '.join(COLUNAS)} FROM conciliacoes")}
+
+def _chave_fatura(fatura, usina):
+    _, inicio, fim, _, kwh_creditado, tarifa = fatura
+    return f"{usina['marca']}:{usina['id']}|{inicio}|{fim}|{kwh_creditado or 0:.3f}|{tarifa or 0:.6f}"
+
+def _buscar(cliente, fatura, usina, buscar_geracao):
+    """Busca a geração do período (também grava os dias no armazém). A conta é feita depois, de uma vez, pelo motor."""
+    _, inicio, fim, arquivo, kwh_creditado, tarifa = fatura
+    linha = dict.fromkeys(COLUNAS)
+    linha.update(cliente=cliente, marca=usina["marca"], id_usina=str(usina["id"]), usina=usina["nome"], arquivo=arquivo,
+                 inicio=inicio, fim=fim, kwh_creditado=kwh_creditado, tarifa=tarifa)
+    try:
+        kwh_gerado, _ = buscar_geracao(usina, date.fromisoformat(inicio), date.fromisoformat(fim))
+    except Exception as e:
+        linha.update(status="erro", erro=f"Falha ao buscar geração: {e}")
+        return linha
+    linha["kwh_gerado"] = float(kwh_gerado)
+    return linha
+
+def _conciliar(linhas):
+    """Concilia as linhas buscadas numa chamada só do motor vetorizado (total do fornecedor + dias do armazém)."""
+    validas = [l for l in linhas if l["status"] != "erro"]
+    if not validas: return
+    import motor_conciliacao  # numpy só quando há o que conciliar
+    usinas = [{"marca": l["marca"], "id": l["id_usina"]} for l in validas]
+    faturas = [(i, l["inicio"], l["fim"], l["kwh_creditado"], l["tarifa"]) for i, l in enumerate(validas)]
+    r = motor_conciliacao.rotulos(motor_conciliacao.conciliar_faturas(usinas, faturas, [l["kwh_gerado"] for l in validas]))
+    for i, linha in enumerate(validas):
+        linha.update({c: r[c][i].item() for c in ("kwh_gerado", "kwh_creditado", "diferenca_kwh", "tarifa", "valor_diferenca", "alerta", "dias_zerados")})
+        linha["status"] = "ok" if linha["kwh_gerado"] > 0 else "sem_geracao"
+
+def executar_ciclo(db, buscar_geracao, pre_carregar=None, pasta=None):
+    """
+    Um ciclo incremental para a frota `db` ({NOME: usina}, saída de carregar_clientes).
+    Só grava as conciliações cujo resultado mudou. Retorna contadores do ciclo.
+    """
+    inicio_ciclo = time.perf_counter()
+    novas_faturas = varrer_pasta(pasta if pasta is not None else PASTA_ENTRADA, db)
+    faturas, atuais = _ultimas_faturas(), _conciliacoes()
+
+    pendentes = []
+    for cliente, usina in db.items():
+        fatura = faturas.get(cliente)
+        if not fatura: continue
+        anterior = atuais.get(cliente)
+        chave = _chave_fatura(fatura, usina)
+        if (anterior and anterior["assinatura"].split("#")[0] == chave and anterior["status"] == "ok"
+                and armazem_geracao.periodo_fechado(fatura[2][:7])):
+            continue  # fatura igual, período fechado e já com geração: nada pode mudar
+        pendentes.append((cliente, fatura, usina, chave))
+
+    if pendentes and pre_carregar:
+        try: pre_carregar([(usina, date.fromisoformat(f[1]), date.fromisoformat(f[2])) for _, f, usina, _ in pendentes])
+        except Exception as e: metricas.erro("pre_carregar", e, pedidos=len(pendentes))  # cada conciliação ainda busca a sua geração
+    with ThreadPoolExecutor(max_workers=MAX_THREADS) as pool:
+        resultados = list(pool.map(lambda p: (p[3], _buscar(p[0], p[1], p[2], buscar_geracao)), pendentes))
+    _conciliar([linha for _, linha in resultados])
+
+    agora, alteradas, mudaram = time.time(), [], []
+    for chave, linha in resultados:
+        linha["assinatura"] = f"{chave}#{linha['kwh_gerado']}"
+        anterior = atuais.get(linha["cliente"])
+        if anterior and anterior["assinatura"] == linha["assinatura"] and anterior["status"] == linha["status"]: continue
+        linha["calculado_em"] = agora
+        alteradas.append(tuple(linha[c] for c in COLUNAS))
+        mudaram.append(linha)
+    removidos = [c for c in atuais if c not in db]
+    with _conexao() as con:
+        con.executemany(f"INSERT OR REPLACE INTO conciliacoes ({', '.join(COLUNAS)}) VALUES ({', '.join('?' * len(COLUNAS))})", alteradas)
+        con.executemany("DELETE FROM conciliacoes WHERE cliente = ?", [(c,) for c in removidos])
+    planilha_clientes.registrar_auditorias(mudaram, "frota")  # só o que mudou vai para a aba Auditorias
+    return {
+        "faturas_novas": novas_faturas, "clientes": len(db), "reconciliados": len(pendentes),
+        "alterados": len(alteradas), "removidos": len(removidos), "segundos": round(time.perf_counter() - inicio_ciclo, 2),
+    }
+
+# --- AGENDADOR (um por processo) ---
+ESTADO = {"rodando": False, "ultimo_ciclo": None, "ultimo_resultado": None, "erro": None}
+_AGENDADOR = {"thread": None, "acordar": threading.Event()}
+
+def _laco(contexto, intervalo):
+    while True:
+        ESTADO["rodando"] = True
+        try:
+            db, buscar_geracao, pre_carregar = contexto()
+            if db: ESTADO.update(ultimo_resultado=executar_ciclo(db, buscar_geracao, pre_carregar), erro=None)
+        except Exception as e:
+            ESTADO["erro"] = str(e)
+            metricas.erro("frota:ciclo", e)
+        ESTADO.update(rodando=False, ultimo_ciclo=time.time())
+        _AGENDADOR["acordar"].wait(intervalo)
+        _AGENDADOR["acordar"].clear()
+
+def iniciar(contexto, intervalo=INTERVALO):
+    """
+    Sobe o agendador uma única vez por processo (chamadas seguintes não fazem nada).
+    contexto() -> (db, buscar_geracao, pre_carregar), chamado a cada ciclo (pega a planilha atualizada).
+    """
+    with _LOCK:
+        if _AGENDADOR["thread"] and _AGENDADOR["thread"].is_alive(): return
+        _AGENDADOR["thread"] = threading.Thread(target=_laco, args=(contexto, intervalo), daemon=True, name="conciliacao-frota")
+        _AGENDADOR["thread"].start()
+
+def agendar_agora():
+    """Antecipa o próximo ciclo (ex: depois de um lote novo)."""
+    _AGENDADOR["acordar"].set()
+
+# --- PAINEL ---
+def painel(limite=10):
+    """KPIs da frota a partir da tabela materializada (não vai à rede nem carrega o pandas)."""
+    with _conexao() as con:
+        con.row_factory = sqlite3.Row
+        clientes, com_prejuizo, em_risco, atualizado_em = con.execute(
+            "SELECT COUNT(*), SUM(alerta = 'prejuizo'), SUM(CASE WHEN alerta = 'prejuizo' THEN ABS(valor_diferenca) END), MAX(calculado_em) FROM conciliacoes"
+        ).fetchone()
+        piores = con.execute("""SELECT cliente, usina, inicio, diferenca_kwh, valor_diferenca FROM conciliacoes
+                                WHERE alerta = 'prejuizo' ORDER BY valor_diferenca LIMIT ?""", (limite,)).fetchall()
+        sem_dados = con.execute("""SELECT cliente, usina, marca, inicio, status, erro FROM conciliacoes
+                                   WHERE status IN ('sem_geracao', 'erro') ORDER BY cliente""").fetchall()
+        dias_parados = con.execute("""SELECT cliente, usina, marca, inicio, dias_zerados FROM conciliacoes
+                                      WHERE dias_zerados > 0 AND status = 'ok' ORDER BY dias_zerados DESC LIMIT ?""", (limite,)).fetchall()
+    return {
+        "clientes": clientes,
+        "em_risco": float(em_risco or 0),
+        "com_prejuizo": int(com_prejuizo or 0),
+        "piores": [dict(l) for l in piores],
+        "sem_dados": [dict(l) for l in sem_dados],
+        "dias_parados": [dict(l) for l in dias_parados],
+        "atualizado_em": atualizado_em,
+    }
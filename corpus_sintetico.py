@@ -0,0 +1,164 @@
+"""
+Gerador de faturas sintéticas (PDF) com gabarito, para o benchmark do leitor de faturas.
+
+Layouts das principais concessionárias (CEMIG, ENEL, NEOENERGIA), faturas de uma ou
+várias páginas (condomínios com vários UCs, com linhas de crédito espalhadas pelas páginas
+de detalhamento) e parte delas protegida com o CPF do titular,
+como as concessionárias enviam hoje. O PDF é escrito à mão (texto Helvetica), sem depender
+de bibliotecas de geração; a criptografia usa o pypdf.
+"""
+import io
+import json
+import os
+import random
+from datetime import date
+
+import pypdf
+
+CORPUS_VERSAO = 2   # mude ao alterar o gerador: o benchmark não reaproveita corpus de outra versão
+MESES_ABREV = ["JAN", "FEV", "MAR", "ABR", "MAI", "JUN", "JUL", "AGO", "SET", "OUT", "NOV", "DEZ"]
+NOMES = ["JOAO DA SILVA", "MARIA SOUZA LIMA", "CONDOMINIO RESIDENCIAL AURORA", "PADARIA PAO QUENTE LTDA", "ANA PAULA FERREIRA", "CARLOS EDUARDO ROCHA"]
+
+# --- PDF MÍNIMO ---
+def _escapar(texto):
+    return texto.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+def pdf_texto(paginas):
+    """Monta um PDF (bytes) com uma lista de páginas, cada uma uma lista de linhas de texto."""
+    objetos = [b"<< /Type /Catalog /Pages 2 0 R >>", None, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>"]
+    filhos = []
+    for i, linhas in enumerate(paginas):
+        id_pagina, id_conteudo = 4 + 2 * i, 5 + 2 * i
+        filhos.append(f"{id_pagina} 0 R")
+        fluxo = "BT /F1 9 Tf 36 806 Td 12 TL " + " ".join(f"({_escapar(l)}) '" for l in linhas) + " ET"
+        fluxo = fluxo.encode("latin-1", "replace")
+        objetos.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] /Resources << /Font << /F1 3 0 R >> >> /Contents {id_conteudo} 0 R >>".encode())
+        objetos.append(f"<< /Length {len(fluxo)} >>\nstream\n".encode() + fluxo + b"\nendstream")
+    objetos[1] = f"<< /Type /Pages /Kids [{' '.join(filhos)}] /Count {len(paginas)} >>".encode()
+
+    saida = bytearray(b"%PDF-1.4\n")
+    posicoes = []
+    for i, obj in enumerate(objetos, start=1):
+        posicoes.append(len(saida))
+        saida += f"{i} 0 obj\n".encode() + obj + b"\nendobj\n"
+    inicio_xref = len(saida)
+    saida += f"xref\n0 {len(objetos) + 1}\n0000000000 65535 f \n".encode()
+    for pos in posicoes:
+        saida += f"{pos:010d} 00000 n \n".encode()
+    saida += f"trailer\n<< /Size {len(objetos) + 1} /Root 1 0 R >>\nstartxref\n{inicio_xref}\n%%EOF\n".encode()
+    return bytes(saida)
+
+def proteger(conteudo, senha):
+    """Criptografa o PDF com a senha (como as concessionárias fazem com o CPF)."""
+    leitor = pypdf.PdfReader(io.BytesIO(conteudo))
+    writer = pypdf.PdfWriter()
+    for page in leitor.pages: writer.add_page(page)
+    writer.encrypt(senha, algorithm="RC4-128")
+    saida = io.BytesIO()
+    writer.write(saida)
+    return saida.getvalue()
+
+# --- VALORES E LAYOUTS ---
+def br(valor):
+    """1234.5 -> '1.234,50'"""
+    return f"{valor:,.2f}".replace(",", "_").replace(".", ",").replace("_", ".")
+
+def _cpf(rng):
+    return "".join(str(rng.randint(0, 9)) for _ in range(11))
+
+def _filler(rng, n, mes_ref):
+    """Linhas sem nenhum campo da auditoria (histórico, avisos, dados de UC)."""
+    linhas = []
+    for i in range(n):
+        tipo = rng.randrange(4)
+        if tipo == 0: linhas.append(f"Historico {MESES_ABREV[(mes_ref.month - 2 - i) % 12]}/{str(mes_ref.year)[2:]} {rng.randint(150, 900)} dias {rng.randint(28, 33)}")
+        elif tipo == 1: linhas.append(f"Unidade consumidora {rng.randint(10**8, 10**9)} Medidor {rng.randint(10**5, 10**6)}")
+        elif tipo == 2: linhas.append("Aviso: mantenha seus dados cadastrais atualizados no aplicativo")
+        else: linhas.append(f"Codigo de barras {rng.randint(10**10, 10**11)} {rng.randint(10**10, 10**11)}")
+    return linhas
+
+def gerar_fatura(rng, layout, paginas_extras=0):
+    """Retorna (paginas, gabarito) de uma fatura sintética."""
+    mes_ref = date(rng.choice([2024, 2025]), rng.randint(1, 12), 1)
+    ref = f"{MESES_ABREV[mes_ref.month - 1]}/{mes_ref.year}"
+    nome = rng.choice(NOMES)
+    consumo = round(rng.uniform(150, 1500), 2)
+    injetado = round(consumo * rng.uniform(0.3, 1.1), 2)
+    tusd, te = round(rng.uniform(0.35, 0.55), 6), round(rng.uniform(0.28, 0.42), 6)
+    tarifa_cred = round((tusd + te) * rng.uniform(0.75, 0.95), 6)
+    cip = round(rng.uniform(8, 60), 2)
+
+    if layout == "CEMIG":
+        valor_cons = round(consumo * (tusd + te), 2)
+        itens = [f"Energia Eletrica kWh {br(consumo)} {br(tusd + te)} {br(valor_cons)}"]
+        linha_credito = lambda kwh: f"Energia compensada GD I kWh {br(kwh)} {br(tarifa_cred)} -{br(round(kwh * tarifa_cred, 2))}"
+        cabecalho = ["CEMIG DISTRIBUICAO S.A. CNPJ 06.981.180/0001-16", f"Titular {nome}", f"Referente a {ref} Vencimento 10/{mes_ref.month:02d}/{mes_ref.year}"]
+        cip_linha = f"Contrib Ilum Publica Municipal {br(cip)}"
+    elif layout == "ENEL":
+        v_tusd, v_te = round(consumo * tusd, 2), round(consumo * te, 2)
+        valor_cons = round(v_tusd + v_te, 2)
+        itens = [f"Consumo Uso Sistema [KWh]-TUSD {br(consumo)} {br(tusd)} {br(v_tusd)}", f"Consumo - TE kWh {br(consumo)} {br(te)} {br(v_te)}"]
+        linha_credito = lambda kwh: f"Energia Ativa Injetada kWh {br(kwh)} {br(tarifa_cred)} -{br(round(kwh * tarifa_cred, 2))}"
+        cabecalho = ["Enel Distribuicao Sao Paulo", f"Nome {nome}", f"Mes de referencia {ref}"]
+        cip_linha = f"CIP-ILUM PUB PREF MUNICIPAL {br(cip)}"
+    else:  # NEOENERGIA
+        valor_cons = round(consumo * (tusd + te), 2)
+        itens = [f"Consumo Ativo(kWh) {br(consumo)} {br(tusd + te)} {br(valor_cons)}"]
+        linha_credito = lambda kwh: f"Energia Inj. oUC kWh {br(kwh)} {br(tarifa_cred)} {br(round(kwh * tarifa_cred, 2))}"
+        cabecalho = ["COELBA - Grupo Neoenergia", f"Cliente {nome}", f"Conta de {ref}"]
+        cip_linha = f"Contrib. Ilum. Publica {br(cip)}"
+
+    # Fatura longa (ex: condomínio com vários UCs): páginas extras de detalhamento, metade delas
+    # com o crédito de outra UC. Os totais somados só fecham lendo o documento inteiro.
+    credito_total = injetado
+    valor_credito = round(injetado * tarifa_cred, 2)
+    paginas = [cabecalho + _filler(rng, 10, mes_ref) + itens + [linha_credito(injetado)]]
+    for _ in range(paginas_extras):
+        pagina = _filler(rng, 40, mes_ref)
+        if rng.random() < 0.5:
+            kwh_uc = round(rng.uniform(20, 400), 2)
+            pagina.insert(rng.randrange(len(pagina) + 1), linha_credito(kwh_uc))
+            credito_total = round(credito_total + kwh_uc, 2)
+            valor_credito = round(valor_credito + round(kwh_uc * tarifa_cred, 2), 2)
+        paginas.append(pagina)
+    # CIP junto dos itens (1ª página, como na maioria das contas) ou no fim do documento
+    if rng.random() < 0.5: paginas[0].append(cip_linha)
+    else: paginas[-1].append(cip_linha)
+
+    gabarito = {
+        "layout": layout,
+        "titular": nome,
+        "paginas": len(paginas),
+        "mes_referencia": mes_ref.isoformat(),
+        "consumo_kwh": consumo,
+        "valor_consumo_total": valor_cons,
+        "injetado_kwh": credito_total,
+        "valor_credito_total": valor_credito,
+        "cip_cosip": cip,
+    }
+    return paginas, gabarito
+
+def gerar_corpus(pasta, quantidade=100, semente=42, fracao_protegida=0.3, fracao_multipagina=0.3):
+    """
+    Grava `quantidade` faturas em `pasta` + gabarito.json ({arquivo: valores esperados e senha}).
+    Determinístico para a mesma semente.
+    """
+    rng = random.Random(semente)
+    os.makedirs(pasta, exist_ok=True)
+    gabarito = {}
+    for i in range(quantidade):
+        layout = ("CEMIG", "ENEL", "NEOENERGIA")[i % 3]
+        extras = rng.randint(2, 30) if rng.random() < fracao_multipagina else 0
+        paginas, esperado = gerar_fatura(rng, layout, extras)
+        conteudo = pdf_texto(paginas)
+        esperado["senha"] = None
+        if rng.random() < fracao_protegida:
+            esperado["senha"] = _cpf(rng)
+            conteudo = proteger(conteudo, esperado["senha"])
+        nome_arquivo = f"fatura_{i:04d}_{layout.lower()}.pdf"
+        with open(os.path.join(pasta, nome_arquivo), "wb") as f:
+            f.write(conteudo)
+        gabarito[nome_arquivo] = esperado
+    with open(os.path.join(pasta, "gabarito.json"), "w", encoding="utf-8") as f:
+        json.dump(gabarito, f, indent=2, ensure_ascii=False)
+    return gabarito
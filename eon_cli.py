@@ -0,0 +1,206 @@
+"""
+Auditor Eon sem interface: o mesmo núcleo do portal/app, pela linha de comando.
+
+Uso:
+    python eon_cli.py audit fatura.pdf --cliente "JOAO DA SILVA"          # conciliação da fatura
+    python eon_cli.py audit fatura.pdf --marca Huawei --usina NE=123 --ia --geracao 850
+    python eon_cli.py batch /dados/faturas/2024-05 --saida resultado.parquet
+    python eon_cli.py fetch-generation --marca Solis --usina 1298491919449000000 --inicio 2024-05-01 --fim 2024-05-31
+    python eon_cli.py bench --faturas 500
+
+Clientes: planilha do Google (EON_GCP_SERVICE_ACCOUNT) ou --clientes arquivo.csv com as mesmas colunas.
+Fornecedores: variáveis EON_HUAWEI_* / EON_SOLIS_* (ex: apontar para o simulador_fornecedores.py).
+"""
+import argparse
+import json
+import sys
+from datetime import date
+
+def _data(texto):
+    return date.fromisoformat(texto)
+
+def _clientes(args):
+    import planilha_clientes
+    if args.clientes: return planilha_clientes.carregar_clientes_csv(args.clientes)
+    return planilha_clientes.carregar_clientes()
+
+def _registrar_auditorias(resultados, origem):
+    """Envia os resultados para a aba Auditorias (com EON_GCP_SERVICE_ACCOUNT) antes de a CLI sair."""
+    import planilha_clientes
+    if planilha_clientes.registrar_auditorias(resultados, origem):
+        planilha_clientes.descarregar()  # o que não subir fica na fila local para a próxima execução
+
+def _imprimir(dados, como_json):
+    if como_json:
+        print(json.dumps(dados, ensure_ascii=False, indent=2, default=str))
+    else:
+        for chave, valor in dados.items(): print(f"{chave:>16}: {valor}")
+
+# --- COMANDOS ---
+def cmd_audit(args):
+    import auditoria_lote
+    import fornecedores
+    import indice_clientes
+    import processador_pdf
+
+    with open(args.pdf, "rb") as f:
+        pdf, status = processador_pdf.verificar_e_desbloquear_pdf(f.read(), args.senha)
+    if status != "ok":
+        print(f"Não foi possível abrir o PDF: {status}", file=sys.stderr)
+        return 2
+    dados = processador_pdf.extrair_dados_fatura(pdf)
+
+    if args.marca and args.usina:
+        cliente, usina = args.cliente, {"marca": args.marca, "id": args.usina, "nome": args.usina}
+    else:
+        _clientes(args)
+        cliente, usina = indice_clientes.INDICE.buscar((args.cliente or "").upper().strip())
+        if not usina:
+            print("Cliente não encontrado (use --cliente, ou --marca e --usina).", file=sys.stderr)
+            return 2
+
+    inicio, fim = (args.inicio, args.fim) if args.inicio and args.fim else auditoria_lote.periodo_da_fatura(dados)
+    if not inicio:
+        print("Mês de referência não encontrado na fatura: informe --inicio e --fim.", file=sys.stderr)
+        return 2
+    try:
+        kwh_gerado, _ = fornecedores.buscar_geracao(usina, inicio, fim)
+    except Exception as e:
+        print(f"Falha ao buscar geração: {e}", file=sys.stderr)
+        return 1
+    tarifa = args.tarifa or auditoria_lote.tarifa_da_fatura(dados)
+    resultado = {"cliente": cliente, "marca": usina["marca"], "usina": usina["nome"], "inicio": inicio, "fim": fim,
+                 **auditoria_lote.conciliar(float(kwh_gerado), dados.get("injetado_kwh", 0.0), tarifa)}
+
+    if args.ia:
+        import auditor_ia
+        if not auditor_ia.configurar():
+            print("Defina GOOGLE_API_KEY para usar --ia.", file=sys.stderr)
+            return 2
+        etapas = []
+        local = auditor_ia.leitura_local(pdf, etapas)
+        resultado["datas_leitura"] = auditor_ia.obter_datas(pdf, local, etapas=etapas)
+        relatorio, _ = auditor_ia.obter_relatorio(pdf, local, args.geracao or round(float(kwh_gerado)), ignorar_cache=args.ignorar_cache, etapas=etapas)
+        resultado.update(metricas=relatorio.get("metricas"), relatorio=relatorio.get("relatorio"), whatsapp=relatorio.get("whatsapp"), etapas_ia=etapas)
+    _registrar_auditorias([{**resultado, "arquivo": args.pdf, "status": "ok" if resultado["kwh_gerado"] > 0 else "sem_geracao"}], "cli")
+    _imprimir(resultado, args.json)
+    return 0
+
+def cmd_batch(args):
+    import auditoria_lote
+    import fornecedores
+
+    db = _clientes(args)
+    if not db:
+        print("Nenhum cliente carregado (EON_GCP_SERVICE_ACCOUNT ou --clientes).", file=sys.stderr)
+        return 2
+
+    def ao_progredir(concluidas, total, taxa):
+        print(f"\r{concluidas}/{total} faturas · {taxa:.1f} faturas/s", end="", file=sys.stderr, flush=True)
+
+    df = auditoria_lote.processar_lote(args.origem, db, fornecedores.buscar_geracao, ao_progredir=ao_progredir,
+                                       max_processos=args.processos, max_threads=args.threads,
+                                       pre_carregar=fornecedores.pre_carregar_geracao)
+    print(file=sys.stderr)
+    if args.saida: auditoria_lote.exportar_resultado(df, args.saida)
+    if args.registrar:
+        import conciliacao_frota
+        conciliacao_frota.registrar_lote(df)
+    _registrar_auditorias(df.to_dict("records"), "cli_lote")
+    prejuizo = df[df["alerta"] == "prejuizo"]
+    _imprimir({
+        "faturas": len(df),
+        "por_status": df["status"].value_counts().to_dict(),
+        "com_prejuizo": len(prejuizo),
+        "em_risco": round(float(prejuizo["valor_diferenca"].abs().sum()), 2),
+        "saida": args.saida,
+    }, args.json)
+    return 0
+
+def cmd_fetch_generation(args):
+    import fornecedores
+
+    usinas = [{"marca": args.marca, "id": u, "nome": u} for u in args.usina]
+    if len(usinas) > 1: fornecedores.pre_carregar_geracao([(u, args.inicio, args.fim) for u in usinas])  # frota Huawei: até 100 por chamada
+    saida = {}
+    for usina in usinas:
+        try:
+            total, df = fornecedores.buscar_geracao(usina, args.inicio, args.fim)
+        except Exception as e:
+            saida[usina["id"]] = {"erro": str(e)}  # incompleto/indisponível: não sai como 0 kWh
+            continue
+        saida[usina["id"]] = {"kwh": round(float(total), 2)}
+        if args.diario and not df.empty:
+            saida[usina["id"]]["diario"] = {d.date().isoformat(): kwh for d, kwh in df["kWh"].items()}
+    if args.json:
+        _imprimir(saida, True)
+    else:
+        for estacao, dados in saida.items():
+            if "erro" in dados:
+                print(f"{args.marca} {estacao}: ERRO {dados['erro']}", file=sys.stderr)
+                continue
+            print(f"{args.marca} {estacao}: {dados['kwh']} kWh ({args.inicio} a {args.fim})")
+            for dia, kwh in dados.get("diario", {}).items(): print(f"  {dia}  {kwh:.2f}")
+    return 0
+
+def cmd_bench(args):
+    import benchmark
+    benchmark.main(args.argumentos)
+    return 0
+
+def montar_parser():
+    parser = argparse.ArgumentParser(prog="eon_cli.py", description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="comando", required=True)
+
+    p = sub.add_parser("audit", help="concilia uma fatura (e, com --ia, gera o relatório do auditor)")
+    p.add_argument("pdf")
+    p.add_argument("--senha", help="senha do PDF protegido (CPF/CNPJ)")
+    p.add_argument("--cliente", help="nome do cliente na planilha")
+    p.add_argument("--clientes", help="CSV de clientes no lugar da planilha")
+    p.add_argument("--marca", choices=["Huawei", "Solis"])
+    p.add_argument("--usina", help="stationCode (Huawei) ou id (Solis)")
+    p.add_argument("--inicio", type=_data, help="AAAA-MM-DD (padrão: mês de referência da fatura)")
+    p.add_argument("--fim", type=_data)
+    p.add_argument("--tarifa", type=float, help="R$/kWh (padrão: tarifa lida da fatura)")
+    p.add_argument("--ia", action="store_true", help="gera também o relatório do Gemini (GOOGLE_API_KEY)")
+    p.add_argument("--geracao", type=float, help="kWh informado ao relatório (padrão: geração buscada)")
+    p.add_argument("--ignorar-cache", action="store_true")
+    p.add_argument("--json", action="store_true")
+    p.set_defaults(funcao=cmd_audit)
+
+    p = sub.add_parser("batch", help="audita um ZIP ou pasta de faturas")
+    p.add_argument("origem", help="arquivo .zip ou pasta")
+    p.add_argument("--saida", help="resultado .csv ou .parquet")
+    p.add_argument("--clientes", help="CSV de clientes no lugar da planilha")
+    p.add_argument("--processos", type=int, help="processos de leitura de PDF (padrão: núcleos)")
+    p.add_argument("--threads", type=int, default=8, help="threads de busca de geração")
+    p.add_argument("--registrar", action="store_true", help="registra as faturas na conciliação da frota")
+    p.add_argument("--json", action="store_true")
+    p.set_defaults(funcao=cmd_batch)
+
+    p = sub.add_parser("fetch-generation", help="geração de uma ou mais usinas no período")
+    p.add_argument("--marca", choices=["Huawei", "Solis"], required=True)
+    p.add_argument("--usina", nargs="+", required=True)
+    p.add_argument("--inicio", type=_data, required=True)
+    p.add_argument("--fim", type=_data, required=True)
+    p.add_argument("--diario", action="store_true", help="lista também os valores diários")
+    p.add_argument("--json", action="store_true")
+    p.set_defaults(funcao=cmd_fetch_generation)
+
+    p = sub.add_parser("bench", help="benchmark do caminho de PDF (demais argumentos vão para o benchmark.py)")
+    p.set_defaults(funcao=cmd_bench)
+    return parser
+
+def main(argv=None):
+    parser = montar_parser()
+    args, extras = parser.parse_known_args(argv)
+    if args.comando != "bench" and extras: parser.error(f"argumentos desconhecidos: {' '.join(extras)}")
+    args.argumentos = extras
+    try:
+        return args.funcao(args)
+    finally:
+        import metricas
+        metricas.exportar()  # EON_METRICAS_PROM: tempos desta execução para o textfile collector
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,162 @@
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+import metricas
+
+# Escrita na planilha em segundo plano (write-behind):
+# - Quem grava só enfileira: a linha vai para um SQLite local na hora (nada se perde num restart)
+#   e uma thread por processo descarrega em lotes, um append_rows por aba (1 requisição para N linhas).
+# - A cota do Sheets é de ~60 escritas/min: as chamadas são espaçadas e erro de cota (429) ou
+#   instabilidade (5xx) volta com backoff exponencial; o que não subiu fica na fila para o próximo ciclo.
+# - Linhas que o Sheets recusa de vez (4xx) param depois de MAX_TENTATIVAS e ficam na fila para inspeção.
+CAMINHO = os.environ.get("EON_FILA_PLANILHA", os.path.join(os.path.dirname(os.path.abspath(__file__)), "dados", "fila_planilha.sqlite3"))
+INTERVALO = float(os.environ.get("EON_FILA_INTERVALO", "5"))   # segundos entre descargas
+LOTE_MAXIMO = 500                 # linhas por append_rows
+ESCRITAS_POR_SEGUNDO = 0.8        # abaixo das 60 escritas/min da cota
+ESPERAS_COTA = [2, 4, 8, 16, 32]  # backoff (s) para 429/5xx, com jitter
+MAX_TENTATIVAS = 10
+RESERVA_SEGUNDOS = 300            # linha reservada por um processo que caiu volta à fila depois disso
+
+_LOCK = threading.Lock()
+_INICIALIZADO = set()
+_DESCARGA = threading.Lock()      # uma descarga por vez no processo
+_AGENDADOR = {"thread": None, "acordar": threading.Event(), "abrir_aba": None}
+ESTADO = {"enviadas": 0, "ultimo_envio": None, "erro": None}
+
+def _conectar():
+    with _LOCK:
+        if CAMINHO not in _INICIALIZADO:
+            os.makedirs(os.path.dirname(CAMINHO) or ".", exist_ok=True)
+            con = sqlite3.connect(CAMINHO)
+            con.execute("PRAGMA journal_mode=WAL")
+            con.execute("""
+                CREATE TABLE IF NOT EXISTS pendentes (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT, aba TEXT, linha TEXT, criada_em REAL,
+                    tentativas INTEGER DEFAULT 0, reservada_em REAL, erro TEXT
+                )
+            """)
+            con.close()
+            _INICIALIZADO.add(CAMINHO)
+    return sqlite3.connect(CAMINHO, timeout=30)
+
+@contextmanager
+def _conexao():
+    con = _conectar()
+    try:
+        with con: yield con  # commit ao sair
+    finally:
+        con.close()
+
+# --- FILA ---
+def enfileirar(aba, linhas):
+    """Grava as linhas (listas de valores) na fila local da aba e acorda a descarga. Retorna quantas entraram."""
+    linhas = [json.dumps(list(l), ensure_ascii=False, default=str) for l in linhas]
+    if not linhas: return 0
+    agora = time.time()
+    with _conexao() as con:
+        con.executemany("INSERT INTO pendentes (aba, linha, criada_em) VALUES (?, ?, ?)", [(aba, l, agora) for l in linhas])
+    _AGENDADOR["acordar"].set()
+    return len(linhas)
+
+def pendentes():
+    """{aba: linhas na fila} (inclui as que esgotaram as tentativas)."""
+    with _conexao() as con:
+        return dict(con.execute("SELECT aba, COUNT(*) FROM pendentes GROUP BY aba").fetchall())
+
+def _reservar(aba, limite):
+    agora = time.time()
+    with _conexao() as con:
+        con.execute("BEGIN IMMEDIATE")  # outro processo (ex: CLI) descarregando ao mesmo tempo não pega as mesmas linhas
+        linhas = con.execute(
+            "SELECT id, linha FROM pendentes WHERE aba = ? AND tentativas < ? AND (reservada_em IS NULL OR reservada_em < ?) ORDER BY id LIMIT ?",
+            (aba, MAX_TENTATIVAS, agora - RESERVA_SEGUNDOS, limite),
+        ).fetchall()
+        con.executemany("UPDATE pendentes SET reservada_em = ? WHERE id = ?", [(agora, i) for i, _ in linhas])
+    return linhas
+
+def _liberar(ids, erro, conta_tentativa):
+    with _conexao() as con:
+        con.executemany(
+            "UPDATE pendentes SET reservada_em = NULL, erro = ?, tentativas = tentativas + ? WHERE id = ?",
+            [(erro, int(conta_tentativa), i) for i in ids],
+        )
+
+def _status_http(erro):
+    resposta = getattr(erro, "response", None)
+    return getattr(resposta, "status_code", None)
+
+def _enviar(sheet, linhas):
+    """append_rows com backoff para cota/instabilidade. Levanta a última exceção se não conseguir."""
+    import rede
+    limitador = rede.limitador("sheets", ESCRITAS_POR_SEGUNDO)
+    for espera in ESPERAS_COTA + [None]:
+        limitador.aguardar()
+        try:
+            with metricas.medir("sheets:append_rows", linhas=len(linhas)):
+                # RAW, como o append_row de antes: o Sheets não interpreta nada (ID Solis de 19 dígitos
+                # viraria número e perderia precisão; texto começando com "=" viraria fórmula)
+                sheet.append_rows(linhas, value_input_option="RAW")
+            return
+        except Exception as e:
+            status = _status_http(e)
+            temporario = status is None or status == 429 or status >= 500
+            if not temporario or espera is None: raise
+            metricas.contar("retentativas", fornecedor="sheets", motivo="cota" if status == 429 else "instavel")
+            time.sleep(espera * random.uniform(0.8, 1.2))
+
+def descarregar(abrir_aba=None):
+    """Envia o que está na fila, aba por aba, em lotes. Retorna quantas linhas subiram."""
+    abrir_aba = abrir_aba or _AGENDADOR["abrir_aba"]
+    if not abrir_aba: return 0
+    enviadas = 0
+    with _DESCARGA:
+        for aba in pendentes():
+            sheet = None
+            while True:
+                linhas = _reservar(aba, LOTE_MAXIMO)
+                if not linhas: break
+                ids = [i for i, _ in linhas]
+                try:
+                    sheet = sheet or abrir_aba(aba)
+                    if not sheet:
+                        _liberar(ids, "planilha indisponível", False)
+                        break
+                    _enviar(sheet, [json.loads(l) for _, l in linhas])
+                except Exception as e:
+                    status = _status_http(e)
+                    _liberar(ids, f"{type(e).__name__}: {e}"[:500], status is not None and 400 <= status < 500 and status != 429)
+                    ESTADO["erro"] = str(e)
+                    break  # a aba fica para o próximo ciclo
+                with _conexao() as con:
+                    con.executemany("DELETE FROM pendentes WHERE id = ?", [(i,) for i in ids])
+                enviadas += len(ids)
+                ESTADO.update(enviadas=ESTADO["enviadas"] + len(ids), ultimo_envio=time.time(), erro=None)
+    return enviadas
+
+# --- DESCARGA EM SEGUNDO PLANO (uma thread por processo) ---
+def _laco():
+    while True:
+        _AGENDADOR["acordar"].wait(INTERVALO)
+        _AGENDADOR["acordar"].clear()
+        try: descarregar()
+        except Exception as e:
+            ESTADO["erro"] = str(e)
+            metricas.erro("sheets:fila", e)
+
+def iniciar(abrir_aba):
+    """
+    Liga a descarga em segundo plano. abrir_aba(nome) -> worksheet ou None.
+    O que ficou na fila de uma execução anterior sobe no primeiro ciclo.
+    """
+    with _LOCK:
+        _AGENDADOR["abrir_aba"] = abrir_aba
+        if _AGENDADOR["thread"] and _AGENDADOR["thread"].is_alive(): return
+        t = threading.Thread(target=_laco, name="fila-planilha", daemon=True)
+        _AGENDADOR["thread"] = t
+        t.start()
+    _AGENDADOR["acordar"].set()
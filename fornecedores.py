@@ -0,0 +1,257 @@
+import base64
+import hashlib
+import hmac
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timezone
+
+import rede
+import metricas
+import armazem_geracao
+import planejador_huawei
+import catalogo_usinas
+
+# Clientes do FusionSolar (Huawei) e da SolisCloud: login, busca de geração e listagem de usinas.
+# Sem Streamlit: importável pelo portal, pela CLI (eon_cli.py) e por workers.
+# O pandas só é importado na primeira busca de geração (não pesa na subida do app).
+
+# --- CREDENCIAIS ---
+# Variáveis EON_* sobrescrevem os padrões (ex: apontar para o simulador_fornecedores.py)
+CREDS = {
+    "huawei": {
+        "user": os.environ.get("EON_HUAWEI_USER", "Eon.solar"),
+        "pass": os.environ.get("EON_HUAWEI_PASS", "eonsolar2024"),
+        "url": os.environ.get("EON_HUAWEI_URL", "https://la5.fusionsolar.huawei.com/thirdData")
+    },
+    "solis": {
+        "key_id": os.environ.get("EON_SOLIS_KEY_ID", "1300386381676798170"),
+        "key_secret": os.environ.get("EON_SOLIS_KEY_SECRET", "70b315e18b914435abe726846e950eab"),
+        "url": os.environ.get("EON_SOLIS_URL", "https://www.soliscloud.com:13333")
+    }
+}
+
+# --- AUTH ---
+HUAWEI_TOKEN_TTL = 25 * 60   # a sessão do FusionSolar expira após 30 min sem uso
+HUAWEI_FAIL_RELOGIN = 305    # failCode "USER_MUST_RELOGIN"
+
+def _json(r):
+    try: return r.json()
+    except ValueError: return {}
+
+def _login_huawei():
+    try:
+        with metricas.medir("huawei:login"):
+            r = rede.requisitar("huawei", "POST", f"{CREDS['huawei']['url']}/login", endpoint="login", timeout=10, tentativas=2,
+                                json={"userName": CREDS['huawei']['user'], "systemCode": CREDS['huawei']['pass']})
+            resposta = r.json()
+        if resposta.get("success"): return r.headers.get("xsrf-token")
+        metricas.erro("huawei:login", falha=resposta.get("failCode"))
+    except Exception: pass  # já contado pelo medir; sem token as buscas voltam vazias
+    return None
+
+def get_huawei_token():
+    return rede.gerenciador_token("huawei", _login_huawei, HUAWEI_TOKEN_TTL).obter()
+
+def post_huawei(endpoint, payload, timeout=10):
+    """
+    POST autenticado no FusionSolar pela camada resiliente do rede.py (prazo, retentativas, disjuntor;
+    as consultas de KPI podem usar hedge). Limite de taxa (failCode 407) é repetido lá, com espera.
+    Refaz o login uma única vez se a sessão tiver expirado.
+    """
+    gerenciador = rede.gerenciador_token("huawei", _login_huawei, HUAWEI_TOKEN_TTL)
+    for _ in range(2):
+        token = gerenciador.obter()
+        if not token: return {}
+        with metricas.medir(f"huawei:{endpoint}"):
+            r = rede.requisitar("huawei", "POST", f"{CREDS['huawei']['url']}/{endpoint}", endpoint=endpoint, timeout=timeout,
+                                esperas_limite=planejador_huawei.ESPERAS_LIMITE_TAXA, hedge=endpoint.startswith("getKpi"),
+                                e_limite=lambda r: _json(r).get("failCode") == planejador_huawei.FAIL_LIMITE_TAXA,
+                                json=payload, headers={"xsrf-token": token})
+            resposta = r.json()
+        if not resposta.get("success"): metricas.contar("falhas_api", fornecedor="huawei", endpoint=endpoint, codigo=resposta.get("failCode"))
+        if resposta.get("failCode") != HUAWEI_FAIL_RELOGIN: return resposta
+        metricas.contar("retentativas", fornecedor="huawei", motivo="relogin")
+        gerenciador.invalidar(token)
+    return {}
+
+def get_solis_auth(resource, body):
+    now = datetime.now(timezone.utc).strftime("%a, %d %b %Y %H:%M:%S GMT")
+    content_md5 = base64.b64encode(hashlib.md5(body.encode('utf-8')).digest()).decode('utf-8')
+    key = CREDS['solis']['key_secret'].encode('utf-8')
+    sign_str = f"POST\n{content_md5}\napplication/json\n{now}\n{resource}"
+    signature = hmac.new(key, sign_str.encode('utf-8'), hashlib.sha1).digest()
+    auth = f"API {CREDS['solis']['key_id']}:{base64.b64encode(signature).decode('utf-8')}"
+    return {"Authorization": auth, "Content-MD5": content_md5, "Content-Type": "application/json", "Date": now}
+
+# --- BUSCA SOLIS (Lógica Completa) ---
+# A SolisCloud limita a frequência de chamadas por chave; acima disso responde erro.
+# O prazo da busca inteira é o da auditoria (rede.prazo, EON_PRAZO_AUDITORIA).
+SOLIS_REQ_POR_SEGUNDO = 2
+SOLIS_MAX_CONCORRENCIA = 4
+SOLIS_TIMEOUT = (5, 15)      # (conexão, leitura) de cada requisição
+SOLIS_CODIGOS_LIMITE = {"Z0002"}   # "too many requests"
+
+def _post_solis(recurso, body, hedge=False):
+    """POST assinado na SolisCloud pela camada resiliente. Levanta RuntimeError se a API responder erro."""
+    with metricas.medir(f"solis:{recurso.rsplit('/', 1)[-1]}"):
+        r = rede.requisitar(
+            "solis", "POST", f"{CREDS['solis']['url']}{recurso}", timeout=SOLIS_TIMEOUT, data=body, hedge=hedge,
+            limitador=rede.limitador("solis", SOLIS_REQ_POR_SEGUNDO),
+            preparar=lambda: {"headers": get_solis_auth(recurso, body)},   # assina a cada envio: o header Date precisa estar atual
+            e_limite=lambda r: str(_json(r).get("code")) in SOLIS_CODIGOS_LIMITE,
+        )
+        resposta = r.json()
+    if not resposta.get("success", True) or "data" not in resposta:
+        raise RuntimeError(f"{recurso} falhou: {resposta.get('code')} {resposta.get('msg', '')}".strip())
+    return resposta.get("data") or {}
+
+def _buscar_mes_solis(station_id, mes):
+    body = json.dumps({"stationId": station_id, "time": mes})
+    return _post_solis("/v1/api/stationDayEnergyList", body, hedge=True).get("records", [])
+
+def _ler_mes_solis(station_id, mes):
+    """Busca um mês inteiro na API: {date: kWh}."""
+    dias = {}
+    for rec in _buscar_mes_solis(station_id, mes):
+        dia_str = rec.get("date", "")
+        if len(dia_str) < 3: full_date = f"{mes}-{int(dia_str):02d}"
+        else: full_date = dia_str
+        dias[datetime.strptime(full_date, "%Y-%m-%d").date()] = float(rec.get("energy", 0))
+    return dias
+
+def buscar_geracao_solis(station_id, data_inicio, data_fim):
+    import pandas as pd
+    meses = pd.date_range(data_inicio, data_fim, freq='MS').strftime("%Y-%m").tolist()
+    if data_inicio.strftime("%Y-%m") not in meses: meses.append(data_inicio.strftime("%Y-%m"))
+    meses = sorted(set(meses))
+
+    # Só vão à API os meses que não estão no armazém local (ou ainda estão abertos)
+    pendentes = armazem_geracao.pendentes("Solis", station_id, "dia", meses)
+    metricas.contar("cache", tipo="armazem_geracao", resultado="hit", n=len(meses) - len(pendentes))
+    metricas.contar("cache", tipo="armazem_geracao", resultado="miss", n=len(pendentes))
+    if pendentes:
+        # Meses em paralelo sobre a mesma conexão keep-alive
+        pool = ThreadPoolExecutor(max_workers=min(SOLIS_MAX_CONCORRENCIA, len(pendentes)))
+        futuros = {pool.submit(rede.levar_prazo(_ler_mes_solis), station_id, mes): mes for mes in pendentes}
+        falhas = {}
+        try:
+            for fut in as_completed(futuros, timeout=rede.restante()):
+                try: armazem_geracao.gravar("Solis", station_id, "dia", futuros[fut], fut.result())
+                except Exception as e:
+                    falhas[futuros[fut]] = e
+                    metricas.erro("solis:mes", e, estacao=station_id, mes=futuros[fut])  # o mês fica pendente
+        except TimeoutError as e:
+            metricas.erro("solis:prazo", e, estacao=station_id)
+        finally:
+            pool.shutdown(wait=False, cancel_futures=True)
+        faltando = armazem_geracao.pendentes("Solis", station_id, "dia", pendentes)
+        if faltando:
+            # Mês sem resposta não vira "0 kWh": a busca falha e a próxima tenta de novo (o que chegou fica no armazém)
+            causa = next(iter(falhas.values()), None)
+            raise RuntimeError(f"geração Solis incompleta: sem resposta para {', '.join(faltando)}" + (f" ({causa})" if causa else "")) from causa
+
+    dados_diarios = armazem_geracao.ler("Solis", station_id, "dia", data_inicio, data_fim)
+    if dados_diarios:
+        df = pd.DataFrame(list(dados_diarios.items()), columns=['Data', 'kWh'])
+        df['Data'] = pd.to_datetime(df['Data'])
+        df = df.set_index('Data').sort_index()
+        return df['kWh'].sum(), df
+    return 0.0, pd.DataFrame()
+
+# --- BUSCA HUAWEI (O "TRATOR" - Lógica Completa) ---
+# O planejador monta o mínimo de chamadas (ano para meses inteiros, mês para os parciais),
+# com até 100 estações por chamada, e grava tudo no armazém local.
+def buscar_geracao_huawei(station_code, data_inicio, data_fim):
+    import pandas as pd
+    plano = planejador_huawei.planejar(data_inicio, data_fim)
+    if planejador_huawei.periodos_faltando(station_code, plano):
+        if not get_huawei_token(): raise RuntimeError("login Huawei indisponível")
+        planejador_huawei.executar(plano, [station_code], post_huawei)
+        # Período sem resposta (inclusive o refazer diário de mês sem total) não vira "0 kWh":
+        # a busca falha e a próxima tenta de novo
+        faltando = planejador_huawei.periodos_faltando(station_code, plano)
+        if faltando: raise RuntimeError(f"geração Huawei incompleta: sem resposta para {', '.join(faltando)}")
+
+    total, dados_diarios = planejador_huawei.total_periodo(station_code, data_inicio, data_fim)
+    if dados_diarios:
+        df = pd.DataFrame(list(dados_diarios.items()), columns=['Data', 'kWh'])
+        df['Data'] = pd.to_datetime(df['Data'])
+        df = df.set_index('Data').sort_index()
+        return total, df
+    return total, pd.DataFrame()
+
+def buscar_geracao_frota_huawei(station_codes, data_inicio, data_fim):
+    """Série diária de várias usinas Huawei de uma vez: {stationCode: {date: kWh}}."""
+    if get_huawei_token():
+        planejador_huawei.executar(planejador_huawei.planejar(data_inicio, data_fim, diario=True), station_codes, post_huawei)
+    return planejador_huawei.series_diarias(station_codes, data_inicio, data_fim)
+
+def pre_carregar_geracao(pedidos):
+    """
+    Busca em lote a geração Huawei de vários (usina, inicio, fim) antes de conciliar um a um:
+    usinas com o mesmo período dividem as chamadas (até 100 por chamada).
+    """
+    por_periodo = {}
+    for usina, inicio, fim in pedidos:
+        if usina["marca"] == "Huawei": por_periodo.setdefault((inicio, fim), set()).add(str(usina["id"]))
+    if not por_periodo or not get_huawei_token(): return
+    for (inicio, fim), codigos in por_periodo.items():
+        try: planejador_huawei.executar(planejador_huawei.planejar(inicio, fim), sorted(codigos), post_huawei)
+        except Exception as e: metricas.erro("huawei:pre_carregar", e, usinas=len(codigos))  # cada busca ainda tenta a sua
+
+def buscar_geracao(usina, data_inicio, data_fim):
+    """(kWh, df) do período. Dentro do prazo da auditoria (rede.prazo): o que não respondeu a tempo vira erro, não 0."""
+    with rede.prazo(), metricas.medir(f"geracao:{usina['marca'].lower()}"):
+        if usina["marca"] == "Huawei":
+            return buscar_geracao_huawei(usina["id"], data_inicio, data_fim)
+        return buscar_geracao_solis(usina["id"], data_inicio, data_fim)
+
+# --- LISTAGEM DE USINAS ---
+# A lista sai do catálogo local (catalogo_usinas): instantânea, inclusive logo após reiniciar o app.
+# Catálogo velho é atualizado em segundo plano; só a primeira carga (catálogo vazio) espera a API.
+# As páginas vêm cheias (100 por página) e, sabendo o total de páginas, as demais são buscadas em paralelo.
+TAMANHO_PAGINA = 100
+HUAWEI_LISTA_REQ_POR_SEGUNDO = 1   # o getStationList tem limite de frequência próprio
+HUAWEI_LISTA_CONCORRENCIA = 2
+
+def _pagina_huawei(n):
+    rede.limitador("huawei_lista", HUAWEI_LISTA_REQ_POR_SEGUNDO).aguardar()
+    resposta = post_huawei("getStationList", {"pageNo": n, "pageSize": TAMANHO_PAGINA})  # limite de taxa já repetido lá
+    if not resposta.get("success"):
+        raise RuntimeError(f"getStationList falhou (página {n}): {resposta.get('failCode')}")
+    d = resposta.get("data") or []
+    if isinstance(d, list): return d, None  # API antiga: sem paginação informada
+    return d.get("list", []), d.get("pageCount")
+
+def _pagina_solis(n):
+    body = json.dumps({"pageNo": n, "pageSize": TAMANHO_PAGINA})
+    pagina = _post_solis("/v1/api/userStationList", body).get("page", {}) or {}
+    return pagina.get("records", []), pagina.get("pages")
+
+def _listar_api_huawei():
+    if not get_huawei_token(): raise RuntimeError("login Huawei indisponível")
+    estacoes = catalogo_usinas.listar_paginado(_pagina_huawei, HUAWEI_LISTA_CONCORRENCIA, TAMANHO_PAGINA)
+    return [{"id": str(s.get("stationCode")), "nome": s.get("stationName")} for s in estacoes]
+
+def _listar_api_solis():
+    estacoes = catalogo_usinas.listar_paginado(_pagina_solis, SOLIS_MAX_CONCORRENCIA, TAMANHO_PAGINA)
+    return [{"id": str(s.get("id")), "nome": s.get("stationName")} for s in estacoes]
+
+FONTES_CATALOGO = {"Huawei": _listar_api_huawei, "Solis": _listar_api_solis}
+
+def atualizar_catalogo(forcar=False, marcas=None):
+    """Atualiza o catálogo das marcas agora, em paralelo (bloqueante). {marca: resumo | None}."""
+    marcas = marcas or list(FONTES_CATALOGO)
+    with ThreadPoolExecutor(max_workers=len(marcas)) as pool:
+        futuros = {marca: pool.submit(catalogo_usinas.atualizar, marca, FONTES_CATALOGO[marca], forcar) for marca in marcas}
+    return {marca: f.result() for marca, f in futuros.items()}
+
+def listar_todas_usinas():
+    vazias = []
+    for marca, listar in FONTES_CATALOGO.items():
+        decorrido = catalogo_usinas.idade(marca)
+        if decorrido is None: vazias.append(marca)
+        elif decorrido >= catalogo_usinas.TTL: catalogo_usinas.atualizar_em_segundo_plano(marca, listar)
+    if vazias: atualizar_catalogo(marcas=vazias)  # primeira carga: espera a API
+    return catalogo_usinas.listar()
@@ -0,0 +1,160 @@
+import re
+import threading
+import time
+import unicodedata
+from collections import Counter
+from difflib import SequenceMatcher
+
+import metricas
+
+def normalizar_nome(texto):
+    """Remove acentos, passa para maiúsculas e colapsa espaços."""
+    sem_acento = unicodedata.normalize("NFKD", str(texto)).encode("ascii", "ignore").decode("ascii")
+    return re.sub(r"\s+", " ", sem_acento).upper().strip()
+
+def chave_tokens(texto):
+    """Nome normalizado com as palavras em ordem alfabética ('SILVA JOAO' == 'JOAO SILVA')."""
+    return " ".join(sorted(normalizar_nome(texto).split()))
+
+def _trigramas(chave):
+    s = f"  {chave} "
+    return {s[i:i + 3] for i in range(len(s) - 2)}
+
+def _cliente(id_inversor, marca, nome_inversor, documento=None):
+    # documento: CPF/CNPJ do titular (coluna opcional CPF_CNPJ): senha das faturas protegidas
+    return {"id": str(id_inversor), "marca": marca, "nome": nome_inversor, "documento": str(documento or "").strip() or None}
+
+def _clientes_das_linhas(rows):
+    clientes = {}
+    for row in rows:
+        if "Nome_Conta" in row and row["Nome_Conta"]:
+            clientes[str(row["Nome_Conta"]).upper().strip()] = _cliente(
+                row["ID_Inversor"], row["Marca"], row["Nome_Inversor"],
+                row.get("CPF_CNPJ") or row.get("CPF") or row.get("CNPJ"),
+            )
+    return clientes
+
+def _indexar(por_chave, trigramas, nome, copiados=None):
+    """
+    Acrescenta `nome` às chaves e trigramas. copiados: trigramas cujo set já é desta versão nova;
+    os demais são copiados antes de alterar (o set antigo segue na versão publicada). None = tudo novo.
+    """
+    por_chave.setdefault(normalizar_nome(nome), nome)
+    chave = chave_tokens(nome)
+    por_chave.setdefault(chave, nome)
+    for tri in _trigramas(chave):
+        if copiados is not None and tri not in copiados:
+            trigramas[tri] = set(trigramas.get(tri, ()))
+            copiados.add(tri)
+        trigramas.setdefault(tri, set()).add(chave)
+
+class IndiceClientes:
+    """
+    Índice em memória da planilha de clientes, compartilhado pelo processo.
+    - Carregado uma vez; depois do TTL só consulta a revisão da planilha e, se ela mudou, relê e aplica só
+      o que mudou (clientes novos entram nos trigramas; dados alterados só trocam o registro).
+    - Busca exata por nome normalizado ou por palavras ordenadas (O(1)); se falhar, busca aproximada por trigramas.
+    - Clientes, chaves e trigramas formam uma versão só, trocada inteira (cópia na escrita, só dos
+      trigramas tocados): a busca lê sem lock e nunca vê um índice pela metade.
+    """
+
+    def __init__(self, ttl=300, similaridade_minima=0.85):
+        self.ttl = ttl
+        self.similaridade_minima = similaridade_minima
+        # (clientes, por_chave, trigramas):
+        #   clientes:  NOME (como na planilha, maiúsculo) -> {"id", "marca", "nome", "documento"}
+        #   por_chave: nome normalizado / palavras ordenadas -> NOME
+        #   trigramas: trigrama -> {chave_tokens}
+        self._versao = ({}, {}, {})
+        self._revisao = None
+        self._validade = 0.0
+        self._lock = threading.Lock()
+
+    # --- CARGA ---
+    def atualizar(self, abrir_planilha, forcar=False):
+        """abrir_planilha() -> worksheet do gspread (ou None). Só vai à rede quando o TTL venceu."""
+        if not forcar and time.monotonic() < self._validade: return
+        with self._lock:
+            if not forcar and time.monotonic() < self._validade: return
+            sheet = abrir_planilha()
+            if not sheet: return
+            try:
+                with metricas.medir("sheets:revisao"):
+                    revisao = sheet.spreadsheet.get_lastUpdateTime()
+            except Exception:
+                revisao = None  # sem revisão, relê a planilha inteira
+            try:
+                if forcar or revisao is None or revisao != self._revisao:
+                    with metricas.medir("sheets:ler_clientes"):
+                        rows = sheet.get_all_records()
+                    if forcar: self._reconstruir(_clientes_das_linhas(rows))
+                    else: self._mesclar(_clientes_das_linhas(rows))
+                    self._revisao = revisao
+                else:
+                    metricas.contar("cache", tipo="indice_clientes", resultado="hit")
+                self._validade = time.monotonic() + self.ttl
+            except Exception:
+                pass  # registrado pelo medir; mantém o índice anterior e tenta de novo na próxima chamada
+
+    def carregar(self, rows):
+        """Carrega linhas já lidas (ex: CSV exportado da planilha), sem ir ao Google Sheets."""
+        with self._lock:
+            self._reconstruir(_clientes_das_linhas(rows))
+            self._validade = float("inf")
+
+    @property
+    def clientes(self):
+        return self._versao[0]
+
+    def _reconstruir(self, clientes):
+        por_chave, trigramas = {}, {}
+        for nome in clientes: _indexar(por_chave, trigramas, nome)
+        self._versao = (clientes, por_chave, trigramas)
+        metricas.contar("indice_clientes", operacao="reconstruir")
+
+    def _mesclar(self, novos):
+        """Planilha relida: indexa só os nomes que entraram; dados de quem já existia só trocam o registro."""
+        clientes, por_chave, trigramas = self._versao
+        if any(nome not in novos for nome in clientes):
+            # Saiu cliente: a chave dele pode ser também de outro nome (acentos, ordem das palavras); reconstrói
+            return self._reconstruir(novos)
+        entraram = [nome for nome in novos if nome not in clientes]
+        if entraram:
+            por_chave, trigramas, copiados = dict(por_chave), dict(trigramas), set()
+            for nome in entraram: _indexar(por_chave, trigramas, nome, copiados)
+        self._versao = (novos, por_chave, trigramas)
+        metricas.contar("indice_clientes", operacao="mesclar")
+
+    def adicionar(self, nome_conta, dados_usina):
+        """Inclui um cliente recém-salvo (com o CPF/CNPJ, se vier em dados_usina["documento"]) sem esperar a próxima recarga."""
+        nome = str(nome_conta).upper().strip()
+        with self._lock:
+            clientes, por_chave, trigramas = self._versao
+            clientes, por_chave, trigramas = dict(clientes), dict(por_chave), dict(trigramas)
+            clientes[nome] = _cliente(dados_usina["id"], dados_usina["marca"], dados_usina["nome"], dados_usina.get("documento"))
+            _indexar(por_chave, trigramas, nome, set())
+            self._versao = (clientes, por_chave, trigramas)
+
+    # --- BUSCA ---
+    def buscar(self, nome):
+        """Retorna (NOME, dados) do cliente ou (None, None)."""
+        if not nome: return None, None
+        clientes, por_chave, trigramas = self._versao  # uma versão só durante toda a busca
+        encontrado = por_chave.get(normalizar_nome(nome)) or por_chave.get(chave_tokens(nome))
+        if not encontrado:
+            encontrado = self._buscar_aproximado(por_chave, trigramas, chave_tokens(nome))
+        if not encontrado: return None, None
+        return encontrado, clientes[encontrado]
+
+    def _buscar_aproximado(self, por_chave, trigramas, chave, candidatos=10):
+        contagem = Counter()
+        for tri in _trigramas(chave):
+            contagem.update(trigramas.get(tri, ()))
+        melhor, melhor_nota = None, self.similaridade_minima
+        for candidata, _ in contagem.most_common(candidatos):
+            nota = SequenceMatcher(None, chave, candidata).ratio()
+            if nota >= melhor_nota: melhor, melhor_nota = candidata, nota
+        return por_chave.get(melhor) if melhor else None
+
+# Instância única do processo (sobrevive aos reruns do Streamlit)
+INDICE = IndiceClientes()
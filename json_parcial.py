@@ -0,0 +1,77 @@
+import json
+import re
+
+# Leitura de JSON incompleto (resposta do modelo chegando em streaming ou cortada no meio).
+# Só entende o formato do relatório: objetos (ex: "metricas") e strings (ex: "relatorio") no primeiro nível.
+ESCAPES = {'"': '"', "\\": "\\", "/": "/", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t"}
+
+def _string(texto, campo):
+    """Valor (talvez parcial) da string `campo`: (valor, fechada) ou (None, False) se ainda não começou."""
+    m = re.search(r'"%s"\s*:\s*"' % re.escape(campo), texto)
+    if not m: return None, False
+    saida, i, n = [], m.end(), len(texto)
+    while i < n:
+        c = texto[i]
+        if c == '"': return "".join(saida), True
+        if c == "\\":
+            if i + 1 >= n: break                        # escape cortado no fim do pedaço
+            e = texto[i + 1]
+            if e == "u":
+                if i + 6 > n: break
+                try: saida.append(chr(int(texto[i + 2:i + 6], 16)))
+                except ValueError: pass
+                i += 6
+                continue
+            saida.append(ESCAPES.get(e, e))
+            i += 2
+            continue
+        saida.append(c)
+        i += 1
+    return "".join(saida), False
+
+def _objeto(texto, campo):
+    """Objeto `campo` já decodificado, só quando estiver completo (chaves balanceadas); senão None."""
+    m = re.search(r'"%s"\s*:\s*\{' % re.escape(campo), texto)
+    if not m: return None
+    nivel, em_string, escape = 0, False, False
+    for i in range(m.end() - 1, len(texto)):
+        c = texto[i]
+        if em_string:
+            if escape: escape = False
+            elif c == "\\": escape = True
+            elif c == '"': em_string = False
+        elif c == '"': em_string = True
+        elif c == "{": nivel += 1
+        elif c == "}":
+            nivel -= 1
+            if nivel == 0:
+                try: return json.loads(texto[m.end() - 1:i + 1])
+                except ValueError: return None
+    return None
+
+def ler(texto, objetos=("metricas",), strings=("relatorio", "whatsapp")):
+    """
+    O que já dá para aproveitar do JSON parcial: objetos completos e strings (parciais ou não).
+    Retorna (dados, completo) — completo=True quando todos os campos pedidos já fecharam.
+    """
+    dados, completo = {}, True
+    for campo in objetos:
+        valor = _objeto(texto, campo)
+        if valor is None: completo = False
+        else: dados[campo] = valor
+    for campo in strings:
+        valor, fechada = _string(texto, campo)
+        if valor is not None: dados[campo] = valor
+        completo = completo and fechada
+    return dados, completo
+
+def reparar(texto, objetos=("metricas",), strings=("relatorio", "whatsapp")):
+    """JSON inteiro se ele for válido (ignorando lixo em volta, ex: ```json); senão o que ler() aproveitar."""
+    inicio, fim = texto.find("{"), texto.rfind("}")
+    if 0 <= inicio < fim:
+        try:
+            dados = json.loads(texto[inicio:fim + 1])
+            if isinstance(dados, dict): return dados, all(c in dados for c in (*objetos, *strings))
+        except ValueError:
+            pass
+    return ler(texto, objetos, strings)
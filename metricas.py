@@ -0,0 +1,207 @@
+import json
+import os
+import sys
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from functools import wraps
+
+# Instrumentação leve do pipeline (sem dependências): tempo de cada etapa (PDF, desbloqueio, planilha,
+# cada endpoint dos fornecedores, cada chamada ao Gemini) e contadores de erros, retentativas e cache.
+# - Estado por processo, como o rede.py: sobrevive aos reruns do Streamlit e é visto por todas as threads.
+# - Workers (ProcessPool) devolvem o que mediram com drenar(); o processo pai junta com incorporar().
+# - Saídas: log JSON por evento (EON_LOG_JSON = caminho ou "-" para stderr; erros sempre vão ao stderr),
+#   texto no formato do Prometheus (arquivo EON_METRICAS_PROM e/ou http://:EON_METRICAS_PORTA/metrics)
+#   e resumo() com p50/p95 por etapa para o painel do app.
+LOG_JSON = os.environ.get("EON_LOG_JSON", "")
+ARQUIVO_PROM = os.environ.get("EON_METRICAS_PROM", "")
+PORTA = int(os.environ.get("EON_METRICAS_PORTA", "0") or 0)
+INTERVALO_EXPORTACAO = 15    # segundos entre gravações do arquivo do Prometheus
+AMOSTRAS_POR_ETAPA = 2000    # janela para os percentis (as contagens e somas são totais)
+QUANTIS = (0.5, 0.95, 0.99)
+
+_LOCK = threading.Lock()
+_ETAPAS = {}       # etapa -> {"amostras": deque(s), "n", "soma", "erros"}
+_CONTADORES = {}   # (nome, (("rotulo", "valor"), ...)) -> total
+_PENDENTES = []    # medições ainda não drenadas (só nos workers)
+_EXPORTADOR = {"thread": None, "servidor": None}
+_EM_WORKER = {"ativo": False}
+
+# --- REGISTRO ---
+def _rotulos(rotulos):
+    return tuple(sorted((k, str(v)) for k, v in rotulos.items()))
+
+def _registrar_etapa(etapa, segundos, ok):
+    with _LOCK:
+        e = _ETAPAS.get(etapa)
+        if e is None: e = _ETAPAS[etapa] = {"amostras": deque(maxlen=AMOSTRAS_POR_ETAPA), "n": 0, "soma": 0.0, "erros": 0}
+        e["amostras"].append(segundos)
+        e["n"] += 1
+        e["soma"] += segundos
+        if not ok: e["erros"] += 1
+        if _EM_WORKER["ativo"]: _PENDENTES.append(("etapa", etapa, segundos, ok))
+
+def contar(nome, n=1, **rotulos):
+    """Soma `n` ao contador `nome` com os rótulos dados (ex: contar("cache", tipo="respostas_ia", resultado="hit"))."""
+    chave = (nome, _rotulos(rotulos))
+    with _LOCK:
+        _CONTADORES[chave] = _CONTADORES.get(chave, 0) + n
+        if _EM_WORKER["ativo"]: _PENDENTES.append(("contador", chave, n, None))
+
+def _log(evento, nivel="info", **campos):
+    if not LOG_JSON and nivel != "erro": return
+    linha = json.dumps({"ts": round(time.time(), 3), "nivel": nivel, "evento": evento, "pid": os.getpid(), **campos},
+                       ensure_ascii=False, default=str)
+    destino = LOG_JSON if LOG_JSON and LOG_JSON != "-" else None
+    try:
+        if destino:
+            with open(destino, "a", encoding="utf-8") as f: f.write(linha + "\n")
+        else:
+            print(linha, file=sys.stderr)
+    except OSError:
+        pass
+
+def erro(etapa, excecao=None, **campos):
+    """Registra uma falha que o código trata (fallback, valor padrão) em vez de engolir em silêncio."""
+    contar("erros", etapa=etapa)
+    _log("erro", "erro", etapa=etapa, erro=f"{type(excecao).__name__}: {excecao}" if excecao else None, **campos)
+
+@contextmanager
+def medir(etapa, **campos):
+    """Cronometra o bloco como `etapa`. Exceção que escapa do bloco conta como erro (e é relançada)."""
+    inicio = time.perf_counter()
+    try:
+        yield
+    except BaseException as e:
+        segundos = time.perf_counter() - inicio
+        _registrar_etapa(etapa, segundos, False)
+        erro(etapa, e, ms=round(segundos * 1000, 1), **campos)
+        raise
+    segundos = time.perf_counter() - inicio
+    _registrar_etapa(etapa, segundos, True)
+    _log("etapa", etapa=etapa, ms=round(segundos * 1000, 1), **campos)
+
+def cronometrar(etapa):
+    """Decorator: medir(etapa) em volta da função."""
+    def decorar(funcao):
+        @wraps(funcao)
+        def medida(*args, **kwargs):
+            with medir(etapa):
+                return funcao(*args, **kwargs)
+        return medida
+    return decorar
+
+# --- WORKERS (ProcessPool) ---
+def iniciar_worker():
+    """No initializer do worker: passa a guardar as medições para drenar()."""
+    _EM_WORKER["ativo"] = True
+
+def drenar():
+    """Medições do worker desde a última drenagem (para mandar de volta ao processo pai)."""
+    with _LOCK:
+        pendentes = list(_PENDENTES)
+        _PENDENTES.clear()
+    return pendentes
+
+def incorporar(pendentes):
+    """Junta no processo atual o que um worker drenou."""
+    for tipo, chave, valor, ok in pendentes or ():
+        if tipo == "etapa": _registrar_etapa(chave, valor, ok)
+        else: contar(chave[0], valor, **dict(chave[1]))
+
+# --- LEITURA ---
+def _quantil(ordenadas, q):
+    if not ordenadas: return None
+    return ordenadas[min(len(ordenadas) - 1, int(q * len(ordenadas)))]
+
+def resumo():
+    """[{etapa, n, erros, p50_ms, p95_ms, media_ms}] por etapa (janela recente para os percentis) + contadores."""
+    with _LOCK:
+        etapas = {k: (sorted(v["amostras"]), v["n"], v["soma"], v["erros"]) for k, v in _ETAPAS.items()}
+        contadores = dict(_CONTADORES)
+    linhas = []
+    for etapa, (ordenadas, n, soma, erros) in sorted(etapas.items()):
+        linhas.append({
+            "etapa": etapa, "n": n, "erros": erros,
+            "p50_ms": round(_quantil(ordenadas, 0.5) * 1000, 1),
+            "p95_ms": round(_quantil(ordenadas, 0.95) * 1000, 1),
+            "media_ms": round(soma / n * 1000, 1),
+        })
+    return {
+        "etapas": linhas,
+        "contadores": [{"nome": nome, **dict(rotulos), "total": total} for (nome, rotulos), total in sorted(contadores.items())],
+    }
+
+def _rotulos_prom(pares):
+    if not pares: return ""
+    escapar = lambda v: v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    return "{" + ",".join(f'{k}="{escapar(v)}"' for k, v in pares) + "}"
+
+def prometheus():
+    """Texto no formato de exposição do Prometheus."""
+    with _LOCK:
+        etapas = {k: (sorted(v["amostras"]), v["n"], v["soma"], v["erros"]) for k, v in _ETAPAS.items()}
+        contadores = dict(_CONTADORES)
+    linhas = ["# HELP eon_etapa_segundos Duração de cada etapa do pipeline.", "# TYPE eon_etapa_segundos summary"]
+    for etapa, (ordenadas, n, soma, _) in sorted(etapas.items()):
+        for q in QUANTIS:
+            linhas.append(f"eon_etapa_segundos{_rotulos_prom([('etapa', etapa), ('quantile', str(q))])} {_quantil(ordenadas, q):.6f}")
+        linhas.append(f"eon_etapa_segundos_sum{_rotulos_prom([('etapa', etapa)])} {soma:.6f}")
+        linhas.append(f"eon_etapa_segundos_count{_rotulos_prom([('etapa', etapa)])} {n}")
+    linhas += ["# HELP eon_etapa_falhas_total Execuções da etapa que terminaram em exceção.", "# TYPE eon_etapa_falhas_total counter"]
+    for etapa, (_, _, _, erros) in sorted(etapas.items()):
+        linhas.append(f"eon_etapa_falhas_total{_rotulos_prom([('etapa', etapa)])} {erros}")
+    vistos = set()
+    for (nome, rotulos), total in sorted(contadores.items()):
+        if nome not in vistos:
+            linhas.append(f"# TYPE eon_{nome}_total counter")
+            vistos.add(nome)
+        linhas.append(f"eon_{nome}_total{_rotulos_prom(rotulos)} {total}")
+    return "\n".join(linhas) + "\n"
+
+# --- EXPORTAÇÃO ---
+def exportar(caminho=None):
+    """Grava o texto do Prometheus em `caminho` (padrão EON_METRICAS_PROM), de forma atômica (textfile collector)."""
+    caminho = caminho or ARQUIVO_PROM
+    if not caminho: return
+    os.makedirs(os.path.dirname(os.path.abspath(caminho)), exist_ok=True)
+    temporario = f"{caminho}.{os.getpid()}.tmp"
+    with open(temporario, "w", encoding="utf-8") as f: f.write(prometheus())
+    os.replace(temporario, caminho)
+
+def _laco_exportacao():
+    while True:
+        time.sleep(INTERVALO_EXPORTACAO)
+        try: exportar()
+        except OSError as e: erro("metricas_exportar", e)
+
+def _servir(porta):
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Metricas(BaseHTTPRequestHandler):
+        def do_GET(self):
+            corpo = prometheus().encode("utf-8")
+            self.send_response(200 if self.path.startswith("/metrics") else 404)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.end_headers()
+            if self.path.startswith("/metrics"): self.wfile.write(corpo)
+
+        def log_message(self, *args):
+            pass  # sem log de acesso no stderr do app
+
+    servidor = ThreadingHTTPServer(("0.0.0.0", porta), Metricas)
+    threading.Thread(target=servidor.serve_forever, name="metricas-http", daemon=True).start()
+    return servidor
+
+def iniciar_exportacao():
+    """Liga o arquivo do Prometheus e/ou o endpoint /metrics se configurados (uma vez por processo)."""
+    falha = None
+    with _LOCK:
+        if ARQUIVO_PROM and not _EXPORTADOR["thread"]:
+            _EXPORTADOR["thread"] = threading.Thread(target=_laco_exportacao, name="metricas-arquivo", daemon=True)
+            _EXPORTADOR["thread"].start()
+        if PORTA and not _EXPORTADOR["servidor"]:
+            try: _EXPORTADOR["servidor"] = _servir(PORTA)
+            except OSError as e: _EXPORTADOR["servidor"] = falha = e  # porta ocupada (ex: outro processo do app)
+    if falha: erro("metricas_http", falha, porta=PORTA)
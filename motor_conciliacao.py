@@ -0,0 +1,124 @@
+from datetime import date
+
+import numpy as np
+
+import armazem_geracao
+from auditoria_lote import TOLERANCIA_KWH
+
+# Conciliação vetorizada: N usinas x M faturas (períodos) de uma vez, em operações de array.
+# - Geração: matriz [usinas, dias] de kWh diário (float32, NaN = dia sem leitura) a partir de `dia0`.
+# - Faturas: arrays do mesmo tamanho (uma posição por fatura): índice da usina na matriz, início e fim
+#   (datetime64[D], inclusive), kWh creditado e tarifa do período (R$/kWh).
+# A soma de cada período sai de somas acumuladas (C[fim + 1] - C[início]): custo O(N*D + M),
+# sem laço em Python — milhares de clientes com anos de histórico em poucos milissegundos.
+ALERTAS = np.array(["ok", "prejuizo", "credito_a_mais"])            # mesmo critério de auditoria_lote.classificar_divergencia
+STATUS = np.array(["ok", "sem_geracao", "sem_dados", "incompleto"])
+
+def _dia(valor):
+    return np.datetime64(str(valor)[:10], "D")
+
+def matriz_diaria(series, dia0, dias):
+    """series: uma {date: kWh} por usina -> matriz float32 [usinas, dias] (NaN = sem leitura)."""
+    matriz = np.full((len(series), dias), np.nan, dtype=np.float32)
+    dia0 = _dia(dia0)
+    for i, serie in enumerate(series):
+        if not serie: continue
+        idx = (np.array([str(d)[:10] for d in serie], dtype="datetime64[D]") - dia0).astype(np.int64)
+        valores = np.fromiter(serie.values(), dtype=np.float32, count=len(serie))
+        dentro = (idx >= 0) & (idx < dias)
+        matriz[i, idx[dentro]] = valores[dentro]
+    return matriz
+
+def matriz_do_armazem(usinas, dia0, dias):
+    """Matriz diária das usinas [{"marca", "id"}] lida do armazém local (uma query por marca)."""
+    dia0 = _dia(dia0)
+    fim = dia0 + np.timedelta64(dias - 1, "D")
+    matriz = np.full((len(usinas), dias), np.nan, dtype=np.float32)
+    por_marca = {}
+    for i, usina in enumerate(usinas):
+        por_marca.setdefault(usina["marca"], {}).setdefault(str(usina["id"]), []).append(i)
+    for marca, linhas_por_estacao in por_marca.items():
+        registros = armazem_geracao.ler_frota(marca, list(linhas_por_estacao), "dia", dia0, fim)
+        if not registros: continue
+        estacoes, datas, kwh = zip(*registros)
+        colunas = (np.array(datas, dtype="datetime64[D]") - dia0).astype(np.int64)
+        kwh = np.array(kwh, dtype=np.float32)
+        for estacao_linhas, col, valor in ((linhas_por_estacao[e], c, v) for e, c, v in zip(estacoes, colunas, kwh)):
+            matriz[estacao_linhas, col] = valor  # a mesma estação pode servir a mais de um cliente
+    return matriz
+
+def _acumulada(valores, dtype=np.float64):
+    """Somas acumuladas por linha com uma coluna 0 à esquerda: soma(a..b) = C[:, b + 1] - C[:, a]."""
+    acumulada = np.zeros((valores.shape[0], valores.shape[1] + 1), dtype=dtype)
+    np.cumsum(valores, axis=1, dtype=dtype, out=acumulada[:, 1:])
+    return acumulada
+
+def conciliar(geracao, dia0, usina, inicio, fim, kwh_creditado, tarifa, total_informado=None, tolerancia=TOLERANCIA_KWH):
+    """
+    Concilia todas as faturas de uma vez. Retorna um dict de arrays (uma posição por fatura):
+    kwh_gerado, kwh_creditado, diferenca_kwh, tarifa, valor_diferenca, alerta, status,
+    dias, dias_lidos, dias_zerados (dias com leitura = 0 dentro do período).
+    total_informado: total do fornecedor por fatura (NaN = somar os dias), ex: meses que a API só dá fechados.
+    """
+    usina = np.asarray(usina, dtype=np.int64)
+    inicio = np.asarray(inicio, dtype="datetime64[D]")
+    fim = np.asarray(fim, dtype="datetime64[D]")
+    kwh_creditado = np.asarray(kwh_creditado, dtype=np.float64)
+    tarifa = np.broadcast_to(np.asarray(tarifa, dtype=np.float64), kwh_creditado.shape)
+    dias_matriz = geracao.shape[1]
+
+    lido = ~np.isnan(geracao)
+    a = np.clip((inicio - _dia(dia0)).astype(np.int64), 0, dias_matriz)
+    b = np.clip((fim - _dia(dia0)).astype(np.int64) + 1, 0, dias_matriz)
+    b = np.maximum(a, b)
+
+    soma = _acumulada(np.where(lido, geracao, 0))
+    # Dias lidos e dias zerados numa soma só: lido nos 16 bits de baixo, zerado nos de cima (até 32767 dias)
+    contagem = _acumulada(lido.astype(np.int32) | ((geracao == 0).astype(np.int32) << 16), np.int32)
+    kwh_gerado = soma[usina, b] - soma[usina, a]
+    dias_contados = contagem[usina, b] - contagem[usina, a]
+    dias_lidos = dias_contados & 0xFFFF
+    dias_zerados = dias_contados >> 16
+    dias = ((fim - inicio).astype(np.int64) + 1).astype(np.int32)
+
+    informado = np.zeros(kwh_gerado.shape, dtype=bool)
+    if total_informado is not None:
+        total_informado = np.asarray(total_informado, dtype=np.float64)
+        informado = ~np.isnan(total_informado)
+        kwh_gerado = np.where(informado, total_informado, kwh_gerado)
+
+    diferenca = kwh_creditado - kwh_gerado
+    alerta = np.where(diferenca < -tolerancia, 1, np.where(diferenca > tolerancia, 2, 0)).astype(np.int8)
+    status = np.select(
+        [(kwh_gerado <= 0) & (dias_lidos == 0) & ~informado, kwh_gerado <= 0, (dias_lidos < dias) & ~informado],
+        [2, 1, 3], default=0,
+    ).astype(np.int8)
+    return {
+        "kwh_gerado": np.round(kwh_gerado, 2),
+        "kwh_creditado": np.round(kwh_creditado, 2),
+        "diferenca_kwh": np.round(diferenca, 2),
+        "tarifa": tarifa,
+        "valor_diferenca": np.round(diferenca * tarifa, 2),
+        "alerta": alerta,
+        "status": status,
+        "dias": dias,
+        "dias_lidos": dias_lidos,
+        "dias_zerados": dias_zerados,
+    }
+
+def conciliar_faturas(usinas, faturas, total_informado=None):
+    """
+    Atalho a partir do armazém: usinas = [{"marca", "id"}]; faturas = [(índice da usina, inicio, fim, kWh creditado, tarifa)].
+    Monta a matriz só com a janela de dias coberta pelas faturas.
+    """
+    if not faturas: return conciliar(np.zeros((len(usinas), 0), dtype=np.float32), date.today(), [], [], [], [], [])
+    usina, inicio, fim, creditado, tarifa = zip(*faturas)
+    inicio = np.array([str(d)[:10] for d in inicio], dtype="datetime64[D]")
+    fim = np.array([str(d)[:10] for d in fim], dtype="datetime64[D]")
+    dia0 = inicio.min()
+    dias = int((fim.max() - dia0).astype(np.int64)) + 1
+    return conciliar(matriz_do_armazem(usinas, dia0, dias), dia0, usina, inicio, fim, creditado, tarifa, total_informado)
+
+def rotulos(resultado):
+    """Troca os códigos de alerta/status pelos nomes (para tabela/exportação)."""
+    return {**resultado, "alerta": ALERTAS[resultado["alerta"]], "status": STATUS[resultado["status"]]}
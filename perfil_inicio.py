@@ -0,0 +1,59 @@
+import builtins
+import os
+import sys
+import threading
+import time
+
+# Perfil de subida (EON_PERFIL_INICIO=1): tempo de import de cada módulo carregado e tempo até a
+# primeira renderização, a partir do primeiro run do script. Desligado, não instala nada.
+# O relatório sai no stderr (log do deploy) e numa seção do próprio app.
+ATIVO = os.environ.get("EON_PERFIL_INICIO", "") not in ("", "0")
+INICIO = time.perf_counter()
+MINIMO_MS = 1.0   # imports mais rápidos que isso ficam fora do relatório
+
+_IMPORTS = []     # {"modulo", "ms", "nivel", "em_s"}
+_EVENTOS = {}     # nome -> segundos desde INICIO (só a primeira marcação conta)
+_PILHA = threading.local()
+_ORIGINAL = builtins.__import__
+_LOCK = threading.Lock()
+
+def _import_cronometrado(name, globals=None, locals=None, fromlist=(), level=0):
+    if level or name in sys.modules: return _ORIGINAL(name, globals, locals, fromlist, level)
+    nivel = getattr(_PILHA, "nivel", 0)
+    _PILHA.nivel = nivel + 1
+    inicio = time.perf_counter()
+    try:
+        return _ORIGINAL(name, globals, locals, fromlist, level)
+    finally:
+        _PILHA.nivel = nivel
+        ms = (time.perf_counter() - inicio) * 1000
+        if ms >= MINIMO_MS:
+            _IMPORTS.append({"modulo": name, "ms": round(ms, 1), "nivel": nivel, "em_s": round(inicio - INICIO, 3)})
+
+def iniciar():
+    """Instala o cronômetro de imports (uma vez por processo; nada se o perfil estiver desligado)."""
+    with _LOCK:
+        if ATIVO and builtins.__import__ is _ORIGINAL:
+            builtins.__import__ = _import_cronometrado
+
+def marcar(evento):
+    """Registra `evento` (ex: "primeira_renderizacao") na primeira vez que acontece. Retorna True nessa vez."""
+    if not ATIVO or evento in _EVENTOS: return False
+    _EVENTOS[evento] = round(time.perf_counter() - INICIO, 3)
+    return True
+
+def relatorio(limite=25):
+    """{"eventos": {...}, "imports": [...]} — imports de primeiro nível (os feitos pelo app), do mais lento ao mais rápido."""
+    diretos = [i for i in _IMPORTS if i["nivel"] == 0]
+    return {
+        "eventos": dict(_EVENTOS),
+        "imports_ms": round(sum(i["ms"] for i in diretos), 1),
+        "imports": sorted(diretos, key=lambda i: -i["ms"])[:limite],
+    }
+
+def imprimir(arquivo=sys.stderr):
+    r = relatorio()
+    print("[perfil_inicio] " + " | ".join(f"{k}: {v:.3f} s" for k, v in r["eventos"].items())
+          + f" | imports: {r['imports_ms']:.0f} ms", file=arquivo)
+    for i in r["imports"]:
+        print(f"[perfil_inicio]   {i['ms']:>8.1f} ms  {i['modulo']} (em {i['em_s']:.3f} s)", file=arquivo)
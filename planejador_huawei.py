@@ -0,0 +1,152 @@
+import calendar
+from datetime import date, datetime
+
+import armazem_geracao
+import metricas
+
+# Planejador das consultas de KPI do FusionSolar.
+# - getKpiStationYear devolve os 12 totais mensais de um ano; getKpiStationMonth, os valores diários de um mês.
+#   O dia (getKpiStationDay, horário) nunca sai mais barato para totais diários, então não entra no plano.
+# - Os dois aceitam "stationCodes" separados por vírgula (até 100): a frota inteira sai em poucas chamadas.
+# - Só vai à API o que o armazém local ainda não tem (ou tem, mas o período ainda está aberto).
+MAX_ESTACOES_POR_CHAMADA = 100
+FAIL_LIMITE_TAXA = 407          # failCode "ACCESS_FREQUENCY_IS_TOO_HIGH"
+ESPERAS_LIMITE_TAXA = (2, 5, 10)    # espera (s) antes de repetir um 407 (rede.requisitar)
+LIMITE_DIARIO_SUSPEITO = 500    # dia acima disso = acumulado mensal gravado como diário (bug conhecido da API)
+
+def _data(valor):
+    return valor.date() if isinstance(valor, datetime) else valor
+
+def meses_do_intervalo(data_inicio, data_fim):
+    """['YYYY-MM', ...] de todos os meses tocados pelo intervalo."""
+    meses, atual = [], date(data_inicio.year, data_inicio.month, 1)
+    while atual <= data_fim:
+        meses.append(atual.strftime("%Y-%m"))
+        atual = date(atual.year + atual.month // 12, atual.month % 12 + 1, 1)
+    return meses
+
+def _mes_inteiro(mes, data_inicio, data_fim):
+    ano, m = int(mes[:4]), int(mes[5:7])
+    return data_inicio <= date(ano, m, 1) and date(ano, m, calendar.monthrange(ano, m)[1]) <= data_fim
+
+def planejar(data_inicio, data_fim, diario=False):
+    """
+    Menor conjunto de chamadas que cobre o intervalo:
+    - meses inteiros saem do total mensal (uma chamada de ano serve todos os meses daquele ano);
+    - meses parciais (ou todos, com diario=True) saem dos valores diários do mês.
+    Retorna [{"endpoint", "granularidade", "periodo", "meses"}] — "meses" = meses inteiros cobertos pela chamada de ano.
+    """
+    data_inicio, data_fim = _data(data_inicio), _data(data_fim)
+    plano, anos = [], {}
+    for mes in meses_do_intervalo(data_inicio, data_fim):
+        if not diario and _mes_inteiro(mes, data_inicio, data_fim): anos.setdefault(mes[:4], []).append(mes)
+        else: plano.append({"endpoint": "getKpiStationMonth", "granularidade": "dia", "periodo": mes, "meses": [mes]})
+    for ano, meses in sorted(anos.items()):
+        plano.insert(0, {"endpoint": "getKpiStationYear", "granularidade": "mes", "periodo": ano, "meses": meses})
+    return plano
+
+def _collect_time(chamada):
+    periodo = chamada["periodo"]
+    if chamada["granularidade"] == "mes": return int(datetime(int(periodo), 1, 1).timestamp() * 1000)
+    return int(datetime(int(periodo[:4]), int(periodo[5:7]), 15).timestamp() * 1000)
+
+def _por_estacao(itens, granularidade):
+    """Resposta da API -> {stationCode: {date: kWh}}."""
+    valores = {}
+    for item in itens if isinstance(itens, list) else []:
+        ms = item.get("collectTime", 0)
+        if ms <= 0: continue
+        dia = datetime.fromtimestamp(ms / 1000).date()
+        if granularidade == "mes": dia = dia.replace(day=1)
+        mapa = item.get("dataItemMap", {}) or {}
+        kwh = float(mapa.get("inverter_power", 0) or mapa.get("inverterYield", 0) or mapa.get("product_power", 0) or 0)
+        valores.setdefault(str(item.get("stationCode")), {})[dia] = kwh
+    return valores
+
+def _consultar(post, chamada, lote):
+    """Uma chamada. None se falhar (o `post` já repete limite de taxa e instabilidade, dentro do prazo)."""
+    payload = {"stationCodes": ",".join(lote), "collectTime": _collect_time(chamada)}
+    try:
+        resposta = post(chamada["endpoint"], payload) or {}
+    except Exception as e:  # rede fora, disjuntor aberto, prazo esgotado
+        metricas.erro(f"huawei:{chamada['endpoint']}", e, periodo=chamada["periodo"], estacoes=len(lote))
+        return None
+    if resposta.get("success"): return resposta.get("data", [])
+    metricas.erro(f"huawei:{chamada['endpoint']}", falha=resposta.get("failCode"), periodo=chamada["periodo"], estacoes=len(lote))
+    return None
+
+def executar(plano, codigos, post, estatisticas=None):
+    """
+    Executa o plano para a frota `codigos`, em lotes de até MAX_ESTACOES_POR_CHAMADA, gravando no armazém.
+    post(endpoint, payload) -> resposta JSON (ex: portal.post_huawei).
+    Mês inteiro sem total (0 ou ausente) na chamada de ano é refeito pelos valores diários, só para as estações afetadas.
+    Retorna o número de chamadas feitas.
+    """
+    codigos = [str(c) for c in codigos]
+    fila = [(chamada, codigos) for chamada in plano]
+    chamadas = 0
+    while fila:
+        chamada, estacoes = fila.pop(0)
+        pendentes = armazem_geracao.estacoes_pendentes("Huawei", estacoes, chamada["granularidade"], chamada["periodo"])
+        metricas.contar("cache", tipo="armazem_geracao", resultado="hit", n=len(estacoes) - len(pendentes))
+        metricas.contar("cache", tipo="armazem_geracao", resultado="miss", n=len(pendentes))
+        for i in range(0, len(pendentes), MAX_ESTACOES_POR_CHAMADA):
+            lote = pendentes[i:i + MAX_ESTACOES_POR_CHAMADA]
+            itens = _consultar(post, chamada, lote)
+            chamadas += 1
+            if itens is None: continue  # falhou: nada gravado, a próxima busca tenta de novo
+            valores = _por_estacao(itens, chamada["granularidade"])
+            armazem_geracao.gravar_lote("Huawei", chamada["granularidade"], chamada["periodo"], {c: valores.get(c, {}) for c in lote})
+
+        if chamada["granularidade"] == "mes":
+            for mes in chamada["meses"]:
+                inicio_mes = date(int(mes[:4]), int(mes[5:7]), 1)
+                sem_total = [c for c in estacoes if armazem_geracao.ler("Huawei", c, "mes", inicio_mes, inicio_mes).get(inicio_mes, 0) <= 0]
+                if sem_total: fila.append(({"endpoint": "getKpiStationMonth", "granularidade": "dia", "periodo": mes, "meses": [mes]}, sem_total))
+    if estatisticas is not None: estatisticas["chamadas"] = estatisticas.get("chamadas", 0) + chamadas
+    return chamadas
+
+def periodos_faltando(codigo, plano):
+    """
+    Períodos do plano que a estação ainda não tem no armazém. Mês inteiro sem total na chamada de ano
+    só está coberto se os valores diários dele (o refazer de executar) também foram lidos.
+    """
+    codigo = str(codigo)
+    faltando = []
+    for chamada in plano:
+        if armazem_geracao.estacoes_pendentes("Huawei", [codigo], chamada["granularidade"], chamada["periodo"]):
+            faltando.append(chamada["periodo"])
+            continue
+        if chamada["granularidade"] != "mes": continue
+        for mes in chamada["meses"]:
+            inicio_mes = date(int(mes[:4]), int(mes[5:7]), 1)
+            sem_total = armazem_geracao.ler("Huawei", codigo, "mes", inicio_mes, inicio_mes).get(inicio_mes, 0) <= 0
+            if sem_total and armazem_geracao.estacoes_pendentes("Huawei", [codigo], "dia", mes): faltando.append(mes)
+    return faltando
+
+def total_periodo(codigo, data_inicio, data_fim):
+    """
+    Geração do intervalo a partir do armazém: (kWh, {date: kWh} dos dias lidos, inclusive os lidos como 0;
+    dia ausente = não lido). Meses inteiros usam o total mensal; o resto, a soma diária. Um dia acima de LIMITE_DIARIO_SUSPEITO
+    é o acumulado mensal gravado como diário: nesse caso esse valor é devolvido como total.
+    """
+    data_inicio, data_fim = _data(data_inicio), _data(data_fim)
+    total, diarios = 0.0, {}
+    for mes in meses_do_intervalo(data_inicio, data_fim):
+        ano, m = int(mes[:4]), int(mes[5:7])
+        inicio_mes = date(ano, m, 1)
+        if _mes_inteiro(mes, data_inicio, data_fim):
+            valor = armazem_geracao.ler("Huawei", codigo, "mes", inicio_mes, inicio_mes).get(inicio_mes, 0)
+            if valor > 0:
+                total += valor
+                continue
+        fim_mes = inicio_mes.replace(day=calendar.monthrange(ano, m)[1])
+        for dia, kwh in armazem_geracao.ler("Huawei", codigo, "dia", max(inicio_mes, data_inicio), min(fim_mes, data_fim)).items():
+            if kwh > LIMITE_DIARIO_SUSPEITO: return kwh, {}
+            diarios[dia] = kwh  # 0 fica: dia parado, não "sem leitura"
+            total += kwh
+    return total, diarios
+
+def series_diarias(codigos, data_inicio, data_fim):
+    """{código: {date: kWh}} diário da frota no intervalo (rode executar(planejar(..., diario=True), ...) antes)."""
+    return {str(c): armazem_geracao.ler("Huawei", c, "dia", data_inicio, data_fim) for c in codigos}
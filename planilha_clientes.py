@@ -0,0 +1,130 @@
+import csv
+import json
+import os
+import threading
+import time
+
+import fila_planilha
+import indice_clientes
+import metricas
+
+# Acesso à planilha de clientes (Google Sheets), sem Streamlit.
+# A conta de serviço vem de quem chama (portal: st.secrets) ou, sem ela, de EON_GCP_SERVICE_ACCOUNT
+# (caminho do JSON ou o próprio JSON) — o caso da CLI e dos workers.
+# Escritas (clientes novos, resultados de auditoria) passam pela fila_planilha: lotes, backoff e spill em disco.
+SCOPES = ["https://www.googleapis.com/auth/spreadsheets", "https://www.googleapis.com/auth/drive"]
+NOME_PLANILHA = os.environ.get("EON_PLANILHA", "Banco de Dados Eon")
+ABA_CLIENTES = ""                 # na fila: "" = primeira aba (clientes)
+ABA_AUDITORIAS = "Auditorias"
+COLUNAS_AUDITORIA = [
+    "registrada_em", "origem", "cliente", "marca", "usina", "arquivo", "inicio", "fim",
+    "kwh_gerado", "kwh_creditado", "diferenca_kwh", "tarifa", "valor_diferenca", "alerta", "status",
+]
+
+_LOCK = threading.Lock()
+_PLANILHAS = {}   # e-mail da conta de serviço -> planilha (autoriza e abre uma única vez por processo)
+_CONTA = {"atual": None}   # última conta usada: a descarga da fila escreve com ela
+
+def conta_de_servico():
+    """Conta de serviço do ambiente (EON_GCP_SERVICE_ACCOUNT) ou None."""
+    valor = os.environ.get("EON_GCP_SERVICE_ACCOUNT", "").strip()
+    if not valor: return None
+    if valor.startswith("{"): return json.loads(valor)
+    with open(valor, encoding="utf-8") as f:
+        return json.load(f)
+
+def _planilha(conta):
+    chave = conta.get("client_email")
+    with _LOCK:
+        if chave not in _PLANILHAS:
+            import gspread  # só quando há conta configurada (não pesa na subida do app)
+            from google.oauth2.service_account import Credentials
+            credentials = Credentials.from_service_account_info(dict(conta), scopes=SCOPES)
+            with metricas.medir("sheets:abrir"):
+                _PLANILHAS[chave] = {"planilha": gspread.authorize(credentials).open(NOME_PLANILHA), "abas": {}}
+        _CONTA["atual"] = conta
+        return _PLANILHAS[chave]
+
+def abrir_planilha(conta):
+    """Aba dos clientes (primeira aba)."""
+    return _planilha(conta)["planilha"].sheet1
+
+def abrir_aba(nome, conta=None):
+    """Worksheet `nome` ("" = clientes); a de auditorias é criada com o cabeçalho se não existir. None sem conta."""
+    conta = conta or _CONTA["atual"] or conta_de_servico()
+    if not conta: return None
+    aberta = _planilha(conta)
+    if not nome: return aberta["planilha"].sheet1
+    with _LOCK:
+        if nome not in aberta["abas"]:
+            import gspread
+            try:
+                with metricas.medir("sheets:abrir_aba"):
+                    aba = aberta["planilha"].worksheet(nome)
+            except gspread.WorksheetNotFound:
+                aba = aberta["planilha"].add_worksheet(nome, rows=1000, cols=len(COLUNAS_AUDITORIA))
+                aba.append_row(COLUNAS_AUDITORIA)
+            aberta["abas"][nome] = aba
+        return aberta["abas"][nome]
+
+def iniciar_fila():
+    """Liga a descarga da fila (uma thread por processo; chamadas seguintes só confirmam). Sobe o que ficou de antes."""
+    fila_planilha.iniciar(abrir_aba)
+    return fila_planilha
+
+def conectar(conta=None):
+    """Worksheet dos clientes, ou None se não houver conta configurada ou a conexão falhar."""
+    try:
+        conta = conta or conta_de_servico()
+        if not conta: return None
+        return abrir_planilha(conta)
+    except Exception as e:
+        metricas.erro("sheets:conectar", e)
+        return None
+
+def carregar_clientes(abrir=conectar, forcar=False):
+    # Índice em memória: só vai à planilha quando o TTL vence e a revisão mudou
+    indice_clientes.INDICE.atualizar(abrir, forcar=forcar)
+    return indice_clientes.INDICE.clientes
+
+def salvar_cliente(nome_conta, dados_usina, abrir=conectar):
+    """Enfileira o cliente para a planilha (sobe em lote) e já o coloca no índice. False sem planilha configurada."""
+    try:
+        if not abrir(): return False
+        # Colunas da planilha: Nome_Conta, ID_Inversor, Marca, Nome_Inversor, CPF_CNPJ
+        iniciar_fila().enfileirar(ABA_CLIENTES, [[nome_conta, str(dados_usina["id"]), dados_usina["marca"], dados_usina["nome"],
+                                                  dados_usina.get("documento") or ""]])
+        indice_clientes.INDICE.adicionar(nome_conta, dados_usina)
+        return True
+    except Exception as e:
+        metricas.erro("sheets:salvar_cliente", e, cliente=nome_conta)
+        return False
+
+def registrar_auditorias(resultados, origem):
+    """
+    Enfileira resultados de conciliação (dicts com as COLUNAS_AUDITORIA) para a aba Auditorias.
+    Sem conta configurada não faz nada (a fila não acumula o que nunca vai subir). Retorna quantas linhas entraram.
+    """
+    if not (_CONTA["atual"] or os.environ.get("EON_GCP_SERVICE_ACCOUNT")): return 0
+    agora = time.strftime("%Y-%m-%d %H:%M:%S")
+    linhas = [[agora, origem] + [_valor_celula(r.get(c)) for c in COLUNAS_AUDITORIA[2:]] for r in resultados]
+    return iniciar_fila().enfileirar(ABA_AUDITORIAS, linhas)
+
+def _valor_celula(valor):
+    if valor is None: return ""
+    if hasattr(valor, "item"): valor = valor.item()        # escalares numpy/pandas
+    if isinstance(valor, float) and valor != valor: return ""  # NaN
+    return valor if isinstance(valor, (int, float, str)) else str(valor)
+
+def descarregar():
+    """Sobe agora o que está na fila (ex: fim da CLI, antes do processo sair)."""
+    return fila_planilha.descarregar(abrir_aba)
+
+def carregar_clientes_csv(caminho):
+    """Clientes de um CSV com as colunas da planilha (Nome_Conta, ID_Inversor, Marca, Nome_Inversor, CPF_CNPJ)."""
+    with open(caminho, encoding="utf-8-sig", newline="") as f:
+        amostra = f.read(4096)
+        f.seek(0)
+        rows = list(csv.DictReader(f, delimiter=";" if amostra.count(";") > amostra.count(",") else ","))
+    indice_clientes.INDICE.carregar(rows)
+    return indice_clientes.INDICE.clientes
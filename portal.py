@@ -1,13 +1,17 @@
+import perfil_inicio
+perfil_inicio.iniciar()  # EON_PERFIL_INICIO=1: mede os imports abaixo e o tempo até a 1ª renderização
+
 import streamlit as st
-import requests
-import json
-import hashlib
-import hmac
-import base64
-from datetime import datetime, timezone, timedelta
-import pandas as pd
-import gspread
-from google.oauth2.service_account import Credentials
+from datetime import datetime
+
+import indice_clientes
+import catalogo_usinas
+import conciliacao_frota
+import fila_planilha
+import metricas
+import planilha_clientes
+import rede
+from fornecedores import buscar_geracao, pre_carregar_geracao, atualizar_catalogo, FONTES_CATALOGO
 
 # --- IMPORTA O LEITOR DE PDF ---
 try:
@@ -15,206 +19,71 @@ try:
 except ImportError:
     st.warning("⚠️ Módulo 'processador_pdf.py' não encontrado. O upload de PDF não funcionará.")
 
+try:
+    import auditoria_lote
+except ImportError:
+    auditoria_lote = None
+
 # --- CONFIGURAÇÃO ---
 st.set_page_config(page_title="Portal Eon Solar", page_icon="⚡", layout="wide")
+perfil_inicio.marcar("modulos_carregados")
 
 # --- CONEXÃO GOOGLE SHEETS ---
-SCOPES = ["https://www.googleapis.com/auth/spreadsheets", "https://www.googleapis.com/auth/drive"]
-
 def conectar_gsheets():
     try:
         if "gcp_service_account" not in st.secrets: return None
-        creds_dict = dict(st.secrets["gcp_service_account"])
-        credentials = Credentials.from_service_account_info(creds_dict, scopes=SCOPES)
-        client = gspread.authorize(credentials)
-        return client.open("Banco de Dados Eon").sheet1
-    except: return None
+        return planilha_clientes.conectar(dict(st.secrets["gcp_service_account"]))
+    except Exception as e:
+        metricas.erro("sheets:secrets", e)
+        return None
 
 def carregar_clientes():
-    sheet = conectar_gsheets()
-    if not sheet: return {}
-    try:
-        rows = sheet.get_all_records()
-        db = {}
-        for row in rows:
-            if "Nome_Conta" in row and row["Nome_Conta"]:
-                db[str(row["Nome_Conta"]).upper().strip()] = {
-                    "id": str(row["ID_Inversor"]), "marca": row["Marca"], "nome": row["Nome_Inversor"]
-                }
-        return db
-    except: return {}
+    return planilha_clientes.carregar_clientes(conectar_gsheets)
 
 def salvar_cliente(nome_conta, dados_usina):
-    try:
-        sheet = conectar_gsheets()
-        if not sheet: return False
-        sheet.append_row([nome_conta, str(dados_usina["id"]), dados_usina["marca"], dados_usina["nome"]])
-        return True
-    except: return False
-
-# --- CREDENCIAIS ---
-CREDS = {
-    "huawei": {
-        "user": "Eon.solar",
-        "pass": "eonsolar2024",
-        "url": "https://la5.fusionsolar.huawei.com/thirdData"
-    },
-    "solis": {
-        "key_id": "1300386381676798170",
-        "key_secret": "70b315e18b914435abe726846e950eab",
-        "url": "https://www.soliscloud.com:13333"
-    }
-}
-
-# --- AUTH ---
-def get_huawei_token():
-    try:
-        r = requests.post(f"{CREDS['huawei']['url']}/login", json={"userName": CREDS['huawei']['user'], "systemCode": CREDS['huawei']['pass']}, timeout=10)
-        if r.json().get("success"): return r.headers.get("xsrf-token")
-    except: pass
-    return None
+    return planilha_clientes.salvar_cliente(nome_conta, dados_usina, conectar_gsheets)
 
-def get_solis_auth(resource, body):
-    now = datetime.now(timezone.utc).strftime("%a, %d %b %Y %H:%M:%S GMT")
-    content_md5 = base64.b64encode(hashlib.md5(body.encode('utf-8')).digest()).decode('utf-8')
-    key = CREDS['solis']['key_secret'].encode('utf-8')
-    sign_str = f"POST\n{content_md5}\napplication/json\n{now}\n{resource}"
-    signature = hmac.new(key, sign_str.encode('utf-8'), hashlib.sha1).digest()
-    auth = f"API {CREDS['solis']['key_id']}:{base64.b64encode(signature).decode('utf-8')}"
-    return {"Authorization": auth, "Content-MD5": content_md5, "Content-Type": "application/json", "Date": now}
-
-# --- BUSCA SOLIS (Lógica Completa) ---
-def buscar_geracao_solis(station_id, data_inicio, data_fim):
-    dados_diarios = {} 
-    meses = pd.date_range(data_inicio, data_fim, freq='MS').strftime("%Y-%m").tolist()
-    if data_inicio.strftime("%Y-%m") not in meses: meses.append(data_inicio.strftime("%Y-%m"))
-    
-    for mes in set(meses):
-        try:
-            body = json.dumps({"stationId": station_id, "time": mes})
-            headers = get_solis_auth("/v1/api/stationDayEnergyList", body)
-            r = requests.post(f"{CREDS['solis']['url']}/v1/api/stationDayEnergyList", data=body, headers=headers)
-            records = r.json().get("data", {}).get("records", [])
-            for rec in records:
-                dia_str = rec.get("date", "")
-                if len(dia_str) < 3: full_date = f"{mes}-{int(dia_str):02d}"
-                else: full_date = dia_str
-                data_obj = datetime.strptime(full_date, "%Y-%m-%d").date()
-                if data_inicio <= data_obj <= data_fim:
-                    dados_diarios[data_obj] = float(rec.get("energy", 0))
-        except: pass
-        
-    if dados_diarios:
-        df = pd.DataFrame(list(dados_diarios.items()), columns=['Data', 'kWh'])
-        df['Data'] = pd.to_datetime(df['Data'])
-        df = df.set_index('Data').sort_index()
-        return df['kWh'].sum(), df
-    return 0.0, pd.DataFrame()
-
-# --- BUSCA HUAWEI (O "TRATOR" - Lógica Completa) ---
-def buscar_geracao_huawei(station_code, data_inicio, data_fim):
-    token = get_huawei_token()
-    if not token: return 0.0, pd.DataFrame()
-    
-    headers = {"xsrf-token": token}
-    ts_inicio = pd.Timestamp(data_inicio)
-    ts_fim = pd.Timestamp(data_fim)
-    
-    # 1. TENTATIVA ANUAL (Rápida)
-    try:
-        collect_time_year = int(datetime(ts_inicio.year, 1, 1).timestamp() * 1000)
-        r = requests.post(f"{CREDS['huawei']['url']}/getKpiStationYear", json={"stationCodes": station_code, "collectTime": collect_time_year}, headers=headers, timeout=5)
-        meses_ano = r.json().get("data", [])
-        
-        for m in meses_ano:
-            ms = m.get("collectTime", 0)
-            if ms > 0:
-                data_mes = datetime.fromtimestamp(ms / 1000).date()
-                # Verifica se é o mês exato pedido (se a busca for de um mês fechado, ex: 01/01 a 31/01)
-                if data_mes.year == ts_inicio.year and data_mes.month == ts_inicio.month and ts_inicio.day == 1:
-                    mapa = m.get("dataItemMap", {})
-                    val = float(mapa.get("inverter_power", 0) or mapa.get("product_power", 0) or 0)
-                    if val > 0:
-                        return val, pd.DataFrame()
-    except: pass
-    
-    # 2. TENTATIVA MENSAL (Varredura detalhada)
-    dt_margem_inicio = ts_inicio - timedelta(days=32)
-    dt_margem_fim = ts_fim + timedelta(days=32)
-    meses_para_consultar = pd.date_range(dt_margem_inicio, dt_margem_fim, freq='MS').tolist()
-    
-    dados_diarios = {}
-    cache_meses = set()
-    
-    for mes_obj in meses_para_consultar:
-        collect_time = int(datetime(mes_obj.year, mes_obj.month, 15).timestamp() * 1000)
-        chave = f"{mes_obj.year}-{mes_obj.month}"
-        if chave in cache_meses: continue
-        cache_meses.add(chave)
-        
-        try:
-            r = requests.post(f"{CREDS['huawei']['url']}/getKpiStationMonth", json={"stationCodes": station_code, "collectTime": collect_time}, headers=headers, timeout=5)
-            lista_dias = r.json().get("data", [])
-            
-            if isinstance(lista_dias, list):
-                for item in lista_dias:
-                    ms = item.get("collectTime", 0)
-                    if ms > 0:
-                        data_real = datetime.fromtimestamp(ms / 1000).date()
-                        mapa = item.get("dataItemMap", {})
-                        
-                        val = float(mapa.get("inverter_power", 0) or mapa.get("inverterYield", 0) or mapa.get("product_power", 0) or 0)
-                        
-                        # Se achar valor gigante (>500) dentro do período, assume que é o acumulado mensal bugado
-                        if val > 500 and (data_inicio <= data_real <= data_fim):
-                            return val, pd.DataFrame()
-                        
-                        if val > 0 and (data_inicio <= data_real <= data_fim):
-                            dados_diarios[data_real] = val
-        except: pass
-
-    if dados_diarios:
-        df = pd.DataFrame(list(dados_diarios.items()), columns=['Data', 'kWh'])
-        df['Data'] = pd.to_datetime(df['Data'])
-        df = df.set_index('Data').sort_index()
-        return df['kWh'].sum(), df
-    
-    return 0.0, pd.DataFrame()
-
-# --- LISTAGEM DE USINAS ---
-@st.cache_data(ttl=600)
-def listar_todas_usinas():
-    lista = []
-    try:
-        token = get_huawei_token()
-        if token:
-            r = requests.post(f"{CREDS['huawei']['url']}/getStationList", json={"pageNo": 1, "pageSize": 100}, headers={"xsrf-token": token}, timeout=10)
-            d = r.json().get("data", [])
-            estacoes = d if isinstance(d, list) else d.get("list", [])
-            for s in estacoes:
-                lista.append({"id": str(s.get("stationCode")), "nome": s.get("stationName"), "marca": "Huawei", "display": f"Huawei | {s.get('stationName')}"})
-    except: pass
-    try:
-        body = json.dumps({"pageNo": 1, "pageSize": 100})
-        headers = get_solis_auth("/v1/api/userStationList", body)
-        r = requests.post(f"{CREDS['solis']['url']}/v1/api/userStationList", data=body, headers=headers, timeout=10)
-        d = r.json().get("data", {}).get("page", {}).get("records", [])
-        for s in d:
-            lista.append({"id": str(s.get("id")), "nome": s.get("stationName"), "marca": "Solis", "display": f"Solis | {s.get('stationName')}"})
-    except: pass
-    return lista
+def registrar_auditorias(resultados, origem):
+    # Resultados vão para a aba Auditorias pela fila (em lote, em segundo plano)
+    if conectar_gsheets(): planilha_clientes.registrar_auditorias(resultados, origem)
 
 # --- INTERFACE ---
 st.sidebar.title("💰 Eon Solar")
-menu = st.sidebar.radio("Navegação", ["🏠 Home", "📄 Auditoria Financeira", "⚙️ Configurações"])
+menu = st.sidebar.radio("Navegação", ["🏠 Home", "📄 Auditoria Financeira", "📦 Auditoria em Lote", "⚙️ Configurações"])
+
+# Conciliação da frota em segundo plano (uma thread por processo, sobrevive aos reruns)
+conciliacao_frota.iniciar(lambda: (carregar_clientes(), buscar_geracao, pre_carregar_geracao))
+planilha_clientes.iniciar_fila()  # escritas na planilha em lote; o que ficou na fila de antes sobe agora
+metricas.iniciar_exportacao()
 
 if menu == "🏠 Home":
     st.title("Dashboard Geral")
     with st.spinner("Conectando..."):
         db = carregar_clientes()
-    c1, c2 = st.columns(2)
+    painel = conciliacao_frota.painel()
+    c1, c2, c3, c4 = st.columns(4)
     c1.metric("Clientes", len(db))
-    c2.metric("Status", "Online 🟢")
+    c2.metric("Conciliados", painel["clientes"])
+    c3.metric("Com Prejuízo", painel["com_prejuizo"])
+    c4.metric("R$ em Risco", f"R$ {painel['em_risco']:.2f}")
+
+    estado = conciliacao_frota.ESTADO
+    if estado["rodando"]: st.caption("🔄 Conciliando a frota...")
+    elif painel["atualizado_em"]: st.caption(f"Última mudança: {datetime.fromtimestamp(painel['atualizado_em']):%d/%m %H:%M}")
+    if estado["erro"]: st.warning(f"Último ciclo falhou: {estado['erro']}")
+
+    col_a, col_b = st.columns(2)
+    col_a.markdown("#### 🚨 Maiores Divergências")
+    if not painel["piores"]: col_a.info("Nenhum prejuízo detectado.")
+    else: col_a.dataframe(painel["piores"], use_container_width=True, hide_index=True)
+    col_b.markdown("#### 📡 Usinas sem Dados")
+    if not painel["sem_dados"]: col_b.info("Todas as usinas com geração.")
+    else: col_b.dataframe(painel["sem_dados"], use_container_width=True, hide_index=True)
+    if painel["dias_parados"]:
+        st.markdown("#### ⏸️ Dias sem Geração no Período")
+        st.dataframe(painel["dias_parados"], use_container_width=True, hide_index=True)
+    if st.button("🔄 Conciliar agora"):
+        conciliacao_frota.agendar_agora()
 
 elif menu == "📄 Auditoria Financeira":
     st.title("Auditoria de Precisão")
@@ -260,10 +129,11 @@ elif menu == "📄 Auditoria Financeira":
     nome_input = col_nome.text_input("Nome do Cliente:", value=nome_padrao).upper().strip()
     
     if nome_input:
-        db = carregar_clientes()
-        usina = db.get(nome_input)
+        carregar_clientes()
+        nome_cliente, usina = indice_clientes.INDICE.buscar(nome_input)
         
         if usina:
+            if nome_cliente != nome_input: st.caption(f"Cliente encontrado como: **{nome_cliente}**")
             st.info(f"Conectado a: **{usina['nome']}** ({usina['marca']})")
             
             # Inputs finais para cálculo
@@ -279,18 +149,24 @@ elif menu == "📄 Auditoria Financeira":
             t_final = col_t1.number_input("Tarifa Média (R$)", value=tarifa_cred if tarifa_cred > 0 else (tarifa_cons if tarifa_cons > 0 else 1.00), format="%.4f")
             k_cred = col_kwh.number_input("Crédito na Conta (kWh)", value=kwh_creditado)
 
-            if st.button("🚀 Executar Auditoria", type="primary"):
+            periodo_invalido = d_fim < d_ini
+            if periodo_invalido: st.error("A data de fim é anterior à de início.")
+            if st.button("🚀 Executar Auditoria", type="primary", disabled=periodo_invalido):
                 with st.spinner("Buscando Geração Real..."):
-                    if usina["marca"] == "Huawei":
-                        kwh_gerado, _ = buscar_geracao_huawei(usina["id"], d_ini, d_fim)
-                    else:
-                        kwh_gerado, _ = buscar_geracao_solis(usina["id"], d_ini, d_fim)
+                    try:
+                        kwh_gerado, df_dias = buscar_geracao(usina, d_ini, d_fim)
+                    except Exception as e:
+                        st.error(f"Não foi possível buscar a geração: {e}")
+                        st.stop()
                     
                     st.divider()
                     
-                    # CÁLCULO FINANCEIRO REAL
-                    diff_kwh = k_cred - kwh_gerado
-                    valor_diff = diff_kwh * t_final
+                    # CÁLCULO FINANCEIRO REAL (mesmo motor da frota; a série diária dá os dias zerados)
+                    import motor_conciliacao
+                    serie = {} if df_dias.empty else df_dias["kWh"].to_dict()
+                    r = motor_conciliacao.conciliar(motor_conciliacao.matriz_diaria([serie], d_ini, (d_fim - d_ini).days + 1), d_ini,
+                                                    [0], [d_ini], [d_fim], [k_cred], [t_final], total_informado=[float(kwh_gerado)])
+                    diff_kwh, valor_diff = float(r["diferenca_kwh"][0]), float(r["valor_diferenca"][0])
                     
                     c1, c2, c3 = st.columns(3)
                     c1.metric("Geração Inversor", f"{kwh_gerado:.2f} kWh")
@@ -301,6 +177,10 @@ elif menu == "📄 Auditoria Financeira":
                     elif diff_kwh > 5: delta_color = "off"    # Verde/Cinza se positivo
                     
                     c3.metric("Diferença", f"{diff_kwh:.2f} kWh", delta=f"R$ {valor_diff:.2f}", delta_color=delta_color)
+                    if uploaded_file: conciliacao_frota.registrar_fatura(nome_cliente, d_ini, d_fim, k_cred, t_final, uploaded_file.name)
+                    registrar_auditorias([{**{c: v[0] for c, v in motor_conciliacao.rotulos(r).items()}, "cliente": nome_cliente, "marca": usina["marca"], "usina": usina["nome"],
+                                           "arquivo": uploaded_file.name if uploaded_file else None, "inicio": d_ini, "fim": d_fim,
+                                           "kwh_gerado": float(kwh_gerado)}], "individual")
                     
                     if diff_kwh < -5:
                         st.error(f"🚨 **ALERTA DE PREJUÍZO:** A concessionária deixou de creditar **{abs(diff_kwh):.2f} kWh**.")
@@ -309,10 +189,101 @@ elif menu == "📄 Auditoria Financeira":
                         st.success(f"✅ **LUCRO OPERACIONAL:** Creditado a mais que o gerado.")
                     else:
                         st.info("✅ **CONTA BATIDA!** Nenhuma divergência financeira relevante.")
+                    if r["dias_zerados"][0]:
+                        zerados = sorted(d for d, kwh in serie.items() if kwh == 0)
+                        st.warning(f"⏸️ **{r['dias_zerados'][0]} dia(s) sem geração** no período: "
+                                   + ", ".join(f"{d:%d/%m}" for d in zerados[:15]) + (" ..." if len(zerados) > 15 else ""))
 
         else:
             st.warning("Cliente não encontrado.")
 
+elif menu == "📦 Auditoria em Lote":
+    st.title("Auditoria em Lote")
+    if not auditoria_lote:
+        st.error("⚠️ Módulo 'auditoria_lote.py' não encontrado.")
+        st.stop()
+
+    st.markdown("### 1. Faturas")
+    arquivo_zip = st.file_uploader("ZIP com as contas de luz", type="zip")
+    pasta = st.text_input("...ou pasta no servidor:", placeholder="/dados/faturas/2024-05")
+
+    origem = arquivo_zip.getvalue() if arquivo_zip else pasta.strip()
+    if origem and st.button("🚀 Processar Lote", type="primary"):
+        db = carregar_clientes()
+        if not db:
+            st.error("Não foi possível carregar a planilha de clientes.")
+            st.stop()
+
+        barra = st.progress(0.0, text="Lendo faturas...")
+        def ao_progredir(concluidas, total, taxa):
+            barra.progress(concluidas / total, text=f"{concluidas}/{total} faturas · {taxa:.1f} faturas/s")
+
+        try:
+            df_lote = auditoria_lote.processar_lote(origem, db, buscar_geracao, ao_progredir=ao_progredir, pre_carregar=pre_carregar_geracao)
+        except Exception as e:
+            st.error(f"Erro ao abrir o lote: {e}")
+            st.stop()
+        st.session_state["resultado_lote"] = df_lote
+        registrar_auditorias(df_lote.to_dict("records"), "lote")
+        if conciliacao_frota.registrar_lote(df_lote): conciliacao_frota.agendar_agora()
+
+    df_lote = st.session_state.get("resultado_lote")
+    if df_lote is not None:
+        st.divider()
+        st.markdown("### 2. Resultado")
+        if df_lote.empty:
+            st.warning("Nenhum PDF encontrado.")
+        else:
+            prejuizo = df_lote[df_lote["alerta"] == "prejuizo"]
+            c1, c2, c3, c4 = st.columns(4)
+            c1.metric("Faturas", len(df_lote))
+            c2.metric("Conciliadas", int((df_lote["status"] == "ok").sum()))
+            c3.metric("Com Prejuízo", len(prejuizo))
+            c4.metric("R$ em Risco", f"R$ {abs(prejuizo['valor_diferenca'].sum()):.2f}")
+            desbloqueio = auditoria_lote.resumo_desbloqueio(df_lote)
+            if desbloqueio["protegidas"]:
+                d1, d2, d3 = st.columns(3)
+                d1.metric("🔒 Protegidas", desbloqueio["protegidas"])
+                d2.metric("🔓 Desbloqueadas", f"{desbloqueio['desbloqueadas']} ({desbloqueio['taxa_acerto']:.0%})")
+                d3.metric("Desbloqueio", f"{desbloqueio['faturas_por_s']:.1f} faturas/s" if desbloqueio["faturas_por_s"] else "-")
+                st.caption("Origem da senha: " + ", ".join(f"{k}: {v}" for k, v in desbloqueio["por_origem"].items())
+                           + " · cadastre o CPF/CNPJ (coluna CPF_CNPJ da planilha) dos clientes que falharam.")
+            st.dataframe(df_lote, use_container_width=True)
+
+            csv = df_lote.to_csv(index=False, sep=";", decimal=",").encode("utf-8-sig")
+            st.download_button("⬇️ Baixar CSV", csv, "auditoria_lote.csv", "text/csv")
+            try:
+                st.download_button("⬇️ Baixar Parquet", df_lote.to_parquet(index=False), "auditoria_lote.parquet", "application/octet-stream")
+            except ImportError:
+                pass  # pyarrow não instalado
+
 elif menu == "⚙️ Configurações":
     st.info("Sistema Conectado.")
-    if st.button("Recarregar"): st.cache_data.clear(); st.rerun()
+    usinas = catalogo_usinas.listar()
+    for marca in FONTES_CATALOGO:
+        decorrido = catalogo_usinas.idade(marca)
+        qtd = sum(1 for u in usinas if u["marca"] == marca)
+        st.caption(f"Catálogo {marca}: {qtd} usinas · " + (f"atualizado há {decorrido / 60:.0f} min" if decorrido is not None else "nunca atualizado"))
+    na_fila = sum(fila_planilha.pendentes().values())
+    st.caption(f"Planilha: {na_fila} linha(s) aguardando envio" + (f" · último erro: {fila_planilha.ESTADO['erro']}" if fila_planilha.ESTADO["erro"] else ""))
+    if st.button("Recarregar"):
+        st.cache_data.clear()
+        indice_clientes.INDICE.atualizar(conectar_gsheets, forcar=True)
+        atualizar_catalogo(forcar=True)
+        st.rerun()
+
+# --- DESEMPENHO POR ETAPA (p50/p95 do processo; EON_METRICAS_PROM / EON_METRICAS_PORTA exportam) ---
+desempenho = metricas.resumo()
+if desempenho["etapas"]:
+    with st.sidebar.expander("📈 Latência por etapa"):
+        st.dataframe(desempenho["etapas"], use_container_width=True, hide_index=True)
+        if desempenho["contadores"]: st.dataframe(desempenho["contadores"], use_container_width=True, hide_index=True)
+        if rede.disjuntores(): st.caption("Disjuntores: " + " | ".join(f"{f}: {e}" for f, e in rede.disjuntores().items()))
+
+# --- PERFIL DE SUBIDA (EON_PERFIL_INICIO=1) ---
+if perfil_inicio.marcar("primeira_renderizacao"): perfil_inicio.imprimir()
+if perfil_inicio.ATIVO:
+    with st.sidebar.expander("⏱️ Perfil de subida"):
+        perfil = perfil_inicio.relatorio()
+        st.caption(" | ".join(f"{k}: {v:.2f} s" for k, v in perfil["eventos"].items()) + f" | imports: {perfil['imports_ms']:.0f} ms")
+        st.dataframe(perfil["imports"], use_container_width=True, hide_index=True)
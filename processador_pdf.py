@@ -1,7 +1,14 @@
-import pdfplumber
+import hashlib
+import io
+import json
+import os
 import re
 from datetime import datetime
 
+import metricas
+
+# pypdf e pdfplumber são importados na primeira leitura (não pesam na subida do app)
+
 def converter_valor_br(texto_valor):
     """Converte string '1.234,56' para float 1234.56"""
     try:
@@ -11,13 +18,351 @@ def converter_valor_br(texto_valor):
     except:
         return 0.0
 
-def extrair_dados_fatura(arquivo):
+class PdfDesbloqueado:
+    """PDF protegido já aberto: leitor pypdf decriptado + bytes originais e senha (para o pdfplumber, se precisar)."""
+
+    def __init__(self, conteudo, senha, leitor):
+        self.conteudo = conteudo
+        self.senha = senha
+        self.leitor = leitor
+
+# --- EXTRATORES DE TEXTO ---
+# Interface: num_paginas, texto(indice) -> str, fechar()
+class ExtratorPypdf:
+    """Rápido (sem análise de layout). Padrão do modo "auto"."""
+    nome = "pypdf"
+
+    def __init__(self, arquivo):
+        import pypdf
+        # PDF desbloqueado: usa o leitor já decriptado, sem reabrir nem regravar o documento
+        self._leitor = arquivo.leitor if isinstance(arquivo, PdfDesbloqueado) else pypdf.PdfReader(arquivo)
+        self.num_paginas = len(self._leitor.pages)
+
+    def texto(self, indice):
+        return self._leitor.pages[indice].extract_text() or ""
+
+    def fechar(self): pass
+
+class ExtratorPdfplumber:
+    """Lento (análise de layout), mas respeita melhor as colunas. Usado como reserva."""
+    nome = "pdfplumber"
+
+    def __init__(self, arquivo):
+        import pdfplumber
+        if isinstance(arquivo, PdfDesbloqueado):
+            self._pdf = pdfplumber.open(io.BytesIO(arquivo.conteudo), password=arquivo.senha)
+        else:
+            self._pdf = pdfplumber.open(arquivo)
+        self.num_paginas = len(self._pdf.pages)
+
+    def texto(self, indice):
+        page = self._pdf.pages[indice]
+        texto = page.extract_text() or ""
+        page.close()  # libera o cache de layout da página já lida
+        return texto
+
+    def fechar(self): self._pdf.close()
+
+EXTRATORES = {"pypdf": ExtratorPypdf, "pdfplumber": ExtratorPdfplumber}
+
+# Dois valores monetários grudados ("350,000,95"): sinal de colunas embaralhadas
+RE_NUMEROS_GRUDADOS = re.compile(r'\d,\d{2}\d{1,3}[\.,]\d')
+
+def texto_embaralhado(texto):
+    """Heurística para texto mal extraído: página vazia, números grudados ou linhas enormes (colunas fundidas)."""
+    if not texto.strip(): return True
+    if len(RE_NUMEROS_GRUDADOS.findall(texto)) >= 2: return True
+    linhas = texto.count("\n") + 1
+    return len(texto) / linhas > 250
+
+def _fonte(arquivo):
+    """Caminho ou bytes. Streams são lidos uma vez, para cada extrator abrir o seu próprio BytesIO."""
+    if isinstance(arquivo, (str, os.PathLike, PdfDesbloqueado)): return arquivo
+    if isinstance(arquivo, (bytes, bytearray)): return bytes(arquivo)
+    if hasattr(arquivo, "seek"): arquivo.seek(0)
+    return arquivo.read()
+
+def abrir_extrator(nome, fonte):
+    return EXTRATORES[nome](io.BytesIO(fonte) if isinstance(fonte, bytes) else fonte)
+
+def iterar_paginas(extrator, reserva=None):
     """
-    Scanner Completo da Fatura de Energia.
-    Busca: TUSD, TE, Energia Injetada, CIP e Datas.
-    Retorna: Tarifa Média Real (R$/kWh) e Totais.
+    Gera (numero_pagina, linhas, nome_extrator) uma página por vez, sem montar o texto do documento inteiro.
+    Se `reserva()` for dada, páginas com texto embaralhado são relidas pelo extrator que ela abrir (uma vez só).
+    Página sem texto (imagem/scan) vem com a lista vazia em vez de quebrar a leitura.
+    """
+    aberto = None
+    try:
+        for indice in range(extrator.num_paginas):
+            texto, nome = extrator.texto(indice), extrator.nome
+            if reserva and texto_embaralhado(texto):
+                if aberto is None: aberto = reserva()
+                texto, nome = aberto.texto(indice), aberto.nome
+            yield indice + 1, texto.split('\n') if texto else [], nome
+    finally:
+        if aberto: aberto.fechar()
+
+def campos_essenciais_encontrados(dados):
+    """Consumo, injeção, CIP e mês de referência já identificados?"""
+    return bool(dados["consumo_kwh"] and dados["injetado_kwh"] and dados["cip_cosip"] and dados["mes_referencia"])
+
+def campos_obrigatorios_encontrados(dados):
+    """Consumo e mês de referência existem em toda fatura; sem eles a leitura falhou."""
+    return bool(dados["consumo_kwh"] and dados["mes_referencia"])
+
+# --- DESBLOQUEIO ---
+@metricas.cronometrar("pdf:desbloqueio")
+def verificar_e_desbloquear_pdf(arquivo_bytes, senha=None):
+    import pypdf
+    try:
+        buffer = io.BytesIO(arquivo_bytes)
+        leitor = pypdf.PdfReader(buffer)
+        
+        if leitor.is_encrypted:
+            if not senha: return None, 'bloqueado'
+            try:
+                if leitor.decrypt(senha):
+                    writer = pypdf.PdfWriter()
+                    for page in leitor.pages: writer.add_page(page)
+                    novo_buffer = io.BytesIO()
+                    writer.write(novo_buffer)
+                    novo_buffer.seek(0)
+                    return novo_buffer.getvalue(), 'ok'
+                else: return None, 'senha_errada'
+            except: return None, 'senha_errada'
+        return arquivo_bytes, 'ok'
+    except Exception as e:
+        return None, f"erro_leitura: {e}"
+
+def candidatos_senha(documento):
+    """
+    Senhas que as concessionárias costumam usar a partir do CPF/CNPJ do titular:
+    só dígitos, com pontuação, e os primeiros 3 a 6 dígitos (e a raiz de 8 dígitos do CNPJ).
     """
-    dados = {
+    digitos = re.sub(r'\D', '', str(documento or ""))
+    if len(digitos) not in (11, 14): return []
+    if len(digitos) == 11: formatado = f"{digitos[:3]}.{digitos[3:6]}.{digitos[6:9]}-{digitos[9:]}"
+    else: formatado = f"{digitos[:2]}.{digitos[2:5]}.{digitos[5:8]}/{digitos[8:12]}-{digitos[12:]}"
+    candidatos = [digitos, formatado] + [digitos[:n] for n in (3, 4, 5, 6)]
+    if len(digitos) == 14: candidatos.append(digitos[:8])
+    return list(dict.fromkeys(candidatos))
+
+@metricas.cronometrar("pdf:desbloqueio")
+def desbloquear_com_candidatos(conteudo, tentativas, max_tentativas=2000):
+    """
+    Tenta abrir o PDF (bytes) com uma sequência de (rotulo, senha), na ordem, sem repetir senha.
+    Não regrava o documento: devolve o leitor já decriptado para o extrator.
+    Retorna (PdfDesbloqueado | None, rotulo | None, status, testadas);
+    status: 'nao_protegido' | 'ok' | 'falhou' | 'erro_leitura: ...'.
+    """
+    import pypdf
+    try:
+        leitor = pypdf.PdfReader(io.BytesIO(conteudo))
+        if not leitor.is_encrypted: return None, None, "nao_protegido", 0
+    except Exception as e:
+        return None, None, f"erro_leitura: {e}", 0
+    testadas = set()
+    for rotulo, senha in tentativas:
+        if not senha or senha in testadas: continue
+        if len(testadas) >= max_tentativas: break
+        testadas.add(senha)
+        try:
+            if leitor.decrypt(senha): return PdfDesbloqueado(conteudo, senha, leitor), rotulo, "ok", len(testadas)
+        except Exception:
+            continue
+    return None, None, "falhou", len(testadas)
+
+# --- REGRAS DE CLASSIFICAÇÃO DE LINHAS ---
+# Cada regra é declarativa:
+#   exige:      lista de grupos; a linha precisa ter ao menos uma palavra de CADA grupo
+#   exceto:     palavras que descartam a linha
+#   min_numeros: quantidade mínima de números (formato 0,00) na linha
+#   minimos:    {índice do número: valor} que o número precisa superar
+#   captura:    {campo: (índice do número, agregação)} — agregação: max | soma | ultimo | primeiro
+#   padrao/conversor: regex aplicada à linha (em vez dos números) e função que converte o trecho achado
+#   pista:      trecho literal obrigatório para o padrão casar (filtro barato antes da regex)
+REGRAS_PADRAO = [
+    {
+        # Consumo (TUSD + TE + Energia). Padrão: Descrição ... kWh ... Qtd ... Tarif ... Valor
+        "nome": "consumo",
+        "exige": [["ENERGIA ELETR", "CONSUMO", "TUSD", "TE "], ["KWH"]],
+        "exceto": ["INJETADA", "COMPENSADA"],
+        "min_numeros": 2,
+        # Filtro de segurança para não somar tarifas (que são pequenas, tipo 0,95) como consumo
+        "minimos": {0: 10},
+        # Qtd é o 1º número (pega o maior consumo achado, geralmente o total); Valor R$ é o último
+        "captura": {"consumo_kwh": (0, "max"), "valor_consumo_total": (-1, "soma")},
+    },
+    {
+        # Energia injetada / compensada (GD)
+        "nome": "injetado",
+        "exige": [["INJETADA", "COMPENSADA", "GD I"], ["KWH"]],
+        "min_numeros": 2,
+        "captura": {"injetado_kwh": (0, "soma"), "valor_credito_total": (-1, "soma")},
+    },
+    {
+        # Iluminação pública (CIP/COSIP)
+        "nome": "cip",
+        "exige": [["ILUM", "CIP", "COSIP"], ["CONTRIB", "MUNIC"]],
+        "min_numeros": 1,
+        "captura": {"cip_cosip": (-1, "ultimo")},
+    },
+    {
+        # Mês de referência (ex: MAI/2024)
+        "nome": "mes_referencia",
+        "padrao": r'\b(JAN|FEV|MAR|ABR|MAI|JUN|JUL|AGO|SET|OUT|NOV|DEZ)[/ ]?20\d{2}\b',
+        "pista": "20",
+        "conversor": "mes_ano",
+        "captura": {"mes_referencia": (0, "primeiro")},
+    },
+]
+
+def estender_regras(regras, nome, exige=None, exceto=None):
+    """Copia um conjunto de regras acrescentando palavras-chave à regra `nome`."""
+    novas = []
+    for regra in regras:
+        regra = dict(regra)
+        if regra["nome"] == nome:
+            if exige:
+                grupos = [list(g) for g in regra["exige"]]
+                grupos[0] += exige
+                regra["exige"] = grupos
+            if exceto: regra["exceto"] = list(regra.get("exceto", [])) + exceto
+        novas.append(regra)
+    return novas
+
+# Regras por concessionária: identificação (regex no texto da fatura) + conjunto de regras.
+# A CEMIG é o layout de referência das regras padrão.
+CONCESSIONARIAS = {
+    "CEMIG": {"identificacao": r'\bCEMIG\b', "regras": REGRAS_PADRAO},
+    "ENEL": {"identificacao": r'\bENEL\b', "regras": estender_regras(REGRAS_PADRAO, "consumo", exige=["ENERGIA ATIVA FORNECIDA"])},
+    "NEOENERGIA": {"identificacao": r'\b(NEOENERGIA|COELBA|CELPE|COSERN|ELEKTRO)\b', "regras": estender_regras(REGRAS_PADRAO, "injetado", exige=["ENERGIA INJ"])},
+}
+
+# Versão da leitura local, na chave do cache de respostas da IA no modo "texto" (o modelo recebe o texto e
+# os campos desta leitura). Suba VERSAO_EXTRATORES ao mudar extratores, RE_NUMERO ou texto_compacto;
+# a impressão digital das tabelas de regras já muda sozinha quando REGRAS_PADRAO/CONCESSIONARIAS mudam.
+VERSAO_EXTRATORES = 1
+VERSAO_LEITURA = "%d:%s" % (VERSAO_EXTRATORES, hashlib.sha256(
+    json.dumps([REGRAS_PADRAO, CONCESSIONARIAS], sort_keys=True).encode()).hexdigest()[:12])
+
+MESES = {"JAN": 1, "FEV": 2, "MAR": 3, "ABR": 4, "MAI": 5, "JUN": 6, "JUL": 7, "AGO": 8, "SET": 9, "OUT": 10, "NOV": 11, "DEZ": 12}
+
+def converter_mes_ano(trecho):
+    """'MAI/2024' -> date(2024, 5, 1)"""
+    try:
+        return datetime(int(trecho[-4:]), MESES[trecho[:3]], 1).date()
+    except: return None
+
+CONVERSORES = {"mes_ano": converter_mes_ano}
+# Número BR com milhar ('1.287,85') antes do caso simples: senão vira '1.287' e perde os centavos.
+# O 1º dígito fica fora da alternância: posição sem dígito falha de cara (mesmos acertos, bem mais rápido)
+RE_NUMERO = re.compile(r'\d(?:\d{0,2}(?:\.\d{3})+,\d+|\d*[\.,]\d+)')
+
+# agregação -> função (valor atual, valor achado) -> novo valor do campo
+AGREGACOES = {
+    "max": max,
+    "soma": lambda atual, v: atual + v,
+    "ultimo": lambda atual, v: v,
+    "primeiro": lambda atual, v: atual or v,
+}
+
+class RegraCompilada:
+    """Uma regra da tabela já preparada: palavras em tuplas, regex compilada e funções de agregação resolvidas."""
+
+    def __init__(self, regra):
+        self.nome = regra["nome"]
+        # Grupo com menos palavras primeiro (o mais seletivo, ex: KWH): a ordem não muda o resultado, só o custo
+        self.exige = tuple(sorted((tuple(grupo) for grupo in regra.get("exige", ())), key=len))
+        self.exceto = tuple(regra.get("exceto", ()))
+        self.padrao = re.compile(regra["padrao"]) if "padrao" in regra else None
+        self.conversor = CONVERSORES[regra["conversor"]] if "conversor" in regra else None
+        self.pista = regra.get("pista")
+        self.min_numeros = regra.get("min_numeros", 1)
+        self.minimos = tuple(regra.get("minimos", {}).items())
+        self.capturas = tuple((campo, indice, AGREGACOES[agregacao]) for campo, (indice, agregacao) in regra["captura"].items())
+        self.campos = tuple(regra["captura"])
+        # Regra só de "primeiro": deixa de rodar quando todos os campos dela já foram achados
+        self.so_primeiro = all(agregacao == "primeiro" for _, agregacao in regra["captura"].values())
+
+class ConjuntoRegras:
+    """
+    Tabela de regras preparada UMA vez (RegraCompilada) e aplicada por um laço simples, só com testes `in`.
+    Por linha, o gatilho descarta antes do laço das regras as que não têm palavra do grupo que cada regra
+    testa primeiro (a maior parte: histórico, avisos, dados da UC); nas demais, os números são extraídos
+    uma única vez e convertidos apenas os que serão capturados. Na mesma linha, padrões rodam antes das palavras.
+    """
+
+    def __init__(self, regras):
+        self.regras = regras
+        self.compiladas = [RegraCompilada(regra) for regra in regras]
+        self.padroes = [regra for regra in self.compiladas if regra.padrao is not None]
+        self.palavras = [regra for regra in self.compiladas if regra.padrao is None]
+        # Sem nenhuma palavra do grupo que cada regra testa primeiro, nenhuma regra de palavras casa
+        self.gatilho = tuple(dict.fromkeys(p for regra in self.palavras for p in regra.exige[0]))
+
+    def aplicar(self, dados, linha):
+        self.aplicar_linhas(dados, (linha,))
+
+    def aplicar_linhas(self, dados, linhas):
+        """Aplica as regras a uma sequência de linhas (ex: uma página), acumulando em `dados`."""
+        gatilho, palavras = self.gatilho, self.palavras
+        # Regra só de "primeiro" com os campos já achados sai da lista (uma vez, não a cada linha)
+        padroes = [regra for regra in self.padroes if not (regra.so_primeiro and all(map(dados.get, regra.campos)))]
+        for linha in linhas:
+            u = linha.upper()
+            if padroes:
+                for regra in padroes:
+                    if regra.pista and regra.pista not in u: continue
+                    m = regra.padrao.search(u)
+                    if not m: continue
+                    valor = regra.conversor(m.group(0))
+                    if valor is None: continue
+                    for campo, _, agregar in regra.capturas:
+                        dados[campo] = agregar(dados[campo], valor)
+                    if regra.so_primeiro and all(map(dados.get, regra.campos)):
+                        padroes = [outra for outra in padroes if outra is not regra]
+
+            for palavra in gatilho:
+                if palavra in u: break
+            else:
+                continue
+            contem = u.__contains__
+            numeros = None
+            for regra in palavras:
+                for grupo in regra.exige:
+                    if not any(map(contem, grupo)): break
+                else:  # tem palavra de cada grupo
+                    if regra.exceto and any(map(contem, regra.exceto)): continue
+                    if numeros is None: numeros = RE_NUMERO.findall(linha)
+                    if len(numeros) < regra.min_numeros: continue
+                    for indice, minimo in regra.minimos:
+                        if converter_valor_br(numeros[indice]) <= minimo: break
+                    else:
+                        for campo, indice, agregar in regra.capturas:
+                            dados[campo] = agregar(dados[campo], converter_valor_br(numeros[indice]))
+
+_COMPILADOS = {}
+
+def regras_compiladas(concessionaria=None):
+    """Conjunto de regras (compilado uma vez por processo) da concessionária, ou o padrão."""
+    chave = concessionaria if concessionaria in CONCESSIONARIAS else None
+    if chave not in _COMPILADOS:
+        _COMPILADOS[chave] = ConjuntoRegras(CONCESSIONARIAS[chave]["regras"] if chave else REGRAS_PADRAO)
+    return _COMPILADOS[chave]
+
+RE_CONCESSIONARIA = re.compile("|".join(f"(?P<{nome}>{c['identificacao']})" for nome, c in CONCESSIONARIAS.items()))
+
+def identificar_concessionaria(linha):
+    m = RE_CONCESSIONARIA.search(linha.upper())
+    return m.lastgroup if m else None
+
+def processar_linha(dados, linha, regras=None):
+    """Classifica uma linha da fatura e acumula o que encontrar em `dados`."""
+    (regras or regras_compiladas()).aplicar(dados, linha)
+
+def _novo_resultado(concessionaria=None):
+    return {
         "mes_referencia": None,
         "consumo_kwh": 0.0,
         "valor_consumo_total": 0.0,  # Soma de TUSD + TE + Bandeiras
@@ -26,80 +371,129 @@ def extrair_dados_fatura(arquivo):
         "valor_credito_total": 0.0,
         "tarifa_credito_calc": 0.0,  # Tarifa de compensação (pode ser menor que a de consumo)
         "cip_cosip": 0.0,            # Iluminação Pública
+        "concessionaria": concessionaria,
+        "extrator": None,            # pypdf | pdfplumber | pypdf+pdfplumber
+        "paginas_lidas": 0,
         "texto_completo": ""
     }
 
+def _varrer(fonte, dados, extrator, manter_texto, parar_cedo):
+    """Aplica as regras página a página com o extrator pedido ("auto" = pypdf + reserva pdfplumber)."""
+    principal = abrir_extrator("pypdf" if extrator == "auto" else extrator, fonte)
+    reserva = (lambda: abrir_extrator("pdfplumber", fonte)) if extrator == "auto" else None
+    linhas_texto = []
+    usados = []
+    regras = regras_compiladas(dados["concessionaria"])
+    try:
+        # Analisa item a item, conforme as páginas vão sendo lidas
+        for numero, linhas, nome in iterar_paginas(principal, reserva):
+            dados["paginas_lidas"] = numero
+            if nome not in usados: usados.append(nome)
+            if manter_texto: linhas_texto.extend(linhas)
+            if not dados["concessionaria"]:
+                # Procurada no texto da página; as linhas antes do nome ficam com as regras padrão
+                pagina = "\n".join(linhas).upper()
+                m = RE_CONCESSIONARIA.search(pagina)
+                if m:
+                    antes = pagina.count("\n", 0, m.start())
+                    regras.aplicar_linhas(dados, linhas[:antes])
+                    dados["concessionaria"] = m.lastgroup
+                    regras = regras_compiladas(m.lastgroup)
+                    linhas = linhas[antes:]
+            regras.aplicar_linhas(dados, linhas)
+            if parar_cedo and campos_essenciais_encontrados(dados): break
+    finally:
+        principal.fechar()
+    dados["extrator"] = "+".join(usados) or principal.nome
+    if manter_texto: dados["texto_completo"] = "\n".join(linhas_texto)
+
+@metricas.cronometrar("pdf:leitura")
+def extrair_dados_fatura(arquivo, manter_texto=False, parar_cedo=False, concessionaria=None, extrator="auto"):
+    """
+    Scanner Completo da Fatura de Energia.
+    Busca: TUSD, TE, Energia Injetada, CIP e Datas.
+    Retorna: Tarifa Média Real (R$/kWh) e Totais.
+    Lê página a página. Com parar_cedo, encerra ao fim da primeira página em que consumo, injeção,
+    CIP e mês de referência já foram todos encontrados: só para quem quer saber se os campos existem
+    (ex: mês de referência). Os totais somados (injeção, valores) ficam incompletos se houver
+    linhas nas páginas seguintes (fatura de vários UCs), por isso o padrão lê o documento inteiro.
+    O texto lido só é guardado em "texto_completo" se manter_texto=True.
+    Sem `concessionaria`, ela é identificada pelo texto e as regras dela passam a valer dali em diante.
+    extrator: "auto" (pypdf; página embaralhada é relida pelo pdfplumber e, se consumo ou mês
+    de referência não aparecerem, a fatura toda é relida pelo pdfplumber), "pypdf" ou "pdfplumber".
+    O extrator efetivamente usado volta em dados["extrator"].
+    """
+    dados = _novo_resultado(concessionaria)
+
     try:
-        with pdfplumber.open(arquivo) as pdf:
-            texto = ""
-            for page in pdf.pages:
-                texto += page.extract_text() + "\n"
-            
-            dados["texto_completo"] = texto
-            
-            # Divide o texto em linhas para analisar item a item
-            linhas = texto.split('\n')
-
-            for linha in linhas:
-                linha_upper = linha.upper()
-
-                # --- 1. CAPTURA DE CONSUMO (TUSD + TE + ENERGIA) ---
-                # Padrão: Descrição ... kWh ... Qtd ... Tarif ... Valor
-                if ("ENERGIA ELETR" in linha_upper or "CONSUMO" in linha_upper or "TUSD" in linha_upper or "TE " in linha_upper) and "KWH" in linha_upper and "INJETADA" not in linha_upper and "COMPENSADA" not in linha_upper:
-                    
-                    # Regex para pegar: Quantidade (coluna variável) e Valor Final (última coluna monetária)
-                    # Procura numeros no formato XX,XX
-                    numeros = re.findall(r'\d+[\.,]\d+', linha)
-                    
-                    if len(numeros) >= 2:
-                        # Geralmente: Qtd é um dos primeiros, Valor é o último
-                        qtd = converter_valor_br(numeros[0]) # Assumindo 1º número como Qtd
-                        valor = converter_valor_br(numeros[-1]) # Assumindo último como Valor R$
-                        
-                        # Filtro de segurança para não somar tarifas (que são pequenas, tipo 0,95) como consumo
-                        if qtd > 10: 
-                            dados["consumo_kwh"] = max(dados["consumo_kwh"], qtd) # Pega o maior valor de consumo achado (geralmente o total)
-                            dados["valor_consumo_total"] += valor
-
-                # --- 2. CAPTURA DE ENERGIA INJETADA (GD) ---
-                if ("INJETADA" in linha_upper or "COMPENSADA" in linha_upper or "GD I" in linha_upper) and "KWH" in linha_upper:
-                    numeros = re.findall(r'\d+[\.,]\d+', linha)
-                    if len(numeros) >= 2:
-                        qtd = converter_valor_br(numeros[0])
-                        valor = converter_valor_br(numeros[-1])
-                        
-                        dados["injetado_kwh"] += qtd
-                        dados["valor_credito_total"] += valor
-
-                # --- 3. CAPTURA DE ILUMINAÇÃO PÚBLICA (CIP/COSIP) ---
-                if ("ILUM" in linha_upper or "CIP" in linha_upper or "COSIP" in linha_upper) and ("CONTRIB" in linha_upper or "MUNIC" in linha_upper):
-                    numeros = re.findall(r'\d+[\.,]\d+', linha)
-                    if numeros:
-                        dados["cip_cosip"] = converter_valor_br(numeros[-1])
-
-                # --- 4. DATA DE REFERÊNCIA ---
-                if not dados["mes_referencia"]:
-                    match_data = re.search(r'\b(JAN|FEV|MAR|ABR|MAI|JUN|JUL|AGO|SET|OUT|NOV|DEZ)[/ ]?20\d{2}\b', linha_upper)
-                    if match_data:
-                        meses = {"JAN": 1, "FEV": 2, "MAR": 3, "ABR": 4, "MAI": 5, "JUN": 6, "JUL": 7, "AGO": 8, "SET": 9, "OUT": 10, "NOV": 11, "DEZ": 12}
-                        mes_str = match_data.group(0)[:3]
-                        ano_str = match_data.group(0)[-4:]
-                        try:
-                            dados["mes_referencia"] = datetime(int(ano_str), meses[mes_str], 1).date()
-                        except: pass
-
-            # --- CÁLCULOS FINAIS ---
-            # Calcula a tarifa média real (R$ Total / kWh Total)
-            # Isso inclui ICMS, PIS, COFINS automaticamente, pois pega o valor final da linha.
-            if dados["consumo_kwh"] > 0:
-                dados["tarifa_consumo_calc"] = round(dados["valor_consumo_total"] / dados["consumo_kwh"], 4)
-            
-            # A tarifa de crédito pode ser diferente (se não houver isenção total de TUSD)
-            if dados["injetado_kwh"] > 0:
-                dados["tarifa_credito_calc"] = round(dados["valor_credito_total"] / dados["injetado_kwh"], 4)
-
-            return dados
+        fonte = _fonte(arquivo)
+        try:
+            _varrer(fonte, dados, extrator, manter_texto, parar_cedo)
+        except Exception as e:
+            if extrator != "auto": raise
+            metricas.erro("pdf:pypdf", e)
+            dados = _novo_resultado(concessionaria)  # pypdf não conseguiu abrir: tenta o pdfplumber
+            _varrer(fonte, dados, "pdfplumber", manter_texto, parar_cedo)
+
+        if extrator == "auto" and dados["extrator"] != "pdfplumber" and not campos_obrigatorios_encontrados(dados):
+            metricas.contar("pdf_releitura", motivo="campos_faltando")
+            dados = _novo_resultado(concessionaria)
+            _varrer(fonte, dados, "pdfplumber", manter_texto, parar_cedo)
+
+        # --- CÁLCULOS FINAIS ---
+        # Calcula a tarifa média real (R$ Total / kWh Total)
+        # Isso inclui ICMS, PIS, COFINS automaticamente, pois pega o valor final da linha.
+        if dados["consumo_kwh"] > 0:
+            dados["tarifa_consumo_calc"] = round(dados["valor_consumo_total"] / dados["consumo_kwh"], 4)
+        
+        # A tarifa de crédito pode ser diferente (se não houver isenção total de TUSD)
+        if dados["injetado_kwh"] > 0:
+            dados["tarifa_credito_calc"] = round(dados["valor_credito_total"] / dados["injetado_kwh"], 4)
+
+        return dados
 
     except Exception as e:
-        print(f"Erro ao processar PDF: {e}")
+        metricas.erro("pdf:leitura", e)  # a fatura segue com os campos zerados
         return dados
+
+# --- DATAS DE LEITURA E TEXTO COMPACTO (entrada do modelo de IA) ---
+RE_DATA = re.compile(r'\b(\d{2})/(\d{2})/(\d{4}|\d{2})\b')
+
+def extrair_datas_leitura(texto):
+    """
+    Leituras anterior/atual a partir do texto da fatura, sem IA.
+    Retorna {"inicio": "DD/MM", "fim": "DD/MM", "dias": "N"} ou None se não achar duas datas plausíveis.
+    """
+    linhas = texto.splitlines()
+    for i, linha in enumerate(linhas):
+        u = linha.upper()
+        if "LEITURA" not in u: continue
+        # Cabeçalho numa linha e datas na seguinte é comum; "próxima leitura" não interessa
+        trecho = u + " " + (linhas[i + 1].upper() if i + 1 < len(linhas) else "")
+        corte = min((trecho.find(p) for p in ("PROX", "PRÓX") if p in trecho), default=-1)
+        if corte >= 0: trecho = trecho[:corte]
+        datas = []
+        for d, m, a in RE_DATA.findall(trecho):
+            try:
+                data = datetime(int(a) + (2000 if len(a) == 2 else 0), int(m), int(d)).date()
+            except ValueError:
+                continue
+            if data not in datas: datas.append(data)
+        if len(datas) < 2: continue
+        inicio, fim = sorted(datas[:2])
+        dias = (fim - inicio).days
+        if not 15 <= dias <= 70: continue
+        return {"inicio": inicio.strftime("%d/%m"), "fim": fim.strftime("%d/%m"), "dias": str(dias)}
+    return None
+
+def texto_compacto(texto, limite=12000):
+    """Texto da fatura sem espaços repetidos, linhas vazias ou duplicadas, cortado em `limite` caracteres."""
+    vistas, linhas, total = set(), [], 0
+    for linha in texto.splitlines():
+        linha = re.sub(r'\s+', ' ', linha).strip()
+        if not linha or linha in vistas: continue
+        vistas.add(linha)
+        if total + len(linha) > limite: break
+        linhas.append(linha)
+        total += len(linha) + 1
+    return "\n".join(linhas)
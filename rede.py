@@ -0,0 +1,334 @@
+import os
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from concurrent.futures import TimeoutError as FuturesTimeout
+from contextlib import contextmanager
+
+import metricas
+
+# Estado compartilhado pelo processo inteiro: o módulo é importado uma vez,
+# então sobrevive aos reruns do Streamlit e é visto por todas as sessões/threads.
+_LOCK = threading.Lock()
+_SESSOES = {}
+_LIMITADORES = {}
+
+def sessao(fornecedor, tamanho_pool=10):
+    """Session HTTP (keep-alive) única por fornecedor, reutilizada entre chamadas e threads."""
+    with _LOCK:
+        if fornecedor not in _SESSOES:
+            import requests  # só na primeira chamada de rede (não pesa na subida do app)
+            from requests.adapters import HTTPAdapter
+            s = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=tamanho_pool)
+            s.mount("https://", adapter)
+            s.mount("http://", adapter)
+            _SESSOES[fornecedor] = s
+        return _SESSOES[fornecedor]
+
+class LimitadorTaxa:
+    """Espaça as chamadas para no máximo `por_segundo` requisições/s (seguro entre threads)."""
+
+    def __init__(self, por_segundo):
+        self.intervalo = 1.0 / por_segundo
+        self._proxima = 0.0
+        self._lock = threading.Lock()
+
+    def aguardar(self):
+        with self._lock:
+            agora = time.monotonic()
+            espera = self._proxima - agora
+            self._proxima = max(agora, self._proxima) + self.intervalo
+        if espera > 0: time.sleep(espera)
+
+def limitador(fornecedor, por_segundo):
+    """Limitador de taxa único por fornecedor."""
+    with _LOCK:
+        if fornecedor not in _LIMITADORES:
+            _LIMITADORES[fornecedor] = LimitadorTaxa(por_segundo)
+        return _LIMITADORES[fornecedor]
+
+class GerenciadorToken:
+    """
+    Token de sessão compartilhado pelo processo: um login serve todas as sessões/threads.
+    - Reaproveita o token até o TTL vencer.
+    - Logins concorrentes são serializados (só uma thread faz o login; as outras esperam e reaproveitam).
+    - Após uma falha de login, espera `espera_falha` segundos antes de tentar de novo (evita bloqueio da conta).
+    """
+
+    def __init__(self, login, ttl, espera_falha=30):
+        self.login = login
+        self.ttl = ttl
+        self.espera_falha = espera_falha
+        self._token = None
+        self._expira_em = 0.0
+        self._bloqueado_ate = 0.0
+        self._lock = threading.Lock()
+
+    def obter(self):
+        token, expira_em = self._token, self._expira_em
+        if token and time.monotonic() < expira_em: return token
+        with self._lock:
+            agora = time.monotonic()
+            if self._token and agora < self._expira_em: return self._token  # outra thread já logou
+            if agora < self._bloqueado_ate: return None
+            self._token = self.login()
+            if self._token:
+                self._expira_em = time.monotonic() + self.ttl
+            else:
+                self._bloqueado_ate = time.monotonic() + self.espera_falha
+            return self._token
+
+    def invalidar(self, token):
+        """Descarta o token se ainda for o atual (sessão expirada do lado do servidor)."""
+        with self._lock:
+            if self._token == token:
+                self._token = None
+                self._expira_em = 0.0
+
+_TOKENS = {}
+
+def gerenciador_token(fornecedor, login, ttl):
+    """Gerenciador de token único por fornecedor."""
+    with _LOCK:
+        if fornecedor not in _TOKENS:
+            _TOKENS[fornecedor] = GerenciadorToken(login, ttl)
+        return _TOKENS[fornecedor]
+
+# --- CHAMADAS RESILIENTES ---
+# requisitar() é a porta única das APIs dos fornecedores:
+# - Prazo: cada chamada usa no máximo o que resta do prazo da auditoria (prazo(segundos) em volta da busca);
+#   o timeout de cada requisição é o menor entre o padrão dela e o que sobrou.
+# - Retentativas com jitter, separando limite de taxa (espera longa, fornecedor está de pé) de falha
+#   transitória (conexão, timeout, 5xx: espera curta e conta para o disjuntor).
+# - Disjuntor por fornecedor: depois de LIMIAR_DISJUNTOR falhas seguidas, falha na hora por PAUSA_DISJUNTOR
+#   segundos (em vez de cada auditoria esperar os timeouts); depois deixa uma chamada de teste passar.
+# - Hedge (EON_HEDGE=1, só para leituras marcadas): se a resposta passar do p95 recente do endpoint,
+#   dispara uma cópia e fica com a que chegar primeiro.
+PRAZO_PADRAO = float(os.environ.get("EON_PRAZO_AUDITORIA", "60"))   # segundos por busca de geração
+HEDGE_ATIVO = os.environ.get("EON_HEDGE", "") not in ("", "0")
+HEDGE_PERCENTIL = 0.95
+HEDGE_AMOSTRAS_MINIMAS = 20
+LIMIAR_DISJUNTOR = 5
+PAUSA_DISJUNTOR = 30
+ESPERA_TRANSITORIA = (0.5, 8.0)   # base e teto do backoff exponencial (s)
+
+class PrazoEsgotado(TimeoutError):
+    """O prazo da auditoria acabou antes (ou durante) a chamada."""
+
+class CircuitoAberto(RuntimeError):
+    """O fornecedor está fora (disjuntor aberto): a chamada nem sai."""
+
+class FalhaTransitoria(RuntimeError):
+    """Resposta 5xx que persistiu depois das retentativas."""
+
+_PRAZO = threading.local()
+
+@contextmanager
+def prazo(segundos=None):
+    """Prazo total para as chamadas feitas dentro do bloco (nesta thread). Prazo externo menor prevalece."""
+    anterior = getattr(_PRAZO, "limite", None)
+    limite = time.monotonic() + (PRAZO_PADRAO if segundos is None else segundos)
+    _PRAZO.limite = limite if anterior is None else min(anterior, limite)
+    try:
+        yield
+    finally:
+        _PRAZO.limite = anterior
+
+def restante():
+    """Segundos que sobram do prazo desta thread (None = sem prazo)."""
+    limite = getattr(_PRAZO, "limite", None)
+    return None if limite is None else limite - time.monotonic()
+
+def levar_prazo(funcao):
+    """Envolve `funcao` para rodar em outra thread (pool) com o prazo da thread atual."""
+    limite = getattr(_PRAZO, "limite", None)
+    def com_prazo(*args, **kwargs):
+        anterior = getattr(_PRAZO, "limite", None)
+        _PRAZO.limite = limite
+        try:
+            return funcao(*args, **kwargs)
+        finally:
+            _PRAZO.limite = anterior
+    return com_prazo
+
+class Disjuntor:
+    """Fechado -> (LIMIAR falhas seguidas) -> aberto por `pausa` s -> meio-aberto (1 chamada de teste)."""
+
+    def __init__(self, limiar=LIMIAR_DISJUNTOR, pausa=PAUSA_DISJUNTOR):
+        self.limiar = limiar
+        self.pausa = pausa
+        self.falhas = 0
+        self.aberto_ate = 0.0
+        self._testando = False
+        self._lock = threading.Lock()
+
+    @property
+    def estado(self):
+        if self.falhas < self.limiar: return "fechado"
+        return "aberto" if time.monotonic() < self.aberto_ate else "meio_aberto"
+
+    def permitir(self):
+        with self._lock:
+            estado = self.estado
+            if estado == "fechado": return True
+            if estado == "aberto" or self._testando: return False
+            self._testando = True  # meio-aberto: só esta chamada testa o fornecedor
+            return True
+
+    def liberar(self):
+        """A chamada de teste desistiu sem resposta (ex: prazo): outra pode testar."""
+        with self._lock:
+            self._testando = False
+
+    def sucesso(self):
+        with self._lock:
+            self.falhas, self._testando = 0, False
+
+    def falha(self):
+        with self._lock:
+            self.falhas += 1
+            self._testando = False
+            if self.falhas >= self.limiar: self.aberto_ate = time.monotonic() + self.pausa
+            return self.falhas == self.limiar  # True quando acabou de abrir
+
+_DISJUNTORES = {}
+_LATENCIAS = {}   # (fornecedor, endpoint) -> deque dos tempos das respostas boas
+_HEDGE = {"pool": None}
+
+def disjuntor(fornecedor):
+    with _LOCK:
+        if fornecedor not in _DISJUNTORES: _DISJUNTORES[fornecedor] = Disjuntor()
+        return _DISJUNTORES[fornecedor]
+
+def disjuntores():
+    """{fornecedor: estado} para o painel."""
+    with _LOCK:
+        return {f: d.estado for f, d in _DISJUNTORES.items()}
+
+def _registrar_latencia(chave, segundos):
+    with _LOCK:
+        if chave not in _LATENCIAS: _LATENCIAS[chave] = deque(maxlen=200)
+        _LATENCIAS[chave].append(segundos)
+
+def _atraso_hedge(chave):
+    """p95 recente do endpoint (None enquanto houver poucas amostras)."""
+    with _LOCK:
+        amostras = sorted(_LATENCIAS.get(chave, ()))
+    if len(amostras) < HEDGE_AMOSTRAS_MINIMAS: return None
+    return amostras[min(len(amostras) - 1, int(HEDGE_PERCENTIL * len(amostras)))]
+
+def _com_hedge(chave, enviar, boa):
+    """
+    enviar() e, se passar do p95 recente, uma cópia em paralelo; devolve a primeira resposta boa (boa(r) True).
+    Se nenhuma for boa, devolve a última resposta recebida (5xx/limite: quem chama repete) ou levanta a última exceção.
+    """
+    atraso = _atraso_hedge(chave)
+    if atraso is None: return enviar()
+    with _LOCK:
+        if _HEDGE["pool"] is None: _HEDGE["pool"] = ThreadPoolExecutor(max_workers=16, thread_name_prefix="hedge")
+        pool = _HEDGE["pool"]
+    enviar = levar_prazo(enviar)
+    primeira = pool.submit(enviar)
+    try:
+        return primeira.result(timeout=atraso)
+    except FuturesTimeout:
+        pass
+    metricas.contar("hedge", fornecedor=chave[0], endpoint=chave[1])
+    pendentes = {primeira, pool.submit(enviar)}
+    ruim, erro = None, None
+    while pendentes:
+        prontas, pendentes = wait(pendentes, return_when=FIRST_COMPLETED)
+        for f in prontas:
+            if f.exception() is not None:
+                erro = f.exception()
+            elif boa(f.result()):
+                return f.result()  # a outra termina sozinha e é descartada
+            else:
+                ruim = f.result()  # 5xx/limite rápido: espera a outra antes de desistir
+    if ruim is not None: return ruim
+    raise erro
+
+def _espera(tentativa, limite_taxa, esperas_limite, resposta=None):
+    if limite_taxa:
+        depois = getattr(resposta, "headers", {}).get("Retry-After") if resposta is not None else None
+        base = float(depois) if depois and str(depois).isdigit() else esperas_limite[min(tentativa, len(esperas_limite) - 1)]
+        return base * random.uniform(0.8, 1.2)
+    base, teto = ESPERA_TRANSITORIA
+    return random.uniform(0, min(teto, base * 2 ** tentativa))  # "full jitter"
+
+def requisitar(fornecedor, metodo, url, endpoint=None, timeout=(5, 15), tentativas=3, esperas_limite=(2, 5, 10),
+               e_limite=None, preparar=None, limitador=None, hedge=False, **kwargs):
+    """
+    Requisição HTTP resiliente (ver o bloco acima). Retorna a Response da primeira resposta boa.
+    - e_limite(resposta) -> True se a resposta (200) for o "limite de taxa" do fornecedor (ex: failCode 407).
+    - preparar() -> kwargs recalculados a cada tentativa (ex: assinatura com o header Date atual).
+    - limitador: LimitadorTaxa aguardado antes de cada envio (inclusive a cópia do hedge).
+    Levanta CircuitoAberto, PrazoEsgotado ou a última falha depois das retentativas.
+    Limite de taxa que persiste devolve a última resposta (quem chama decide o que fazer com ela).
+    """
+    import requests
+    endpoint = endpoint or url.rsplit("/", 1)[-1]
+    chave = (fornecedor, endpoint)
+    guarda = disjuntor(fornecedor)
+    if not guarda.permitir():
+        metricas.contar("circuito_aberto", fornecedor=fornecedor)
+        raise CircuitoAberto(f"{fornecedor} indisponível (disjuntor aberto)")
+
+    tentativas_limite = len(esperas_limite)
+    transitorias = limites = 0
+    while True:
+        folga = restante()
+        if folga is not None and folga <= 0:
+            guarda.liberar()
+            raise PrazoEsgotado(f"prazo esgotado antes de {fornecedor}:{endpoint}")
+        conexao, leitura = timeout if isinstance(timeout, tuple) else (timeout, timeout)
+        if folga is not None: conexao, leitura = min(conexao, folga), min(leitura, folga)
+
+        def e_limite_taxa(r):
+            return r.status_code == 429 or (e_limite is not None and r.status_code < 300 and e_limite(r))
+
+        def boa(r):  # o mesmo critério do laço abaixo: nem 5xx nem limite de taxa
+            return r.status_code < 500 and not e_limite_taxa(r)
+
+        def enviar():
+            if limitador: limitador.aguardar()
+            extras = preparar() if preparar else {}
+            inicio = time.perf_counter()
+            r = sessao(fornecedor).request(metodo, url, timeout=(conexao, leitura), **kwargs, **extras)
+            if boa(r): _registrar_latencia(chave, time.perf_counter() - inicio)
+            return r
+
+        resposta, falha = None, None
+        try:
+            resposta = _com_hedge(chave, enviar, boa) if hedge and HEDGE_ATIVO else enviar()
+            limite_taxa = e_limite_taxa(resposta)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            falha, limite_taxa = e, False
+        except Exception:
+            guarda.liberar()  # erro de quem chama (ex: preparar): não conta contra o fornecedor
+            raise
+        if resposta is not None and resposta.status_code >= 500: falha = FalhaTransitoria(f"HTTP {resposta.status_code} em {fornecedor}:{endpoint}")
+
+        if falha is None and not limite_taxa:
+            guarda.sucesso()
+            return resposta
+        if limite_taxa:
+            guarda.sucesso()  # respondeu: o fornecedor está de pé
+            limites += 1
+            if limites > tentativas_limite: return resposta
+            motivo = "limite_taxa"
+        else:
+            if guarda.falha(): metricas.erro(f"{fornecedor}:disjuntor", falha, aberto_por_s=PAUSA_DISJUNTOR)
+            transitorias += 1
+            if transitorias >= tentativas or guarda.estado != "fechado": raise falha
+            motivo = "transitorio"
+        espera = _espera((limites if limite_taxa else transitorias) - 1, limite_taxa, esperas_limite, resposta)
+        folga = restante()
+        if folga is not None and espera >= folga:
+            if limite_taxa: return resposta
+            raise PrazoEsgotado(f"prazo esgotado esperando para repetir {fornecedor}:{endpoint}") from falha
+        metricas.contar("retentativas", fornecedor=fornecedor, motivo=motivo)
+        time.sleep(espera)
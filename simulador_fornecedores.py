@@ -0,0 +1,252 @@
+"""
+Simulador local das APIs FusionSolar (Huawei) e SolisCloud, para testar carga e latência
+das buscas de geração sem usar as contas de produção.
+
+Uso:
+    python simulador_fornecedores.py --porta 8765 --estacoes-huawei 2000 --estacoes-solis 1000 \\
+        --latencia 0.15 --jitter 0.10 --limite-huawei 5 --limite-solis 2
+
+E aponte o portal para ele:
+    EON_HUAWEI_URL=http://localhost:8765/thirdData \\
+    EON_SOLIS_URL=http://localhost:8765 EON_SOLIS_KEY_ID=simulador EON_SOLIS_KEY_SECRET=segredo-simulador \\
+    streamlit run portal.py
+
+Endpoints (mesmo formato de resposta das APIs reais, no que o portal consome):
+    FusionSolar  POST /thirdData/login, getStationList, getKpiStationMonth, getKpiStationYear
+                 sessão via header xsrf-token (failCode 305 se expirada), limite por endpoint (failCode 407)
+    SolisCloud   POST /v1/api/userStationList, /v1/api/stationDayEnergyList
+                 assinatura HMAC-SHA1 verificada (Content-MD5, Date, Authorization)
+    GET /__stats mostra as contagens de chamadas/erros.
+"""
+import argparse
+import base64
+import hashlib
+import hmac
+import json
+import math
+import random
+import secrets
+import threading
+import time
+from collections import Counter
+from datetime import date, datetime, timedelta
+from email.utils import parsedate_to_datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+class Frota:
+    """Estações sintéticas. A geração diária é determinística por (estação, dia): não precisa guardar nada."""
+
+    def __init__(self, qtd_huawei, qtd_solis, semente=1):
+        rng = random.Random(semente)
+        self.semente = semente
+        self.huawei = [{"stationCode": f"NE={33000000 + i}", "stationName": f"Usina Huawei {i:05d}", "capacity": round(rng.uniform(3, 75), 2)} for i in range(qtd_huawei)]
+        self.solis = [{"id": str(1298491919449000000 + i), "stationName": f"Usina Solis {i:05d}", "capacity": round(rng.uniform(3, 75), 2)} for i in range(qtd_solis)]
+        self.capacidade = {s["stationCode"]: s["capacity"] for s in self.huawei}
+        self.capacidade.update({s["id"]: s["capacity"] for s in self.solis})
+
+    def kwh_dia(self, estacao, dia):
+        """kWh do dia: potência × horas de sol (sazonal) × fator aleatório do dia."""
+        if estacao not in self.capacidade or dia >= date.today(): return 0.0
+        semente = int(hashlib.md5(f"{self.semente}:{estacao}:{dia.isoformat()}".encode()).hexdigest()[:8], 16)
+        clima = random.Random(semente).uniform(0.35, 1.05)
+        horas_sol = 4.6 + 0.9 * math.cos(2 * math.pi * (dia.timetuple().tm_yday - 15) / 365)  # hemisfério sul
+        return round(self.capacidade[estacao] * horas_sol * clima, 2)
+
+    def kwh_mes(self, estacao, ano, mes):
+        dia = date(ano, mes, 1)
+        total = 0.0
+        while dia.month == mes:
+            total += self.kwh_dia(estacao, dia)
+            dia += timedelta(days=1)
+        return round(total, 2)
+
+class Limitador:
+    """Janela de 1 s por chave: acima de `por_segundo` chamadas, recusa."""
+
+    def __init__(self, por_segundo):
+        self.por_segundo = por_segundo
+        self._janelas = {}
+        self._lock = threading.Lock()
+
+    def permitir(self, chave):
+        if not self.por_segundo: return True
+        agora = int(time.monotonic())
+        with self._lock:
+            segundo, qtd = self._janelas.get(chave, (agora, 0))
+            if segundo != agora: segundo, qtd = agora, 0
+            self._janelas[chave] = (segundo, qtd + 1)
+            return qtd < self.por_segundo
+
+def _ms(dia):
+    return int(datetime(dia.year, dia.month, dia.day).timestamp() * 1000)
+
+class Simulador:
+    def __init__(self, frota, latencia=0.0, jitter=0.0, limite_huawei=0, limite_solis=0,
+                 ttl_sessao=1800, solis_key_id="simulador", solis_key_secret="segredo-simulador", taxa_erro=0.0):
+        self.frota = frota
+        self.latencia, self.jitter, self.taxa_erro = latencia, jitter, taxa_erro
+        self.limite_huawei, self.limite_solis = Limitador(limite_huawei), Limitador(limite_solis)
+        self.ttl_sessao = ttl_sessao
+        self.solis_key_id, self.solis_key_secret = solis_key_id, solis_key_secret
+        self.sessoes = {}
+        self.stats = Counter()
+        self._lock = threading.Lock()
+
+    # --- HUAWEI ---
+    def huawei(self, endpoint, corpo, headers):
+        if endpoint == "login":
+            if not self.limite_huawei.permitir("login"):
+                return {"success": False, "failCode": 407, "message": "ACCESS_FREQUENCY_IS_TOO_HIGH"}, {}
+            token = secrets.token_hex(16)
+            with self._lock: self.sessoes[token] = time.monotonic() + self.ttl_sessao
+            return {"success": True, "failCode": 0, "data": None}, {"xsrf-token": token}
+
+        token = headers.get("xsrf-token")
+        with self._lock: validade = self.sessoes.get(token, 0)
+        if validade < time.monotonic():
+            return {"success": False, "failCode": 305, "message": "USER_MUST_RELOGIN"}, {}
+        if not self.limite_huawei.permitir(endpoint):
+            return {"success": False, "failCode": 407, "message": "ACCESS_FREQUENCY_IS_TOO_HIGH"}, {}
+
+        if endpoint == "getStationList":
+            return self._pagina(self.frota.huawei, corpo, lambda s: {"stationCode": s["stationCode"], "stationName": s["stationName"], "capacity": s["capacity"]}, formato="huawei"), {}
+
+        codigos = [c for c in str(corpo.get("stationCodes", "")).split(",") if c][:100]
+        ref = datetime.fromtimestamp(corpo.get("collectTime", 0) / 1000).date()
+        itens = []
+        if endpoint == "getKpiStationMonth":
+            dia = ref.replace(day=1)
+            while dia.month == ref.month and dia < date.today():
+                for c in codigos:
+                    kwh = self.frota.kwh_dia(c, dia)
+                    itens.append({"collectTime": _ms(dia), "stationCode": c, "dataItemMap": {"inverter_power": kwh, "product_power": kwh, "PVYield": kwh}})
+                dia += timedelta(days=1)
+        elif endpoint == "getKpiStationYear":
+            for mes in range(1, 13):
+                if date(ref.year, mes, 1) > date.today(): break
+                for c in codigos:
+                    kwh = self.frota.kwh_mes(c, ref.year, mes)
+                    itens.append({"collectTime": _ms(date(ref.year, mes, 1)), "stationCode": c, "dataItemMap": {"inverter_power": kwh, "product_power": kwh}})
+        else:
+            return {"success": False, "failCode": 404, "message": "endpoint desconhecido"}, {}
+        return {"success": True, "failCode": 0, "data": itens, "params": corpo}, {}
+
+    # --- SOLIS ---
+    def _assinatura_valida(self, recurso, corpo_bruto, headers):
+        md5 = base64.b64encode(hashlib.md5(corpo_bruto).digest()).decode()
+        if headers.get("Content-MD5") != md5: return False
+        try:
+            if abs((datetime.now(parsedate_to_datetime(headers.get("Date")).tzinfo) - parsedate_to_datetime(headers.get("Date"))).total_seconds()) > 900: return False
+        except Exception:
+            return False
+        texto = f"POST\n{md5}\n{headers.get('Content-Type')}\n{headers.get('Date')}\n{recurso}"
+        esperado = base64.b64encode(hmac.new(self.solis_key_secret.encode(), texto.encode(), hashlib.sha1).digest()).decode()
+        return hmac.compare_digest(headers.get("Authorization", ""), f"API {self.solis_key_id}:{esperado}")
+
+    def solis(self, recurso, corpo_bruto, headers):
+        if not self._assinatura_valida(recurso, corpo_bruto, headers):
+            return {"success": False, "code": "Z0001", "msg": "assinatura invalida", "data": None}, {}
+        if not self.limite_solis.permitir(recurso):
+            return {"success": False, "code": "Z0002", "msg": "too many requests", "data": None}, {}
+        corpo = json.loads(corpo_bruto or b"{}")
+
+        if recurso == "/v1/api/userStationList":
+            pagina = self._pagina(self.frota.solis, corpo, lambda s: {"id": s["id"], "stationName": s["stationName"], "capacity": s["capacity"]}, formato="solis")
+            return {"success": True, "code": "0", "msg": "success", "data": pagina}, {}
+        if recurso == "/v1/api/stationDayEnergyList":
+            ano, mes = map(int, corpo.get("time", "1970-01").split("-")[:2])
+            dia, registros = date(ano, mes, 1), []
+            while dia.month == mes and dia < date.today():
+                registros.append({"date": dia.isoformat(), "energy": self.frota.kwh_dia(str(corpo.get("stationId")), dia), "energyStr": "kWh"})
+                dia += timedelta(days=1)
+            return {"success": True, "code": "0", "msg": "success", "data": {"records": registros}}, {}
+        return {"success": False, "code": "404", "msg": "endpoint desconhecido", "data": None}, {}
+
+    # --- COMUM ---
+    def _pagina(self, estacoes, corpo, formatar, formato):
+        no, tamanho = int(corpo.get("pageNo", 1)), min(int(corpo.get("pageSize", 100)), 100)
+        fatia = [formatar(s) for s in estacoes[(no - 1) * tamanho: no * tamanho]]
+        paginas = math.ceil(len(estacoes) / tamanho) if tamanho else 0
+        if formato == "huawei":
+            return {"success": True, "failCode": 0, "data": {"list": fatia, "pageCount": paginas, "pageNo": no, "pageSize": tamanho, "total": len(estacoes)}}
+        return {"page": {"records": fatia, "current": no, "size": tamanho, "pages": paginas, "total": len(estacoes)}}
+
+    def atraso(self):
+        espera = self.latencia + random.uniform(0, self.jitter)
+        if espera > 0: time.sleep(espera)
+
+def criar_servidor(simulador, porta=8765, host="127.0.0.1"):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive, como as APIs reais
+
+        def log_message(self, *args): pass
+
+        def _responder(self, corpo, headers=None, status=200):
+            dados = json.dumps(corpo).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(dados)))
+            for k, v in (headers or {}).items(): self.send_header(k, v)
+            self.end_headers()
+            self.wfile.write(dados)
+
+        def do_GET(self):
+            if self.path == "/__stats": return self._responder(dict(simulador.stats))
+            self._responder({"erro": "não encontrado"}, status=404)
+
+        def do_POST(self):
+            corpo_bruto = self.rfile.read(int(self.headers.get("Content-Length", 0) or 0))
+            simulador.atraso()
+            if simulador.taxa_erro and random.random() < simulador.taxa_erro:
+                simulador.stats["erro_500"] += 1
+                return self._responder({"erro": "falha simulada"}, status=500)
+
+            if self.path.startswith("/thirdData/"):
+                endpoint = self.path[len("/thirdData/"):]
+                try: corpo = json.loads(corpo_bruto or b"{}")
+                except ValueError: corpo = {}
+                resposta, extra = simulador.huawei(endpoint, corpo, self.headers)
+            elif self.path.startswith("/v1/api/"):
+                endpoint = self.path
+                resposta, extra = simulador.solis(self.path, corpo_bruto, self.headers)
+            else:
+                return self._responder({"erro": "não encontrado"}, status=404)
+
+            simulador.stats[endpoint] += 1
+            if not resposta.get("success"):
+                simulador.stats[f"{endpoint}:{resposta.get('failCode') or resposta.get('code')}"] += 1
+            self._responder(resposta, extra)
+
+    return ThreadingHTTPServer((host, porta), Handler)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--porta", type=int, default=8765)
+    parser.add_argument("--estacoes-huawei", type=int, default=500)
+    parser.add_argument("--estacoes-solis", type=int, default=500)
+    parser.add_argument("--semente", type=int, default=1)
+    parser.add_argument("--latencia", type=float, default=0.1, help="latência base por requisição (s)")
+    parser.add_argument("--jitter", type=float, default=0.05, help="variação aleatória somada à latência (s)")
+    parser.add_argument("--limite-huawei", type=int, default=5, help="chamadas/s por endpoint antes do failCode 407 (0 = sem limite)")
+    parser.add_argument("--limite-solis", type=int, default=2, help="chamadas/s por endpoint (0 = sem limite)")
+    parser.add_argument("--ttl-sessao", type=int, default=1800, help="validade do xsrf-token (s)")
+    parser.add_argument("--taxa-erro", type=float, default=0.0, help="fração de respostas HTTP 500 simuladas")
+    parser.add_argument("--solis-key-id", default="simulador")
+    parser.add_argument("--solis-key-secret", default="segredo-simulador")
+    args = parser.parse_args()
+
+    simulador = Simulador(
+        Frota(args.estacoes_huawei, args.estacoes_solis, args.semente),
+        latencia=args.latencia, jitter=args.jitter, limite_huawei=args.limite_huawei, limite_solis=args.limite_solis,
+        ttl_sessao=args.ttl_sessao, solis_key_id=args.solis_key_id, solis_key_secret=args.solis_key_secret, taxa_erro=args.taxa_erro,
+    )
+    servidor = criar_servidor(simulador, args.porta, args.host)
+    print(f"Simulador em http://{args.host}:{args.porta} ({args.estacoes_huawei} Huawei, {args.estacoes_solis} Solis)")
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+import hashlib
+import os
+import tempfile
+import threading
+import time
+
+# Spool de PDFs endereçado por conteúdo: um arquivo por SHA-256, gravado uma vez e reaproveitado
+# por todos os reruns e sessões. Limitado por idade e tamanho total (os usados há mais tempo saem primeiro).
+PASTA = os.environ.get("EON_SPOOL_PDF", os.path.join(tempfile.gettempdir(), "eon_spool_pdf"))
+MAX_BYTES = int(float(os.environ.get("EON_SPOOL_PDF_MB", "500")) * 1024 * 1024)
+MAX_IDADE = 24 * 3600        # segundos sem uso até o arquivo ser removido
+INTERVALO_LIMPEZA = 5 * 60   # limpeza no máximo a cada 5 min por processo
+
+_LOCK = threading.Lock()
+_ultima_limpeza = 0.0
+
+def caminho_de(chave):
+    return os.path.join(PASTA, f"{chave}.pdf")
+
+def gravar(conteudo, chave=None):
+    """Caminho do PDF no spool, gravando só se ainda não existir. `chave` = SHA-256 já calculado (opcional)."""
+    chave = chave or hashlib.sha256(conteudo).hexdigest()
+    caminho = caminho_de(chave)
+    if os.path.exists(caminho):
+        try: os.utime(caminho)  # marca o uso (a limpeza remove os usados há mais tempo)
+        except OSError: pass
+    else:
+        os.makedirs(PASTA, exist_ok=True)
+        # Grava num temporário e renomeia: outra sessão nunca vê o arquivo pela metade
+        fd, temporario = tempfile.mkstemp(dir=PASTA, suffix=".parcial")
+        with os.fdopen(fd, "wb") as f:
+            f.write(conteudo)
+        os.replace(temporario, caminho)
+    limpar()
+    return caminho
+
+def limpar(forcar=False, agora=None):
+    """Remove arquivos sem uso há mais de MAX_IDADE e, se ainda passar de MAX_BYTES, os usados há mais tempo."""
+    global _ultima_limpeza
+    agora = agora or time.time()
+    with _LOCK:
+        if not forcar and agora - _ultima_limpeza < INTERVALO_LIMPEZA: return
+        _ultima_limpeza = agora
+    try:
+        entradas = []
+        for entrada in os.scandir(PASTA):
+            if not entrada.is_file(): continue
+            info = entrada.stat()
+            entradas.append((info.st_mtime, info.st_size, entrada.path))
+    except FileNotFoundError:
+        return
+    entradas.sort()
+    total = sum(tamanho for _, tamanho, _ in entradas)
+    for mtime, tamanho, caminho in entradas:
+        if agora - mtime <= MAX_IDADE and total <= MAX_BYTES: break
+        if caminho.endswith(".parcial") and agora - mtime < 60: continue  # gravação em andamento
+        try:
+            os.remove(caminho)
+            total -= tamanho
+        except OSError:
+            pass
@@ -0,0 +1,60 @@
+import threading
+import types
+
+import arquivos_gemini
+import auditor_ia
+
+class NotFound(Exception):
+    code = 404
+
+class GenaiFalso:
+    """Files API + modelo em memória; apagados = uploads que o servidor 'perdeu'."""
+
+    def __init__(self):
+        self.uploads, self.apagados, self.listagens = 0, set(), 0
+
+    def list_files(self):
+        self.listagens += 1
+        return []
+
+    def upload_file(self, origem, mime_type=None, display_name=None):
+        self.uploads += 1
+        return types.SimpleNamespace(name=f"files/{self.uploads}", display_name=display_name, state=None, expiration_time=None)
+
+    def delete_file(self, nome):
+        self.apagados.add(nome)
+
+    def GenerativeModel(self, modelo):
+        genai = self
+
+        class Modelo:
+            def generate_content(self, partes, **kwargs):
+                if getattr(partes[0], "name", None) in genai.apagados: raise NotFound("File not found")
+                return types.SimpleNamespace(text='{"inicio": "01/05", "fim": "31/05", "dias": "30"}', usage_metadata=None)
+        return Modelo()
+
+def _preparar(monkeypatch):
+    falso = GenaiFalso()
+    monkeypatch.setattr(arquivos_gemini, "genai", lambda: falso)
+    monkeypatch.setattr(arquivos_gemini, "CACHE", arquivos_gemini.CacheArquivos())
+    monkeypatch.setattr(auditor_ia.spool_pdf, "gravar", lambda conteudo, chave: None)
+    return falso
+
+def test_upload_uma_vez_por_pdf_e_locks_liberados(monkeypatch):
+    falso = _preparar(monkeypatch)
+    cache = arquivos_gemini.CACHE
+    threads = [threading.Thread(target=cache.obter, args=(b"%PDF fatura",)) for _ in range(8)]
+    for t in threads: t.start()
+    for t in threads: t.join()
+    assert falso.uploads == 1 and falso.listagens == 1
+    assert cache._locks == {}
+
+def test_upload_recusado_pelo_servidor_e_reenviado(monkeypatch):
+    falso = _preparar(monkeypatch)
+    pdf = b"%PDF fatura escaneada"
+    local = {"datas": None, "texto": ""}
+    primeiro = arquivos_gemini.CACHE.obter(pdf)
+    falso.apagados.add(primeiro.name)  # expirou/apagado no servidor antes do previsto
+    datas = auditor_ia._com_fonte("pdf", local, pdf, lambda fonte: auditor_ia.extrair_datas(fonte, "modelo"))
+    assert datas["inicio"] == "01/05"
+    assert falso.uploads == 2
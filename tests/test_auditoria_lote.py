@@ -0,0 +1,105 @@
+import io
+import os
+import zipfile
+from datetime import date
+
+import pytest
+
+import auditoria_lote
+import processador_pdf
+
+pytest.importorskip("pandas")
+
+DB = {
+    "JOAO DA SILVA": {"id": 1, "marca": "Huawei", "nome": "Usina Joao"},
+    "JOAO DA SILVA FILHO": {"id": 2, "marca": "Huawei", "nome": "Usina Joao Filho"},
+    "ANA": {"id": 3, "marca": "Solis", "nome": "Usina Ana"},
+    "MARIANA SOUZA": {"id": 4, "marca": "Solis", "nome": "Usina Mariana"},
+}
+NOMES = sorted(DB)
+
+# --- ENTRADA ---
+def _zip(arquivos):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as zf:
+        for nome, conteudo in arquivos.items(): zf.writestr(nome, conteudo)
+    return buffer.getvalue()
+
+def test_listar_pdfs_de_zip_ignora_lixo_do_macos(tmp_path):
+    conteudo = _zip({"lote/a.pdf": b"A", "lote/B.PDF": b"B", "__MACOSX/lote/._a.pdf": b"x", "leia.txt": b"t", "vazia/": b""})
+    assert sorted(auditoria_lote.listar_pdfs(conteudo)) == [("B.PDF", b"B"), ("a.pdf", b"A")]
+    caminho = tmp_path / "lote.zip"
+    caminho.write_bytes(conteudo)
+    assert sorted(auditoria_lote.listar_pdfs(str(caminho))) == [("B.PDF", b"B"), ("a.pdf", b"A")]
+
+def test_listar_pdfs_de_pasta_devolve_caminhos(tmp_path):
+    (tmp_path / "sub").mkdir()
+    for nome in ("b.pdf", "a.pdf", "nota.txt", "sub/c.pdf"): (tmp_path / nome).write_bytes(b"%PDF")
+    assert sorted(auditoria_lote.listar_pdfs(str(tmp_path))) == [
+        ("a.pdf", str(tmp_path / "a.pdf")), ("b.pdf", str(tmp_path / "b.pdf")), ("c.pdf", os.path.join(str(tmp_path / "sub"), "c.pdf")),
+    ]
+
+# --- CLIENTE ---
+def test_cliente_pelo_nome_do_arquivo():
+    assert auditoria_lote.identificar_cliente("joao_da_silva.pdf", "MARIANA SOUZA", NOMES) == ("JOAO DA SILVA", ["JOAO DA SILVA"])
+
+@pytest.mark.parametrize("texto, esperado", [
+    ("Titular: Mariana Souza", "MARIANA SOUZA"),                 # "ANA" dentro de "MARIANA" não conta
+    ("Cliente BANANA LTDA", None),
+    ("Titular: Ana", "ANA"),
+    ("Titular: João da Silva Filho", "JOAO DA SILVA FILHO"),     # o nome mais longo ganha
+    ("Titular: JOAO DA SILVAFILHO", None),
+])
+def test_cliente_pelo_texto_casa_palavra_inteira(texto, esperado):
+    assert auditoria_lote.identificar_cliente("fatura.pdf", texto, NOMES)[0] == esperado
+
+def test_cliente_ambiguo_nao_escolhe_o_primeiro():
+    cliente, citados = auditoria_lote.identificar_cliente("fatura.pdf", "Titular ANA / Procurador JOAO DA SILVA", NOMES)
+    assert cliente is None
+    assert sorted(citados) == ["ANA", "JOAO DA SILVA"]
+
+# --- LOTE ---
+def _extrator_falso(arquivo, manter_texto=False, **_):
+    """Fatura de mentira: o "PDF" é o próprio texto; CRASH derruba o worker, ERRO levanta exceção."""
+    texto = arquivo.decode()
+    if texto.startswith("CRASH"): os._exit(1)
+    if texto.startswith("ERRO"): raise ValueError("tabela corrompida")
+    return {"mes_referencia": date(2024, 5, 1), "injetado_kwh": 100.0, "tarifa_credito_calc": 0.8, "texto_completo": texto}
+
+@pytest.fixture
+def extrator_falso(monkeypatch):
+    monkeypatch.setattr(processador_pdf, "extrair_dados_fatura", _extrator_falso)  # o pool usa fork: os workers herdam
+    monkeypatch.setattr(auditoria_lote.metricas, "erro", lambda *a, **k: None)
+
+def test_worker_que_morre_nao_derruba_o_lote(extrator_falso):
+    arquivos = [(f"f{i}.pdf", f"Titular ANA {i}".encode()) for i in range(6)]
+    arquivos.insert(3, ("ruim.pdf", b"CRASH"))
+    lidos = {nome: (cliente, erro) for nome, _, cliente, erro, _ in auditoria_lote.ler_faturas(arquivos, DB, max_processos=2)}
+    assert set(lidos) == {nome for nome, _ in arquivos}
+    assert lidos["ruim.pdf"][1].startswith("Falha na leitura")
+    assert all(lidos[f"f{i}.pdf"] == ("ANA", None) for i in range(6))
+
+def test_processar_lote_isola_cada_falha(extrator_falso, tmp_path):
+    arquivos = {
+        "ok.pdf": "Titular Mariana Souza", "zerada.pdf": "Titular Ana", "crash.pdf": "CRASH",
+        "erro.pdf": "ERRO", "ninguem.pdf": "Titular Banana", "dois.pdf": "Ana e Joao da Silva", "sem_api.pdf": "Joao da Silva Filho",
+    }
+    for nome, texto in arquivos.items(): (tmp_path / nome).write_text(texto)
+
+    def buscar_geracao(usina, inicio, fim):
+        assert (inicio, fim) == (date(2024, 5, 1), date(2024, 5, 31))
+        if usina["id"] == 2: raise TimeoutError("fornecedor fora do ar")
+        return (90.0 if usina["id"] == 4 else 0.0), None
+
+    progresso = []
+    df = auditoria_lote.processar_lote(str(tmp_path), DB, buscar_geracao, ao_progredir=lambda n, total, _: progresso.append((n, total)), max_processos=2)
+    linhas = df.set_index("arquivo")
+    assert list(linhas["status"][sorted(arquivos)]) == [
+        "erro", "cliente_ambiguo", "erro", "cliente_nao_encontrado", "ok", "erro", "sem_geracao",
+    ]
+    assert linhas.loc["ok.pdf", "alerta"] == "credito_a_mais"
+    assert linhas.loc["ok.pdf", "valor_diferenca"] == pytest.approx(8.0)
+    assert "fornecedor fora do ar" in linhas.loc["sem_api.pdf", "erro"]
+    assert "tabela corrompida" in linhas.loc["erro.pdf", "erro"]
+    assert "ANA" in linhas.loc["dois.pdf", "erro"] and "JOAO DA SILVA" in linhas.loc["dois.pdf", "erro"]
+    assert progresso[-1] == (7, 7)
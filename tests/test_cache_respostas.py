@@ -0,0 +1,35 @@
+from datetime import date
+
+import pytest
+
+import auditor_ia
+import cache_respostas
+
+PDF = b"%PDF-1.4 fatura"
+
+@pytest.fixture
+def chamadas(tmp_path, monkeypatch):
+    monkeypatch.setattr(cache_respostas, "CAMINHO", str(tmp_path / "respostas.sqlite3"))
+    monkeypatch.setattr(cache_respostas, "ATIVO", True)
+    chamadas = []
+
+    def extrair_datas(fonte, modelo, etapas):
+        chamadas.append(fonte)
+        return {"inicio": "05/04", "fim": "06/05", "dias": "31"}
+
+    monkeypatch.setattr(auditor_ia, "extrair_datas", extrair_datas)
+    return chamadas
+
+def _local(extrator="pypdf"):
+    return {"texto": "ENERGIA ELETRICA KWH 500,00", "consumo_kwh": 500.0, "mes_referencia": date(2024, 5, 1),
+            "datas": None, "extrator": extrator}
+
+def test_modo_texto_reaproveita_so_com_a_mesma_leitura(chamadas, monkeypatch):
+    auditor_ia.obter_datas(PDF, _local(), modelo="m")
+    auditor_ia.obter_datas(PDF, _local(), modelo="m")
+    assert len(chamadas) == 1
+    auditor_ia.obter_datas(PDF, _local("pdfplumber"), modelo="m")        # outro extrator, outro texto
+    assert len(chamadas) == 2
+    monkeypatch.setattr(auditor_ia, "VERSAO_LEITURA", "2:regras-novas")    # regras mudaram
+    auditor_ia.obter_datas(PDF, _local(), modelo="m")
+    assert len(chamadas) == 3
@@ -0,0 +1,47 @@
+from datetime import date
+
+import pytest
+
+import armazem_geracao
+import conciliacao_frota
+
+pd = pytest.importorskip("pandas")
+pytest.importorskip("numpy")
+
+DB = {
+    "ANA": {"id": "10", "marca": "Solis", "nome": "Usina Ana"},
+    "BETO": {"id": "20", "marca": "Solis", "nome": "Usina Beto"},
+}
+
+@pytest.fixture(autouse=True)
+def bases(tmp_path, monkeypatch):
+    monkeypatch.setattr(conciliacao_frota, "CAMINHO", str(tmp_path / "frota.sqlite3"))
+    monkeypatch.setattr(armazem_geracao, "CAMINHO", str(tmp_path / "geracao.sqlite3"))
+    monkeypatch.setattr(conciliacao_frota.planilha_clientes, "registrar_auditorias", lambda linhas, origem: 0)
+
+def _lote():
+    """Resultado de processar_lote: BETO falhou na busca de geração (sem crédito nem tarifa)."""
+    linhas = [
+        {"arquivo": "ana.pdf", "cliente": "ANA", "inicio": date(2024, 5, 1), "fim": date(2024, 5, 31),
+         "kwh_creditado": 100.0, "tarifa": 0.8, "status": "ok"},
+        {"arquivo": "beto.pdf", "cliente": "BETO", "inicio": date(2024, 5, 1), "fim": date(2024, 5, 31),
+         "kwh_creditado": None, "tarifa": None, "status": "erro", "erro": "Falha ao buscar geração: timeout"},
+    ]
+    df = pd.DataFrame(linhas, columns=conciliacao_frota.auditoria_lote.COLUNAS)
+    df[["kwh_creditado", "tarifa"]] = df[["kwh_creditado", "tarifa"]].apply(pd.to_numeric)
+    return df
+
+def test_linha_de_erro_do_lote_nao_quebra_o_ciclo():
+    assert conciliacao_frota.registrar_lote(_lote()) == 1
+    resultado = conciliacao_frota.executar_ciclo(DB, lambda usina, inicio, fim: (90.0, None), pasta="")
+    assert resultado["reconciliados"] == 1
+    assert resultado["alterados"] == 1
+    # Segundo ciclo lê de volta o que o primeiro gravou
+    assert conciliacao_frota.executar_ciclo(DB, lambda usina, inicio, fim: (90.0, None), pasta="")["alterados"] == 0
+
+def test_fatura_sem_credito_gravada_antes_fica_de_fora():
+    conciliacao_frota.registrar_fatura("BETO", "2024-04-01", "2024-04-30", 50.0, 0.7)
+    conciliacao_frota.registrar_fatura("BETO", "2024-05-01", "2024-05-31", float("nan"), float("nan"))  # vira NULL no SQLite
+    faturas = conciliacao_frota._ultimas_faturas()
+    assert faturas["BETO"][1:] == ("2024-04-01", "2024-04-30", None, 50.0, 0.7)
+    assert conciliacao_frota._chave_fatura(("BETO", "2024-05-01", "2024-05-31", None, None, None), DB["BETO"]).endswith("|0.000|0.000000")
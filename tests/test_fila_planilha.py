@@ -0,0 +1,48 @@
+import pytest
+
+import fila_planilha
+
+class ErroHttp(Exception):
+    def __init__(self, status):
+        super().__init__(f"HTTP {status}")
+        self.response = type("Resposta", (), {"status_code": status})()
+
+class AbaFalsa:
+    def __init__(self, falhas=()):
+        self.falhas = list(falhas)   # status HTTP das próximas chamadas que falham
+        self.linhas, self.opcoes = [], []
+
+    def append_rows(self, linhas, value_input_option=None):
+        self.opcoes.append(value_input_option)
+        if self.falhas: raise ErroHttp(self.falhas.pop(0))
+        self.linhas += linhas
+
+@pytest.fixture
+def fila(tmp_path, monkeypatch):
+    monkeypatch.setattr(fila_planilha, "CAMINHO", str(tmp_path / "fila.sqlite3"))
+    monkeypatch.setattr(fila_planilha, "ESPERAS_COTA", [0, 0])
+    monkeypatch.setattr(fila_planilha.time, "sleep", lambda s: None)
+    return fila_planilha
+
+def test_descarrega_em_lotes_e_grava_raw(fila, monkeypatch):
+    monkeypatch.setattr(fila, "LOTE_MAXIMO", 2)
+    aba = AbaFalsa()
+    fila.enfileirar("", [["PADARIA", "1300386381676798170", "Solis", "=HYPERLINK(1)"], ["B", "2", "Huawei", "x"], ["C", "3", "Huawei", "y"]])
+    assert fila.descarregar(lambda nome: aba) == 3
+    assert aba.linhas[0][1] == "1300386381676798170"
+    assert set(aba.opcoes) == {"RAW"} and len(aba.opcoes) == 2
+    assert fila.pendentes() == {}
+
+def test_cota_e_instabilidade_repetem_com_espera(fila):
+    aba = AbaFalsa(falhas=[429, 503])
+    fila.enfileirar("Auditorias", [["2024-05-01", "lote", 1.5]])
+    assert fila.descarregar(lambda nome: aba) == 1
+    assert len(aba.opcoes) == 3
+
+def test_recusa_definitiva_conta_tentativa_e_fica_na_fila(fila):
+    aba = AbaFalsa(falhas=[400])
+    fila.enfileirar("Auditorias", [["linha ruim"]])
+    assert fila.descarregar(lambda nome: aba) == 0
+    assert fila.pendentes() == {"Auditorias": 1}
+    assert fila._reservar("Auditorias", 10)[0][1] == '["linha ruim"]'  # reserva liberada: volta no próximo ciclo
+    assert fila._reservar("Auditorias", 10) == []                       # já reservada por este ciclo
@@ -0,0 +1,87 @@
+import threading
+
+from indice_clientes import IndiceClientes
+
+LINHAS = [
+    {"Nome_Conta": "João da Silva", "ID_Inversor": 123, "Marca": "Huawei", "Nome_Inversor": "Usina João", "CPF_CNPJ": "123.456.789-01"},
+    {"Nome_Conta": "Padaria Pão Quente Ltda", "ID_Inversor": "1300386381676798170", "Marca": "Solis", "Nome_Inversor": "Padaria"},
+]
+
+def _indice():
+    indice = IndiceClientes()
+    indice.carregar(LINHAS)
+    return indice
+
+def test_busca_exata_por_palavras_e_aproximada():
+    indice = _indice()
+    assert indice.buscar("JOAO DA SILVA")[0] == "JOÃO DA SILVA"
+    assert indice.buscar("silva joão da")[0] == "JOÃO DA SILVA"
+    assert indice.buscar("PADARIA PAO QUENTE LTD")[1]["id"] == "1300386381676798170"
+    assert indice.buscar("MARIA NINGUEM") == (None, None)
+
+def test_documento_vem_da_planilha_e_do_cadastro():
+    indice = _indice()
+    assert indice.buscar("JOAO DA SILVA")[1]["documento"] == "123.456.789-01"
+    assert indice.buscar("PADARIA PAO QUENTE LTDA")[1]["documento"] is None
+    indice.adicionar("Ana Paula Ferreira", {"id": 9, "marca": "Huawei", "nome": "Ana", "documento": "98765432100"})
+    nome, dados = indice.buscar("ANA PAULA FERREIRA")
+    assert nome == "ANA PAULA FERREIRA" and dados == {"id": "9", "marca": "Huawei", "nome": "Ana", "documento": "98765432100"}
+
+def test_busca_durante_recarga_ve_indice_inteiro():
+    indice = _indice()
+    erros, parar = [], threading.Event()
+
+    def buscar():
+        while not parar.is_set():
+            try:
+                if indice.buscar("JOAO DA SILVA")[0] != "JOÃO DA SILVA": erros.append("vazio")
+            except Exception as e:
+                erros.append(e)
+
+    leitores = [threading.Thread(target=buscar) for _ in range(4)]
+    for t in leitores: t.start()
+    for _ in range(300): indice.carregar(LINHAS * 20)
+    parar.set()
+    for t in leitores: t.join()
+    assert not erros
+
+def test_adicionar_copia_so_os_trigramas_do_nome_novo():
+    indice = _indice()
+    _, _, antes = indice._versao
+    copia_antes = {tri: set(chaves) for tri, chaves in antes.items()}
+    indice.adicionar("Joana Lima", {"id": 7, "marca": "Solis", "nome": "Joana"})
+    _, _, depois = indice._versao
+    assert antes == copia_antes                                  # versão anterior intacta
+    assert depois["JOA"] is not antes["JOA"] and depois["JOA"] == {"DA JOAO SILVA", "JOANA LIMA"}
+    assert depois["PAD"] is antes["PAD"]                          # trigrama não tocado é compartilhado
+
+class _Planilha:
+    def __init__(self, linhas):
+        self.linhas, self.revisao = linhas, 1
+        self.spreadsheet = self
+
+    def get_lastUpdateTime(self):
+        return self.revisao
+
+    def get_all_records(self):
+        return [dict(linha) for linha in self.linhas]
+
+def test_revisao_nova_mescla_so_o_que_mudou():
+    planilha = _Planilha(list(LINHAS))
+    indice = IndiceClientes(ttl=0)
+    indice.atualizar(lambda: planilha)
+    _, _, antes = indice._versao
+
+    planilha.linhas = [{**LINHAS[0], "ID_Inversor": 456}, LINHAS[1],
+                       {"Nome_Conta": "Joana Lima", "ID_Inversor": 7, "Marca": "Solis", "Nome_Inversor": "Joana"}]
+    planilha.revisao = 2
+    indice.atualizar(lambda: planilha)
+    _, _, depois = indice._versao
+    assert indice.buscar("JOAO DA SILVA")[1]["id"] == "456"
+    assert indice.buscar("LIMA JOANA")[0] == "JOANA LIMA"
+    assert depois["PAD"] is antes["PAD"]
+
+    planilha.linhas, planilha.revisao = planilha.linhas[1:], 3   # cliente saiu: reconstrói
+    indice.atualizar(lambda: planilha)
+    assert indice.buscar("JOAO DA SILVA") == (None, None)
+    assert indice.buscar("JOANA LIMA")[0] == "JOANA LIMA"
@@ -0,0 +1,28 @@
+import json_parcial
+
+COMPLETO = '{"metricas": {"gerado": 10.5, "obs": "a}b"}, "relatorio": "Linha 1\\nLinha \\"2\\"", "whatsapp": "ok"}'
+
+def test_json_valido_com_lixo_em_volta():
+    dados, completo = json_parcial.reparar("```json\n" + COMPLETO + "\n```")
+    assert completo
+    assert dados["metricas"] == {"gerado": 10.5, "obs": "a}b"}
+    assert dados["relatorio"] == 'Linha 1\nLinha "2"'
+
+def test_json_cortado_aproveita_o_que_fechou():
+    dados, completo = json_parcial.reparar(COMPLETO[:COMPLETO.index("Linha \\\"2")])
+    assert not completo
+    assert dados == {"metricas": {"gerado": 10.5, "obs": "a}b"}, "relatorio": "Linha 1\n"}
+
+def test_objeto_incompleto_fica_de_fora():
+    dados, completo = json_parcial.ler('{"metricas": {"gerado": 10.5, "sub": {"x": 1}')
+    assert (dados, completo) == ({}, False)
+
+def test_escape_cortado_no_fim_do_pedaco():
+    assert json_parcial.ler('{"relatorio": "abc\\', objetos=(), strings=("relatorio",)) == ({"relatorio": "abc"}, False)
+    assert json_parcial.ler('{"relatorio": "x\\u00e', objetos=(), strings=("relatorio",)) == ({"relatorio": "x"}, False)
+    assert json_parcial.ler('{"relatorio": "x\\u00e9"', objetos=(), strings=("relatorio",)) == ({"relatorio": "xé"}, True)
+
+def test_json_valido_sem_todos_os_campos_nao_esta_completo():
+    dados, completo = json_parcial.reparar('{"relatorio": "so isso"}')
+    assert dados == {"relatorio": "so isso"}
+    assert not completo
@@ -0,0 +1,65 @@
+from datetime import date
+
+import numpy as np
+import pytest
+
+import auditoria_lote
+import motor_conciliacao
+
+DIA0 = date(2024, 5, 1)
+
+def _conciliar(series, faturas, dias=31, total_informado=None):
+    geracao = motor_conciliacao.matriz_diaria(series, DIA0, dias)
+    usina, inicio, fim, creditado, tarifa = zip(*faturas)
+    return motor_conciliacao.rotulos(
+        motor_conciliacao.conciliar(geracao, DIA0, usina, inicio, fim, creditado, tarifa, total_informado)
+    )
+
+def test_matriz_diaria_descarta_dias_fora_da_janela():
+    series = [{date(2024, 4, 30): 9.0, date(2024, 5, 1): 1.0, date(2024, 5, 3): 0.0, date(2024, 5, 4): 5.0}, {}]
+    matriz = motor_conciliacao.matriz_diaria(series, DIA0, 3)
+    assert matriz.dtype == np.float32
+    np.testing.assert_array_equal(matriz, [[1.0, np.nan, 0.0], [np.nan] * 3])
+
+def test_somas_por_periodo_e_contagem_de_dias():
+    serie = {date(2024, 5, d): float(d) for d in range(1, 32)}
+    serie.update({date(2024, 5, 10): 0.0, date(2024, 5, 11): 0.0})
+    del serie[date(2024, 5, 20)]
+    r = _conciliar([serie], [(0, "2024-05-01", "2024-05-31", 475.0, 0.8), (0, "2024-05-05", "2024-05-09", 35.0, 0.8)])
+    # 1..31 = 496, menos os dias 10, 11 (zerados) e 20 (sem leitura)
+    assert list(r["kwh_gerado"]) == [455.0, 35.0]
+    assert list(r["dias"]) == [31, 5]
+    assert list(r["dias_lidos"]) == [30, 5]
+    assert list(r["dias_zerados"]) == [2, 0]
+    assert list(r["status"]) == ["incompleto", "ok"]
+    assert list(r["alerta"]) == ["credito_a_mais", "ok"]
+    assert list(r["valor_diferenca"]) == [16.0, 0.0]
+
+def test_contagem_de_16_bits_nao_vaza_entre_lidos_e_zerados():
+    # Período longo, todo lido e todo zerado: os dois contadores passam de 255 sem se misturar
+    dias = 4000
+    geracao = np.zeros((1, dias), dtype=np.float32)
+    r = motor_conciliacao.conciliar(geracao, DIA0, [0], [np.datetime64(DIA0)], [np.datetime64(DIA0) + dias - 1], [0.0], [1.0])
+    assert int(r["dias_lidos"][0]) == dias
+    assert int(r["dias_zerados"][0]) == dias
+    assert int(r["status"][0]) == 1
+
+def test_status_sem_dados_e_total_informado():
+    faturas = [(0, "2024-05-01", "2024-05-31", 100.0, 1.0), (1, "2024-05-01", "2024-05-31", 100.0, 1.0)]
+    r = _conciliar([{}, {}], faturas, total_informado=[np.nan, 98.0])
+    assert list(r["status"]) == ["sem_dados", "ok"]
+    assert list(r["kwh_gerado"]) == [0.0, 98.0]
+    assert list(r["alerta"]) == ["credito_a_mais", "ok"]
+
+def test_periodo_fora_da_matriz_nao_estoura():
+    r = _conciliar([{date(2024, 5, 1): 4.0}], [(0, "2024-04-20", "2024-05-01", 4.0, 1.0), (0, "2024-07-01", "2024-07-31", 0.0, 1.0)])
+    assert list(r["kwh_gerado"]) == [4.0, 0.0]
+    assert list(r["status"]) == ["incompleto", "sem_dados"]
+
+@pytest.mark.parametrize("diferenca", [-20.0, -5.0, 0.0, 5.0, 5.01, 30.0])
+def test_mesmo_criterio_da_auditoria_em_lote(diferenca):
+    r = _conciliar([{date(2024, 5, 1): 100.0}], [(0, "2024-05-01", "2024-05-01", 100.0 + diferenca, 0.9)])
+    esperado = auditoria_lote.conciliar(100.0, 100.0 + diferenca, 0.9)
+    assert r["alerta"][0] == esperado["alerta"]
+    assert r["diferenca_kwh"][0] == pytest.approx(esperado["diferenca_kwh"])
+    assert r["valor_diferenca"][0] == pytest.approx(esperado["valor_diferenca"])
@@ -0,0 +1,58 @@
+from datetime import date, datetime
+
+import pytest
+
+import armazem_geracao
+import fornecedores
+import planejador_huawei
+
+@pytest.fixture
+def armazem(tmp_path, monkeypatch):
+    monkeypatch.setattr(armazem_geracao, "CAMINHO", str(tmp_path / "geracao.sqlite3"))
+
+def test_meses_do_intervalo_vira_o_ano():
+    assert planejador_huawei.meses_do_intervalo(date(2023, 11, 20), date(2024, 2, 3)) == ["2023-11", "2023-12", "2024-01", "2024-02"]
+
+def test_planejar_ano_para_meses_inteiros_e_mes_para_parciais():
+    plano = planejador_huawei.planejar(date(2024, 1, 10), date(2024, 4, 30))
+    assert plano[0] == {"endpoint": "getKpiStationYear", "granularidade": "mes", "periodo": "2024", "meses": ["2024-02", "2024-03", "2024-04"]}
+    assert [(c["endpoint"], c["periodo"]) for c in plano[1:]] == [("getKpiStationMonth", "2024-01")]
+    assert all(c["granularidade"] == "dia" for c in planejador_huawei.planejar(date(2024, 1, 1), date(2024, 3, 31), diario=True))
+
+def _ms(dia):
+    return int(datetime(dia.year, dia.month, dia.day).timestamp() * 1000)
+
+def _post_sem_total_de_marco(falhar_mes):
+    """Ano 2023 com março zerado; o getKpiStationMonth (refazer de março) falha ou devolve os dias."""
+    def post(endpoint, payload):
+        codigo = payload["stationCodes"]
+        if endpoint == "getKpiStationYear":
+            itens = [{"stationCode": codigo, "collectTime": _ms(date(2023, m, 1)), "dataItemMap": {"inverter_power": 0 if m == 3 else 300}}
+                     for m in range(1, 13)]
+            return {"success": True, "data": itens}
+        if falhar_mes: return {"success": False, "failCode": 500}
+        return {"success": True, "data": [{"stationCode": codigo, "collectTime": _ms(date(2023, 3, d)), "dataItemMap": {"inverter_power": 10}}
+                                          for d in range(1, 32)]}
+    return post
+
+@pytest.mark.parametrize("falhar_mes", [True, False])
+def test_mes_sem_total_precisa_dos_dias(armazem, monkeypatch, falhar_mes):
+    monkeypatch.setattr(fornecedores, "get_huawei_token", lambda: "token")
+    monkeypatch.setattr(fornecedores, "post_huawei", _post_sem_total_de_marco(falhar_mes))
+    if falhar_mes:
+        with pytest.raises(RuntimeError, match="2023-03"):
+            fornecedores.buscar_geracao_huawei("NE=1", date(2023, 2, 1), date(2023, 3, 31))
+    else:
+        total, _ = fornecedores.buscar_geracao_huawei("NE=1", date(2023, 2, 1), date(2023, 3, 31))
+        assert total == pytest.approx(300 + 31 * 10)
+
+def test_estacoes_pendentes_em_lotes(armazem):
+    estacoes = [f"NE={i}" for i in range(2500)]
+    armazem_geracao.gravar_lote("Huawei", "mes", "2020", {e: {date(2020, 1, 1): 1.0} for e in estacoes[::2]})
+    assert armazem_geracao.estacoes_pendentes("Huawei", estacoes, "mes", "2020", lote=900) == estacoes[1::2]
+
+def test_total_periodo_mantem_dias_zerados(armazem):
+    armazem_geracao.gravar("Huawei", "NE=1", "dia", "2024-05", {date(2024, 5, 1): 12.5, date(2024, 5, 2): 0.0, date(2024, 5, 3): 7.5})
+    total, diarios = planejador_huawei.total_periodo("NE=1", date(2024, 5, 1), date(2024, 5, 4))
+    assert total == pytest.approx(20.0)
+    assert diarios == {date(2024, 5, 1): 12.5, date(2024, 5, 2): 0.0, date(2024, 5, 3): 7.5}  # dia 4: não lido
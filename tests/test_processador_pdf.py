@@ -0,0 +1,84 @@
+import pytest
+
+import processador_pdf
+from corpus_sintetico import pdf_texto
+
+pytest.importorskip("pypdf")
+
+def _fatura_varios_ucs():
+    """CEMIG de 3 páginas, uma linha de injeção (100 kWh) em cada; tudo essencial já aparece na 1ª."""
+    primeira = [
+        "CEMIG DISTRIBUICAO S.A.",
+        "Referente a MAI/2024 Vencimento 10/05/2024",
+        "Energia Eletrica kWh 500,00 0,95 475,00",
+        "Energia compensada GD I kWh 100,00 0,80 -80,00",
+        "Contrib Ilum Publica Municipal 25,50",
+    ]
+    outra = ["Unidade consumidora 123456789", "Energia compensada GD I kWh 100,00 0,80 -80,00"]
+    return pdf_texto([primeira, outra, outra])
+
+def test_fatura_multipagina_soma_todas_as_paginas():
+    dados = processador_pdf.extrair_dados_fatura(_fatura_varios_ucs())
+    assert dados["paginas_lidas"] == 3
+    assert dados["injetado_kwh"] == pytest.approx(300.0)
+    assert dados["valor_credito_total"] == pytest.approx(240.0)
+    assert dados["consumo_kwh"] == pytest.approx(500.0)
+    assert dados["cip_cosip"] == pytest.approx(25.5)
+    assert str(dados["mes_referencia"]) == "2024-05-01"
+
+def test_parar_cedo_so_quando_pedido():
+    dados = processador_pdf.extrair_dados_fatura(_fatura_varios_ucs(), parar_cedo=True)
+    assert dados["paginas_lidas"] == 1
+    assert processador_pdf.campos_essenciais_encontrados(dados)
+
+@pytest.mark.parametrize("texto, esperado", [
+    ("1.287,85", 1287.85),
+    ("12.345.678,9", 12345678.9),
+    ("0,95", 0.95),
+    ("abc", 0.0),
+])
+def test_converter_valor_br(texto, esperado):
+    assert processador_pdf.converter_valor_br(texto) == pytest.approx(esperado)
+
+def test_re_numero_separa_milhar_de_decimal():
+    linha = "Energia Eletrica kWh 1.287,85 0,953210 1.227,58"
+    assert processador_pdf.RE_NUMERO.findall(linha) == ["1.287,85", "0,953210", "1.227,58"]
+    assert processador_pdf.RE_NUMERO.findall("Historico MAI/24 350 dias 30") == []
+
+@pytest.mark.parametrize("layout", ["CEMIG", "ENEL", "NEOENERGIA"])
+@pytest.mark.parametrize("paginas_extras", [0, 6])
+def test_layouts_do_corpus_batem_com_gabarito(layout, paginas_extras):
+    import random
+    from benchmark import _confere
+    from corpus_sintetico import gerar_fatura
+    paginas, gabarito = gerar_fatura(random.Random(7), layout, paginas_extras)
+    dados = processador_pdf.extrair_dados_fatura(pdf_texto(paginas))
+    for campo in ("mes_referencia", "consumo_kwh", "valor_consumo_total", "injetado_kwh", "valor_credito_total", "cip_cosip"):
+        assert _confere(dados[campo], gabarito[campo]), campo
+
+def test_candidatos_senha_cpf():
+    assert processador_pdf.candidatos_senha("123.456.789-01") == [
+        "12345678901", "123.456.789-01", "123", "1234", "12345", "123456",
+    ]
+
+def test_candidatos_senha_cnpj_inclui_raiz():
+    candidatos = processador_pdf.candidatos_senha("12345678000190")
+    assert candidatos[:2] == ["12345678000190", "12.345.678/0001-90"]
+    assert candidatos[-1] == "12345678"
+
+@pytest.mark.parametrize("documento", [None, "", "1234", "123456789012"])
+def test_candidatos_senha_documento_invalido(documento):
+    assert processador_pdf.candidatos_senha(documento) == []
+
+def test_desbloqueio_com_cpf_do_titular():
+    from corpus_sintetico import proteger
+    conteudo = proteger(pdf_texto([["CEMIG DISTRIBUICAO S.A."]]), "123")
+    tentativas = [("cpf", s) for s in processador_pdf.candidatos_senha("12345678901")]
+    aberto, rotulo, status, testadas = processador_pdf.desbloquear_com_candidatos(conteudo, tentativas)
+    assert (rotulo, status, testadas) == ("cpf", "ok", 3)
+    assert aberto.senha == "123"
+
+def test_datas_de_leitura_ignoram_proxima_leitura():
+    texto = "Datas de leitura\nAnterior 05/04/2024 Atual 06/05/2024 Proxima leitura 05/06/2024"
+    assert processador_pdf.extrair_datas_leitura(texto) == {"inicio": "05/04", "fim": "06/05", "dias": "31"}
+    assert processador_pdf.extrair_datas_leitura("Leitura 01/05/2024 03/05/2024") is None
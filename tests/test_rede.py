@@ -0,0 +1,62 @@
+import itertools
+import threading
+import time
+import types
+
+import pytest
+
+import rede
+
+def test_disjuntor_abre_testa_e_fecha(monkeypatch):
+    relogio = [1000.0]
+    monkeypatch.setattr(rede.time, "monotonic", lambda: relogio[0])
+    d = rede.Disjuntor(limiar=3, pausa=30)
+    assert not any(d.falha() for _ in range(2)) and d.estado == "fechado"
+    assert d.falha() and d.estado == "aberto" and not d.permitir()
+    relogio[0] += 31
+    assert d.estado == "meio_aberto"
+    assert d.permitir() and not d.permitir()   # só uma chamada de teste
+    d.falha()
+    assert d.estado == "aberto"                 # teste falhou: nova pausa
+    relogio[0] += 31
+    assert d.permitir()
+    d.sucesso()
+    assert d.estado == "fechado" and d.permitir()
+
+def test_prazo_aninhado_vale_o_menor_e_vai_para_outra_thread():
+    assert rede.restante() is None
+    with rede.prazo(10):
+        with rede.prazo(60):
+            assert rede.restante() <= 10
+        visto = []
+        t = threading.Thread(target=rede.levar_prazo(lambda: visto.append(rede.restante())))
+        t.start(); t.join()
+        assert 0 < visto[0] <= 10
+    assert rede.restante() is None
+
+def _resposta(status):
+    return types.SimpleNamespace(status_code=status)
+
+def test_hedge_ignora_5xx_rapido_e_fica_com_a_resposta_boa(monkeypatch):
+    chave = ("teste", "hedge")
+    monkeypatch.setattr(rede, "_LATENCIAS", {chave: [0.01] * rede.HEDGE_AMOSTRAS_MINIMAS})
+    chamadas = itertools.count()
+
+    def enviar():
+        if next(chamadas) == 0:
+            time.sleep(0.05)        # passa do p95: dispara a cópia
+            return _resposta(503)   # e ainda termina antes dela, com erro
+        time.sleep(0.15)
+        return _resposta(200)
+
+    assert rede._com_hedge(chave, enviar, lambda r: r.status_code < 500).status_code == 200
+
+def test_hedge_sem_resposta_boa_devolve_a_ultima(monkeypatch):
+    chave = ("teste", "hedge_ruim")
+    monkeypatch.setattr(rede, "_LATENCIAS", {chave: [0.01] * rede.HEDGE_AMOSTRAS_MINIMAS})
+
+    def enviar():
+        time.sleep(0.05)
+        return _resposta(503)
+
+    assert rede._com_hedge(chave, enviar, lambda r: r.status_code < 500).status_code == 503